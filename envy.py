@@ -35,7 +35,8 @@ PLAYER_STATS_USED = (
 
 # folders / files / paths
 CACHE_FD =       '_cache'
-ASC_FP =        f'{CACHE_FD}/asc.dict'
+ASC_FP =        f'{CACHE_FD}/asc.npy'
+PFE_FP =        f'{CACHE_FD}/preflop_equity.npy'
 
 GAME_CONFIGS_FD = 'game_configs'
 
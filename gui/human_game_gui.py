@@ -8,7 +8,7 @@ from typing import List, Optional
 
 from envy import get_pos_names
 from pologic.game_config import GameConfig
-from pologic.podeck import CRD_FIG, CRD_COL
+from pologic.podeck import CRD_FIG, CRD_COL, PDeck, hand_equity
 from pologic.hand_history import STATE
 from podecide.stats.player_stats import PStatsEx
 
@@ -76,6 +76,7 @@ class HumanGameGUI:
         self.pl_won = [0 for _ in range(len(self.players))]
         self.n_hands = 0
         self.players_cards = {ix:[] for ix in range(len(self.players))}
+        self.players_active = [True for _ in range(len(self.players))]
         self.hand_is_finished = True
 
         self.states = [] # current hand states cache
@@ -204,6 +205,10 @@ class HumanGameGUI:
             self.dec_btnL.append(btn)
         self.__set_dec_btn_act()
 
+        self.dec_equity_lbl = Label(dec_frm, font=('Helvetica', 9))
+        self.dec_equity_lbl.grid(row=3, column=0, columnspan=len(move_names))
+        self.__set_dec_equity()
+
         # next hand / exit
         go_frm = Frame(self.tk, padx=5, pady=5)
         go_frm.grid(row=4, column=0)
@@ -245,6 +250,9 @@ class HumanGameGUI:
                 cv = [data['moves_cash'][ix] if data['allowed_moves'][ix] else '-' for ix in range(len(self.gc.table_moves))]
                 self.__set_dec_cash_val(cv)
                 self.__set_dec_btn_act(data['allowed_moves'])
+                self.__set_dec_equity(
+                    cards=          [PDeck.cti(c) for c in list(self.players_cards[0]) + self.tcards],
+                    n_opponents=    sum(self.players_active) - 1)
             if message.type == 'state':
                 self.__proc_state(message.data)
         self.__afterloop()
@@ -276,6 +284,7 @@ class HumanGameGUI:
                 self.__upd_tblc()
                 self.__upd_tcash()
                 self.__set_dec_math_text(1)
+                self.__set_dec_equity()
                 for plix in self.plx_elD:
                     self.__upd_plcsh(plix, self.gc.table_cash_start)
                     self.__set_pl_active(plix)
@@ -303,13 +312,14 @@ class HumanGameGUI:
             prn = False
 
         if state[0] == 'PLH':
+            cards = [PDeck.cts(c) if type(c) is int else c for c in state[1][1:]] # cards may be given as ints
             if state[1][0] == 0:
-                self.__upd_myc(state[1][1], state[1][2])
-            self.players_cards[state[1][0]] = state[1][1:]
+                self.__upd_myc(cards[0], cards[1])
+            self.players_cards[state[1][0]] = cards
             prn = False
 
         if state[0] == 'TCD':
-            self.__upd_tblc(list(state[1]))
+            self.__upd_tblc([PDeck.cts(c) for c in state[1]])
             prn = False
 
         if state[0] == 'T$$':
@@ -368,6 +378,7 @@ class HumanGameGUI:
         if cash_cs is not True:  self.plx_elD[pl_ix]['lblL'][5]['text'] = cash_cs
 
     def __set_pl_active(self, plix:int, a=True):
+        self.players_active[plix] = a
         self.plx_elD[plix]['lblL'][4]['fg'] = 'black' if a else 'gray36'
         self.plx_elD[plix]['lblL'][5]['fg'] = 'red4' if a else 'gray36'
 
@@ -425,6 +436,14 @@ class HumanGameGUI:
         for ix in range(len(self.dec_btnL)):
             self.dec_btnL[ix]['state'] = 'normal' if act[ix] else 'disabled'
 
+    def __set_dec_equity(self, cards:Optional[List[int]]=None, n_opponents:int=0):
+        """ sets text of equity label (equity of my cards vs live opponents) """
+        if not cards or n_opponents < 1:
+            self.dec_equity_lbl['text'] = 'equity: -'
+            return
+        eq = hand_equity(cards=cards, n_opponents=n_opponents, n_samples=5000)
+        self.dec_equity_lbl['text'] = f'equity vs {n_opponents}: {eq["equity"]*100:.1f}% (win {eq["win"]*100:.1f}% tie {eq["tie"]*100:.1f}%)'
+
     def __set_dec_math_text(self, phase:int):
         """ sets text math labels """
         for lbl,nm in zip(self.dec_mathL, self.move_math[phase]):
@@ -1,3 +1,4 @@
+import numpy as np
 from ompr.runner import RunningWorker, OMPRunner
 from pypaq.lipytools.files import r_pickle, w_pickle
 from pypaq.lipytools.pylogger import get_pylogger
@@ -6,7 +7,7 @@ from tqdm import tqdm
 from typing import Dict, Optional, List
 
 from envy import CACHE_FD
-from pologic.podeck import PDeck, ASC, monte_carlo_prob_won
+from pologic.podeck import PDeck, ASC, PreflopEquity, monte_carlo_prob_won, monte_carlo_prob_won_NPL
 
 
 def prep2X7batch(
@@ -18,6 +19,7 @@ def prep2X7batch(
         no_maskP: Optional[float]=  None,   # probability of not masking (all cards are known), for None uses full random
         n_monte=                    30,     # num of montecarlo samples for A win chance estimation
         asc: ASC=                   None,
+        pfe: PreflopEquity=         None,   # preflop equity lookup for preflop-masked rows
         verbosity=                  0
 ) -> Dict[str, List]:
     """ prepares batch of 2x 7cards
@@ -62,8 +64,10 @@ def prep2X7batch(
                 cards_7B = temp
 
             # get cards ranks
-            rank_A, rank_A_value, _, _ = deck.cards_rank(cards_7A)
-            rank_B, rank_B_value, _, _ = deck.cards_rank(cards_7B)
+            rank_A_value = PDeck.cards_rank_value([PDeck.cti(c) for c in cards_7A])
+            rank_B_value = PDeck.cards_rank_value([PDeck.cti(c) for c in cards_7B])
+            rank_A = rank_A_value // 1000000
+            rank_B = rank_B_value // 1000000
 
             if not desired_draw or (desired_draw and rank_A_value==rank_B_value):
                 got_all_cards = True
@@ -91,18 +95,17 @@ def prep2X7batch(
         for ix in range(2+5-nMask,7):
             cards_7A[ix] = 52
 
-        # A win prob
-        mcAChance = monte_carlo_prob_won(
-            cards=      cards_7A,
-            n_samples=  n_monte,
-            asc=        asc)
-
         b_cA.append(cards_7A)       # 7 cards of A
         b_cB.append(cards_7B)       # 7 cards of B
         b_wins.append(wins)         # who wins {0,1,2}
         b_rA.append(rank_A)         # rank of A
         b_rB.append(rank_B)         # rank ok B
-        b_mAWP.append(mcAChance)    # win chances for A
+
+    # win chances for A, for whole batch at once
+    if asc:
+        b_mAWP = [monte_carlo_prob_won(cards=cA, n_samples=n_monte, asc=asc, pfe=pfe) for cA in b_cA]
+    else:
+        b_mAWP = monte_carlo_prob_won_NPL(cards=np.asarray(b_cA), n_samples=n_monte, pfe=pfe).tolist()
 
     return {
         'cards_A':      b_cA,
@@ -120,16 +123,19 @@ class Batch2X7_RW(RunningWorker):
     def __init__(
             self,
             batch_size: int,
-            n_monte: int):
+            n_monte: int,
+            use_pfe: bool=  False):
         self.deck = PDeck()
         self.batch_size = batch_size
         self.n_monte = n_monte
+        self.pfe = PreflopEquity() if use_pfe else None
 
     def process(self, **kwargs) -> Dict[str,List]:
         batch = prep2X7batch(
             deck=       self.deck,
             batch_size= self.batch_size,
-            n_monte=    self.n_monte)
+            n_monte=    self.n_monte,
+            pfe=        self.pfe)
         batch.pop('rank_counter')
         batch.pop('won_counter')
         return batch
@@ -142,12 +148,15 @@ class OMPRunner_Batch2X7(OMPRunner):
             rw_class=       Batch2X7_RW,
             batch_size=     1000,
             n_monte=        100,
+            use_pfe=        False,
             devices=        1.0,
             **kwargs):
+        if use_pfe:
+            PreflopEquity() # builds cache (once) before workers load it
         OMPRunner.__init__(
             self,
             rw_class=           rw_class,
-            rw_init_kwargs=     {'batch_size':batch_size, 'n_monte':n_monte},
+            rw_init_kwargs=     {'batch_size':batch_size, 'n_monte':n_monte, 'use_pfe':use_pfe},
             devices=            devices,
             ordered_results=    False,
             **kwargs)
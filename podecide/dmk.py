@@ -1,6 +1,7 @@
 import math
 from abc import abstractmethod, ABC
 from multiprocessing import Process
+from multiprocessing.connection import wait
 import numpy as np
 from pypaq.pytypes import NPL
 from pypaq.lipytools.stats import mam
@@ -14,16 +15,20 @@ from pypaq.pms.base import POINT
 import random
 import statistics
 import time
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Union
 
 from envy import DMK_MODELS_FD, PLAYER_STATS_USED, PyPoksException
-from pologic.podeck import PDeck
+from pologic.podeck import PDeck, PreflopEquity, hand_equity
 from pologic.hand_history import STATE
-from podecide.game_state import GameState
+from podecide.game_state import EncodedState, GameStatesStore, share_rewards
 from podecide.dmk_motorch import DMK_MOTorch
 from podecide.stats.won_manager import WonMan
 from podecide.stats.player_stats import PStatsEx
+from podecide.tools.batch_scheduler import BatchScheduler
+from podecide.tools.learner import LearnerThread, LearnerClient
+from podecide.tools.states_ring import StatesRing
 from podecide.tools.tbwr_dmk import TBwr_DMK
+from podecide.tools.wait_que import WaitQue
 
 # DMK won interval
 # number of hands for which WON$ and some other stats are accumulated and then processed
@@ -99,9 +104,9 @@ class MethDMK(DMK, ABC):
 
         self._rng = np.random.default_rng(seed) # random numbers generator
 
-        # variables below store new states data (states sent by table and not decided by DMK yet)
-        self._states_new: Dict[str,List[GameState]] = {pid: [] for pid in self._player_ids} # dict of new states lists
-        self._n_states_new = 0  # cache, number of all _states_new == sum([len(l) for l in self._states_new.values()])
+        # store of states data of all players: new states (sent by table and not decided by DMK yet) and decided ones
+        self._states = GameStatesStore(player_ids=self._player_ids, n_moves=len(self.table_moves))
+        self._moves_cash: Dict[str,List[int]] = {} # cash for allowed moves (of the last state), used only by TK for GUI
 
     def collect_states(
             self,
@@ -110,20 +115,17 @@ class MethDMK(DMK, ABC):
         """ takes player states, encodes and saves """
 
         encoded_states = self._encode_states(player_id, player_states)
-
-        # save
-        if encoded_states:
-            self._states_new[player_id] += encoded_states
-            self._n_states_new += len(encoded_states)
+        self._states.append(player_id, encoded_states) # save
 
     @abstractmethod
     def _encode_states(
             self,
             player_id: str,
             player_stateL: List[STATE],
-    ) -> List[GameState]:
-        """ encodes player states into type appropriate for DMK to make decisions """
-        return [GameState(state_orig_data=value) for value in player_stateL] # wraps into list of GameState
+    ) -> List[Tuple]:
+        """ encodes player states into type appropriate for DMK to make decisions
+        (records with values of data columns of the states store) """
+        return [() for _ in player_stateL] # baseline does not keep any state data
 
     def _collect_allowed_moves(
             self,
@@ -131,9 +133,11 @@ class MethDMK(DMK, ABC):
             allowed_moves :List[bool],
             moves_cash :List[int]):
         """ takes allowed_moves (and their cash) from poker player """
-        last_state = self._states_new[player_id][-1]
-        last_state.allowed_moves = allowed_moves
-        last_state.moves_cash = moves_cash
+        last = self._states.last(player_id)
+        if last is None:
+            raise PyPoksException(f'{player_id} sent allowed_moves without new states')
+        self._states.column('allowed_moves')[last] = allowed_moves
+        self._moves_cash[player_id] = moves_cash
 
     def make_decisions(self) -> List[Tuple[str,int,NPL]]:
         """ makes decisions then flushes states """
@@ -143,34 +147,39 @@ class MethDMK(DMK, ABC):
         # flush new states using decisions list
         for dec in decL:
             pid, _, _ = dec
-            self._states_new[pid] = []  # reset
+            self._states.drop_new(pid) # reset
 
         return decL
 
     def _decisions_from_new_states(self) -> List[Tuple[str,int,NPL]]:
-        """ makes decisions & returns list of decisions using data from _states_new """
+        """ makes decisions & returns list of decisions using data of new states """
         self._compute_probs()
         decL = self._sample_moves_for_ready_players()
         return decL
 
     @abstractmethod
     def _compute_probs(self) -> None:
-        """ computes probabilities for some states in _states_new """
+        """ computes probabilities for some new states """
         pass
 
     def _sample_moves_for_ready_players(self) -> List[Tuple[str,int,NPL]]:
-        """ samples moves for players with ready data (allowed_moves and probs) """
+        """ samples moves for players with ready data (allowed_moves and probs of the last new state) """
+        st = self._states
+        # players with new states, all having probs
+        ready = (st.n > st.n_dec) & (st.n_probs == st.n)
+        last = st.start + st.n - 1
+        ready[ready] &= st.column('allowed_moves')[ready, last[ready]].any(axis=-1)
         decL = []
-        for pid in self._states_new:
-            if self._states_new[pid]: # not empty
-                last_state = self._states_new[pid][-1]
-                if last_state.allowed_moves is not None and last_state.probs is not None:
-                    move = self._sample_move(
-                        probs=              last_state.probs,
-                        allowed_moves =     last_state.allowed_moves,
-                        pid=                pid)
-                    last_state.move = move # add move to the last state
-                    decL.append((pid, move, last_state.probs))
+        for pid in self._player_ids:
+            s = st.slot(pid)
+            if ready[s]:
+                probs = st.column('probs')[s,last[s]].copy()
+                move = self._sample_move(
+                    probs=              probs,
+                    allowed_moves =     st.column('allowed_moves')[s,last[s]],
+                    pid=                pid)
+                st.column('move')[s,last[s]] = move # add move to the last state
+                decL.append((pid, move, probs))
         return decL
 
     def _sample_move(
@@ -200,17 +209,18 @@ class MeTrainDMK(MethDMK, ABC):
             trainable=          False,
             upd_trigger: int=   30000,  # half of this number is an estimated target batch size (number of decisions) for update (check policy of states selection @UPD - half_rectangle in trapeze)
             upd_step=           0,      # updates counter (clock)
+            async_training=     False,  # for True training core only submits update, which runs concurrently with decisions (check _update_done())
             **kwargs):
 
         MethDMK.__init__(self, **kwargs)
 
-        self.trainable =    trainable
-        self.upd_trigger =  upd_trigger
-        self.upd_step =     upd_step
-
-        # variables below store moves/decisions data
-        self._states_dec: Dict[str, List[GameState]] = {pid: [] for pid in self._player_ids}  # dict with decided states lists (for update)
-        self._n_states_dec = 0  # cache, number of all _states_dec == sum([len(l) for l in self._states_dec.values()])
+        self.trainable =        trainable
+        self.upd_trigger =      upd_trigger
+        self.upd_step =         upd_step
+        self.async_training =   async_training
+        self._update_running = False # (async) update submitted and not done yet
+        self._upd_stime = None
+        self._upd_time_total = 0.0 # time of updates (from start to done) since init
 
         # ques of Update Synchronizer - if set - will be used to synchronize update
         self._upd_sync_que_out: Optional[Que] = None
@@ -220,7 +230,7 @@ class MeTrainDMK(MethDMK, ABC):
     def make_decisions(self) -> List[Tuple[str,int,NPL]]:
         """ makes decisions > moves states > trains policy - overrides MethDMK method, which does not train """
         decL = self._decisions_from_new_states()    # get decisions list
-        self.__move_states(decL)                    # move states from _states_new to _states_dec
+        self.__move_states(decL)                    # move states from new to decided
 
         # learn/train policy, it is additionally triggered inside
         if self.trainable:
@@ -234,19 +244,13 @@ class MeTrainDMK(MethDMK, ABC):
         return decL
 
     def __move_states(self, decL :List[Tuple[str,int,NPL]]):
-        """ moves states (from _new to _dec) having decisions list """
-
+        """ moves states (from new to decided) having decisions list """
         for dec in decL:
-
             pid, move, _ = dec
-            states = self._states_new[pid]      # take all new states
-            self._states_new[pid] = []          # reset
-            self._n_states_new -= len(states)
-
-            # put states to dec
             if self.trainable:
-                self._states_dec[pid] += states
-                self._n_states_dec += len(states)
+                self._states.move_new_to_dec(pid)
+            else:
+                self._states.drop_new(pid)
 
     def set_upd_sync(
             self,
@@ -260,7 +264,12 @@ class MeTrainDMK(MethDMK, ABC):
     def __train_policy(self) -> None:
         """ trains DMK (policy) """
 
-        if self._n_states_dec > self.upd_trigger: # only when trigger fires
+        # while async update is running, next one is not started
+        self._complete_update()
+        if self._update_running:
+            return
+
+        if self._states.n_dec_all > self.upd_trigger: # only when trigger fires
 
             update_allowed = True
 
@@ -279,23 +288,39 @@ class MeTrainDMK(MethDMK, ABC):
                     self._waiting_for_permission = False
 
             if update_allowed:
+                self._upd_stime = time.time()
                 ust_details = self._training_core()
                 self._flush_states_dec(ust_details)
-                self.upd_step += 1
-
-                # return ticket
-                if self._upd_sync_que_out is not None:
-                    msg = QMessage(type='ticket', data=self.name)
-                    self._upd_sync_que_out.put(msg)
+                self._update_running = True
+                if not self.async_training:
+                    self._complete_update(block=True)
+
+    def _complete_update(self, block=False) -> None:
+        """ completes the running update (when done) """
+        if self._update_running and self._update_done(block):
+            self._update_running = False
+            self.upd_step += 1
+            self._upd_time_total += time.time() - self._upd_stime
+
+            # return ticket
+            if self._upd_sync_que_out is not None:
+                msg = QMessage(type='ticket', data=self.name)
+                self._upd_sync_que_out.put(msg)
 
     def _training_core(self):
-        """ trains (updates self policy) with _states_dec (cache of taken moves & received rewards) """
+        """ trains (updates self policy) with decided states (cache of taken moves & received rewards),
+        with async_training only submits the update """
         return None
 
+    def _update_done(self, block=False) -> bool:
+        """ checks if the update submitted by _training_core is done (for block waits for it),
+        baseline update is done by _training_core """
+        return True
+
     def _flush_states_dec(self, ust_details) -> None:
-        """ flushes _states_dec using information from ust_details """
-        self._states_dec = {pid: [] for pid in self._player_ids} # flushes all _states_dec (here baseline, not uses ust_details)
-        self._n_states_dec = 0
+        """ flushes decided states using information from ust_details """
+        for pid in self._player_ids: # flushes all decided states (here baseline, not uses ust_details)
+            self._states.drop_dec(pid)
 
 
 class QueDMK(MeTrainDMK, ABC):
@@ -309,6 +334,10 @@ class QueDMK(MeTrainDMK, ABC):
             publishFWD=         True, # allows to publish process.FWD stats
             publishUPD=         True, # allows to publish process.UPD stats
             collect_loop_stats= False,
+            states_ring_size: Optional[int]=    None, # if given DMK receives players states with a StatesRing of this size (instead of que_from_player)
+            wait_threshold: int=                1,    # decisions loop makes decisions when number of waiting players reaches threshold ..
+            wait_deadline: float=               0.01, # .. or when the first waiting player waits longer than deadline (s)
+            adaptive_batch: bool=               False,# for True wait_threshold is set by BatchScheduler (learns latency vs batch width online)
             **kwargs):
 
         MeTrainDMK.__init__(self, name=name, **kwargs)
@@ -316,7 +345,7 @@ class QueDMK(MeTrainDMK, ABC):
         self._process = Process(name=f'QueDMK_process:{name}', target=self.__dmk_proc)
 
         self._que_to_gm = None # here QuedDMK sends data to GamesManager, data is in form (name, command, data)
-        self._que_from_gm = Que() # here QuedDMK receives data from GamesManager, data is in form (command, data)
+        self._que_from_gm = WaitQue() # here QuedDMK receives data from GamesManager, data is in form (command, data)
 
         self._running_process = False  # flag for running process loop
         self._running_game = False  # flag for running game loop
@@ -326,8 +355,18 @@ class QueDMK(MeTrainDMK, ABC):
         self._reset_processFWD_stats_data()
 
         # every DMK creates part of DMK-Player Ques network
-        self._que_from_player = Que() # here player puts data for DMK
+        self._que_from_player = WaitQue() # here player puts data for DMK
         self._queD_to_player = {pid: Que() for pid in self._player_ids} # dict with ques where DMK puts data for each player
+        self._states_ring = StatesRing(
+            player_ids= self._player_ids,
+            n_moves=    len(self.table_moves),
+            size=       states_ring_size) if states_ring_size else None
+
+        self.wait_threshold = wait_threshold
+        self.wait_deadline = wait_deadline
+        self._batch_scheduler = BatchScheduler(n_players=len(self._player_ids)) if adaptive_batch else None
+        self._fwd_time = 0.0 # time of last decisions computation (without training)
+        self._fwd_time_total = 0.0 # time of decisions computation since init
 
         self.publishFWD = publishFWD
         self.publishUPD = publishUPD
@@ -354,6 +393,8 @@ class QueDMK(MeTrainDMK, ABC):
             self._do_what_GM_says(gm_data)
 
         # being here means QueDMK finishes its process..
+        if self._states_ring:
+            self._states_ring.close(unlink=True)
         message = QMessage(
             type=   'dmk_status',
             data=   f'{self.name} (DMK) process finished')
@@ -385,6 +426,14 @@ class QueDMK(MeTrainDMK, ABC):
         if message.type == 'stop_dmk_loop':
             self._running_game = False
 
+        if message.type == 'send_device_load':
+            self._que_to_gm.put(QMessage(
+                type=   'device_load',
+                data=   {
+                    'dmk_name': self.name,
+                    'fwd_time': self._fwd_time_total,
+                    'upd_time': self._upd_time_total}))
+
         if message.type == 'stop_dmk_process':
             self._running_process = False
 
@@ -405,10 +454,22 @@ class QueDMK(MeTrainDMK, ABC):
             data=   f'{self.name} (DMK) decisions_loop started')
         self._que_to_gm.put(message)
 
-        n_waiting = 0 # num players (-> tables) waiting for decision
+        # loop blocks on readers of players and GM data (and states ring notifications)
+        readers = [self.que_from_player.reader, self.que_from_gm.reader]
+        if self._states_ring:
+            readers.append(self._states_ring.reader)
+
+        n_waiting = 0       # num players (-> tables) waiting for decision
+        n_msg_decision = 0  # num decision requests received since last decisions round
+        wait_start = None   # time since players are waiting
+        round_time = time.time()
         while self._running_game:
 
-            n_players = len(self._player_ids)
+            # wait for data till deadline of waiting players
+            timeout = None
+            if wait_start is not None:
+                timeout = max(0.0, wait_start + self.wait_deadline - time.time())
+            wait(readers, timeout=timeout)
 
             # 'flush' the que of data from players
             pmL = []
@@ -417,7 +478,11 @@ class QueDMK(MeTrainDMK, ABC):
                 if player_message: pmL.append(player_message)
                 else: break
 
-            n_msg_decision = 0
+            # states from the ring, drained after the que, so states of a player come before its decision request
+            if self._states_ring:
+                for pid, states in self._states_ring.drain_states():
+                    self.collect_states(player_id=pid, player_states=states)
+
             for player_message in pmL:
 
                 data = player_message.data
@@ -435,27 +500,25 @@ class QueDMK(MeTrainDMK, ABC):
                         moves_cash=     data['moves_cash'])
                     n_msg_decision += 1
 
-            n_waiting += n_msg_decision
-            self._processFWD_stats_data['0.requestedF'].append(n_msg_decision / n_players)
+            if n_msg_decision and wait_start is None:
+                wait_start = time.time()
 
-            # if got any waiting >> make decisions and put them to players
-            if n_waiting:
-                self._processFWD_stats_data['1.waitingF'].append(n_waiting / n_players)
+            # if got enough waiting or deadline passed >> make decisions and put them to players
+            threshold = self._batch_scheduler.threshold if self._batch_scheduler else self.wait_threshold
+            if wait_start is not None and (n_waiting + n_msg_decision >= threshold or time.time() >= wait_start + self.wait_deadline):
 
-                s_time = time.time()
-                decL = self.make_decisions()
-                n_waiting -= len(decL)
-                self._processFWD_stats_data['2.unlockedF'].append(len(decL) / n_players)
-                self._processFWD_stats_data['3.decisions_time'].append((time.time() - s_time) / len(decL))
+                if self._batch_scheduler:
+                    self._batch_scheduler.observe_requests(n_requests=n_msg_decision, interval=time.time()-round_time)
+                    self._processFWD_stats_data['7.thresholdF'].append(threshold / len(self._player_ids))
+                round_time = time.time()
+
+                decL, n_waiting = self._decisions_round(n_msg_decision, n_waiting)
+                n_msg_decision = 0
+                wait_start = time.time() if n_waiting else None
 
                 # send decisions
-                for d in decL:
-                    pid, move, probs = d
-                    message = QMessage(
-                        type=   'move',
-                        data=   {'selected_move':move, 'probs':probs})
-                    self.queD_to_player[pid].put(message)
-                    self._processFWD_stats_data['probs'].append(probs)
+                if decL:
+                    self._send_decisions(decL)
 
             # eventually get data from GM, ..way to exit game_loop
             gm_message = self.que_from_gm.get(block=False)
@@ -467,14 +530,54 @@ class QueDMK(MeTrainDMK, ABC):
             data=   f'{self.name} (DMK) decisions_loop stopped')
         self._que_to_gm.put(message)
 
+    def _send_decisions(self, decL:List[Tuple[str,int,NPL]]):
+        """ sends decisions to players, one message per player
+        (QPTable waits for one decision at a time, so there is nothing to batch per destination) """
+
+        s_time = time.time()
+
+        for pid, move, probs in decL:
+            message = QMessage(
+                type=   'move',
+                data=   {'selected_move':move, 'probs':probs})
+            self.queD_to_player[pid].put(message)
+
+        self._processFWD_stats_data['6.send_time'].append((time.time() - s_time) / len(decL))
+
+    def _decisions_round(self, n_msg_decision:int, n_waiting:int) -> Tuple[List[Tuple[str,int,NPL]], int]:
+        """ makes decisions for waiting players (if any), updates processFWD stats
+        n_msg_decision - number of new decision requests, n_waiting - number of players waiting before
+        returns decisions list and updated number of waiting players """
+
+        n_players = len(self._player_ids)
+        n_waiting += n_msg_decision
+        self._processFWD_stats_data['0.requestedF'].append(n_msg_decision / n_players)
+
+        decL = []
+        if n_waiting:
+            self._processFWD_stats_data['1.waitingF'].append(n_waiting / n_players)
+
+            s_time = time.time()
+            decL = self.make_decisions()
+            if self._batch_scheduler:
+                self._batch_scheduler.observe_round(width=n_waiting, latency=self._fwd_time)
+            n_waiting -= len(decL)
+            self._processFWD_stats_data['2.unlockedF'].append(len(decL) / n_players)
+            if decL:
+                self._processFWD_stats_data['3.decisions_time'].append((time.time() - s_time) / len(decL))
+            for _, _, probs in decL:
+                self._processFWD_stats_data['probs'].append(probs)
+
+        return decL, n_waiting
+
     def _decisions_from_new_states(self) -> List[Tuple[str,int,NPL]]:
         """ adds histogram """
 
         ### add histogram data to _process_stats
 
         nd = {}
-        for pid in self._states_new:
-            l = len(self._states_new[pid])
+        for pid in self._player_ids:
+            l = self._states.n_new(pid)
             if l not in nd: nd[l] = 0
             nd[l] += 1
 
@@ -483,7 +586,11 @@ class QueDMK(MeTrainDMK, ABC):
             hist_nfo += f'{k:d}:{nd[k]:d} '
         self._processFWD_stats_data['new_states_hist'].append(hist_nfo[:-1])
 
-        return super()._decisions_from_new_states()
+        s_time = time.time()
+        decL = super()._decisions_from_new_states()
+        self._fwd_time = time.time() - s_time
+        self._fwd_time_total += self._fwd_time
+        return decL
 
     def _sample_move(
             self,
@@ -541,6 +648,14 @@ class QueDMK(MeTrainDMK, ABC):
             val = sum(st) / len(st) if len(st) else 0
             self._tbwr.add(value=val, tag=f'process.FWD/{k}', step=step)
 
+        # latency curve learned by BatchScheduler
+        if self._batch_scheduler:
+            a, b = self._batch_scheduler.curve
+            self._tbwr.add(value=a,                                         tag='process.FWD.batch/latency_a', step=step)
+            self._tbwr.add(value=b,                                         tag='process.FWD.batch/latency_b', step=step)
+            self._tbwr.add(value=self._batch_scheduler.arrival_rate or 0,   tag='process.FWD.batch/arrival_rate', step=step)
+            self._tbwr.add(value=self._batch_scheduler.threshold,           tag='process.FWD.batch/threshold', step=step)
+
         self._reset_processFWD_stats_data()
 
     def _reset_processFWD_stats_data(self) -> None:
@@ -549,8 +664,10 @@ class QueDMK(MeTrainDMK, ABC):
             '1.waitingF':          [], # List[float] - factor of waiting players
             '2.unlockedF':         [], # List[float] - factor of players unlocked - received decision in this loop
             '3.decisions_time':    [], # List[float] - decision time - FWD call (s)
-            '4.n_rows':            [], # List[int]   - number of rows needed to be computed to get to allowed moves
+            '4.n_rows':            [], # List[int]   - number of rows (FWD calls) computed to get probs for new states
             '5.row_widthF':        [], # List[float] - factor of players for which probs in a row were computed
+            '6.send_time':         [], # List[float] - time of sending decisions (per decision) (s)
+            '7.thresholdF':        [], # List[float] - factor of players that triggers decisions (adaptive batch)
             'probs_nam':           [], # List[float] - factor of probs given for not allowed moves
             'probs':               [], # List[np.array] - list of FWD probs
             'new_states_hist':     []} # List[str]   - histogram of num new states (while calculating probs & making decisions)
@@ -584,6 +701,10 @@ class QueDMK(MeTrainDMK, ABC):
     def queD_to_player(self):
         return self._queD_to_player
 
+    @property
+    def states_ring(self) -> Optional[StatesRing]:
+        return self._states_ring
+
 
 class StaMaDMK(QueDMK, ABC):
     """ Stats Manager DMK
@@ -625,7 +746,7 @@ class StaMaDMK(QueDMK, ABC):
             self,
             player_id,
             player_stateL: List[STATE],
-    ) -> List[GameState]:
+    ) -> List[Tuple]:
         """ adds stats management """
 
         for i in (range(self.table_size) if self.build_villain_stats else [0]):
@@ -806,10 +927,11 @@ class RanDMK(StaMaDMK):
     def _compute_probs(self) -> None:
         """ calculates probabilities - baseline: sets equal for ALL new states of ALL players with allowed moves """
         n_moves = len(self.table_moves)
-        for pid in self._states_new:
-            if self._states_new[pid]:
-                if self._states_new[pid][-1].allowed_moves:
-                    self._states_new[pid][-1].probs = np.asarray([1 / n_moves] * n_moves) # equal probs
+        for pid in self._player_ids:
+            last = self._states.last(pid)
+            if last and self._states.column('allowed_moves')[last].any():
+                self._states.column('probs')[last] = 1 / n_moves # equal probs
+                self._states.set_probs_done(pid)
 
     def save(self): pass
 
@@ -830,6 +952,7 @@ class NeurDMK(ExaDMK):
             motorch_type: type(DMK_MOTorch)=    DMK_MOTorch, # abstract passed here..
             motorch_point: Optional[POINT]=     None,
             reward_share: Optional[int]=        5, # reward sharing (between states) policy, for None every state gets reward/len(moves), for int gets reward/N
+            equity_samples: Optional[int]=      None, # for int adds my cards equity (vs live opponents) to encoded states (policy input), computed with given number of samples (preflop with lookup)
             **kwargs):
 
         ExaDMK.__init__(
@@ -848,31 +971,45 @@ class NeurDMK(ExaDMK):
             'name':         self.name,
             'save_topdir':  self.save_topdir,
             'table_size':   self.table_size,
-            'table_moves':  self.table_moves}
+            'table_moves':  self.table_moves,
+            'use_equity':   bool(equity_samples)}
         for k in update_with:
             if k in self.motorch_point:
                 self._logger.warning(f'key: {k} already present in motorch_point with value: {self.motorch_point[k]} <- overriding with: {update_with[k]}')
             self.motorch_point[k] = update_with[k]
 
         self._mdl: Optional[DMK_MOTorch] = None
+        self._learner: Optional[Union[LearnerThread,LearnerClient]] = None # updates policy (a copy of self._mdl) for async_training or with LearnerServer
+        self._learner_server_ques: Optional[Tuple[Que,Que]] = None
 
         self.reward_share = reward_share
+        self.equity_samples = equity_samples
         self._time_upd_fin = None # update time save, for reports
 
+        # data columns of encoded states, in order of EncodedState fields
+        self._states.add_column('cards',    shape=(7,),                     dtype=np.int8)
+        self._states.add_column('event_id', shape=(),                       dtype=np.int8)
+        self._states.add_column('cash',     shape=(8,),                     dtype=np.float32)
+        self._states.add_column('pl_id',    shape=(),                       dtype=np.int8)
+        self._states.add_column('pl_pos',   shape=(),                       dtype=np.int8)
+        self._states.add_column('pl_stats', shape=(len(PLAYER_STATS_USED),), dtype=np.float32)
+        if self.equity_samples:
+            self._states.add_column('equity', shape=(), dtype=np.float32)
+        self._states.add_column('policy_v', shape=(), dtype=np.int32, data=False) # version (upd_step) of policy that computed probs
+
     def _encode_states(
             self,
             player_id,
             player_stateL: List[STATE],
-    ) -> List[GameState]:
+    ) -> List[Tuple]:
         """ encodes selection of HH states data into a form accepted by NN input
         returns only selected states (used by NN) """
 
-        es = super()._encode_states(player_id, player_stateL)
+        super()._encode_states(player_id, player_stateL)
         es_sel = [] # selected states
         ser = f'\nstates encoding report for {player_id}\n'
-        for s in es:
+        for val in player_stateL:
 
-            val = s.state_orig_data
             ser += f'> {val}\n'
 
             # update table cash
@@ -881,11 +1018,13 @@ class NeurDMK(ExaDMK):
 
             # update my cards with my hand
             if val[0] == 'PLH' and val[1][0] == 0:
-                self._my_cards[player_id] = [PDeck.cti(c) for c in val[1][1:]]
+                cards = val[1][1:]
+                self._my_cards[player_id] = list(cards) if type(cards[0]) is int else [PDeck.cti(c) for c in cards]
 
             # update my cards with table cards
             if val[0] == 'TCD':
-                self._my_cards[player_id] += [PDeck.cti(c) for c in val[1]]
+                cards = val[1]
+                self._my_cards[player_id] += list(cards) if type(cards[0]) is int else [PDeck.cti(c) for c in cards]
 
             # players POS or MOV
             if val[0] in ['POS','MOV']:
@@ -895,80 +1034,97 @@ class NeurDMK(ExaDMK):
                     mv_cash = 0.0
                     pl_cash = [float(val[1][2]), 0.0, 0.0]
                     self._pos[player_id][val[1][0]] = val[1][1]     # save POS for next MOVes
+                    self._n_live[player_id] += 1
                 else:
                     event_id = 1 + val[1][1]                        # 1 + mov_id (index in table_moves)
                     mv_cash = val[1][2]
                     pl_cash = list(val[1][4])
+                    if self.table_moves[val[1][1]][0] == 'FLD':
+                        self._n_live[player_id] -= 1
 
                 # merge and normalize
                 cash = [mv_cash, *pl_cash, *self._table_cash[player_id]]
                 cash = [v / self.table_cash_start for v in cash]
                 pl_stats = list(self._pstats_ex[player_id][val[1][0]].player_stats.values()) if self.build_villain_stats else [0.0 for _ in PLAYER_STATS_USED]
 
-                nval = {
-                    'cards':    [] + self._my_cards[player_id],     # List[7 x int] copy of my cards: 0-52
-                    'event_id': event_id,                           # int: O-(1+len(table_moves)) <- POS + all MOVes
-                    'cash':     cash,                               # List[8 x float] move cash, pl.cash, pl.cash_ch, pl.cash_cs, table.pot, table.cash_cs, table.cash_tc
-                    'pl_id':    val[1][0],                          # int player ID: 0-table_size
-                    'pl_pos':   self._pos[player_id][val[1][0]],    # int player pos: 0-table_size
-                    'pl_stats': pl_stats,                           # List[float,..] 0.0-1.0
-                }
-
-                es_sel.append(GameState(nval))
+                my_cards = self._my_cards[player_id]
+                nval = EncodedState(
+                    cards=      my_cards + [52] * (7 - len(my_cards)),
+                    event_id=   event_id,
+                    cash=       cash,
+                    pl_id=      val[1][0],
+                    pl_pos=     self._pos[player_id][val[1][0]],
+                    pl_stats=   pl_stats,
+                    equity=     self._my_equity(player_id) if self.equity_samples else 0.0)
+
+                es_sel.append(nval)
                 ser += f'---> {nval}\n'
 
             if val[0] == 'PRS' and val[1][0] == 0: # my result
-                if self._states_dec[player_id]:
-                    self._states_dec[player_id][-1].reward = val[1][1] # we can append reward to last state here
+                last_dec = self._states.last_dec(player_id)
+                if last_dec:
+                    self._states.column('reward')[last_dec] = val[1][1] # we can append reward to last state here
 
                 # reset
                 self._my_cards[player_id] = []
                 self._table_cash[player_id] = [0,0,0,0]
+                self._n_live[player_id] = 0
+                self._equity[player_id] = {}
 
         self._logger.debug(ser)
 
         return es_sel
 
+    def _my_equity(self, player_id:str) -> float:
+        """ returns equity of player cards vs live opponents, cached for cards & number of opponents """
+        n_opponents = self._n_live[player_id] - 1
+        cards = self._my_cards[player_id]
+        if len(cards) < 2 or n_opponents < 1:
+            return 0.0
+        key = (len(cards), n_opponents)
+        if key not in self._equity[player_id]:
+            if len(cards) == 2:
+                self._equity[player_id][key] = self._pfe.equity(cards, n_opponents)
+            else:
+                self._equity[player_id][key] = hand_equity(
+                    cards=          cards,
+                    n_opponents=    n_opponents,
+                    n_samples=      self.equity_samples)['equity']
+        return self._equity[player_id][key]
+
     def _compute_probs(self) -> None:
-        """ compute probabilities for at least some states (compute until get to allowed_moves) """
+        """ computes probabilities for all new states (without probs) of all players,
+        states of every player are packed into one (padded) sequence, so it is done with one FWD,
+        when every player has exactly one new state it is a streaming step of the policy """
 
-        n_rows = 0
-        got_probs_for_allowed = False
-        while not got_probs_for_allowed:
-
-            player_ids: List[str] = []
-            game_statesL: List[List[GameState]] = []
-            for pid in self._states_new:
-                if self._states_new[pid]:
-                    for s in self._states_new[pid]:
-                        if s.probs is None:
-                            player_ids.append(pid)
-                            game_statesL.append([s])
-                            break
-
-            # it is possible, that all probs are done (for example allowed moves appeared after probs calculated)
-            if not player_ids:
-                break
+        player_ids, first, seq_len = self._states.new_without_probs()
 
+        # it is possible, that all probs are done (for example allowed moves appeared after probs calculated)
+        n_rows = 0
+        if player_ids:
+            rows = self._states.rows(player_ids=player_ids, first=first, seq_len=seq_len)
+            batch = self._mdl.build_batch(
+                player_ids=     player_ids,
+                states=         self._states,
+                rows=           rows,
+                seq_len=        seq_len,
+                for_training=   False)
+            if max(seq_len) == 1:
+                # exactly one new state of every player -> streaming step against cached states
+                inp = {k: v[:,0] for k,v in batch.items() if k != 'enc_cnn_state'}
+                probs_array = self._mdl.run_policy_step(player_ids=player_ids, inp=inp)[:,None]
             else:
-                batch = self._mdl.build_batch(
-                    player_ids=     player_ids,
-                    game_statesL=   game_statesL,
-                    for_training=   False)
                 probs_array = self._mdl.run_policy(player_ids=player_ids, batch=batch)
-                probs_array = np.squeeze(probs_array, axis=-2)
-                n_rows += 1
+            n_rows = 1
 
-                # distribute probs
-                for pid, probs in zip(player_ids, probs_array):
-                    for s in self._states_new[pid]:
-                        if s.probs is None:
-                            s.probs = probs
-                            if s.allowed_moves:
-                                got_probs_for_allowed = True
-                            break
+            # distribute probs (without padding)
+            valid = np.arange(rows.shape[1]) < np.asarray(seq_len)[:,None]
+            self._states.put('probs', rows=rows[valid], values=probs_array[valid])
+            self._states.put('policy_v', rows=rows[valid], values=self.upd_step)
+            for pid in player_ids:
+                self._states.set_probs_done(pid)
 
-                self._processFWD_stats_data['5.row_widthF'].append(len(player_ids) / len(self._player_ids))
+            self._processFWD_stats_data['5.row_widthF'].append(len(player_ids) / len(self._player_ids))
 
         self._processFWD_stats_data['4.n_rows'].append(n_rows)
 
@@ -978,108 +1134,48 @@ class NeurDMK(ExaDMK):
         tr = TimeRep()
         time_upd_start = time.time()
 
-        ### prepare reward shared (reward_sh) for self._states_dec
-
-        player_ids = [] + self._player_ids
-
-        # for every player:
-        # 1. move rewards down to (last) move (state with move)
-        # 2. build rewards - a dict {pid: [[99,95,92][85,81,77,74]..]}
-        #    with reversed indexes of moves (among all player states)
-        #    first move in the sublist is always rewarded
-        rewards = {}
-        for pid in player_ids:
-            rewards[pid] = []
-            reward = None
-            passed_first_reward = False # some last (first from the reversed) moves need to be skipped - those do not having rewards yet
-            move_ixL = [] # list of move index
-            for ix in reversed(range(len(self._states_dec[pid]))):
-
-                st = self._states_dec[pid][ix]
-
-                if st.reward is not None:
-                    passed_first_reward = True
-
-                    # got previous reward without a move, add it here
-                    if reward is not None:
-                        reward += st.reward
-                    else:
-                        reward = st.reward
-
-                    st.reward = None
-
-                if st.move is not None and passed_first_reward: # got move here and it will share some reward
-                    if reward is not None: # put that reward here
-                        st.reward = reward
-                        reward = None
-                        # got previous list of mL
-                        if move_ixL:
-                            rewards[pid].append(move_ixL)
-                            move_ixL = []
-                    move_ixL.append(ix) # always add cause passed first reward
-
-            if move_ixL: rewards[pid].append(move_ixL) # finally add last
+        ### prepare reward shared (reward_sh) for decided states
+        # for every player move rewards down to (last) move (state with move) and share them among moves of groups,
+        # returns (per slot) index of the last rewarded move, number of moves and number of rewards (groups)
+        top_move, n_moves, n_rewards = share_rewards(
+            states=             self._states,
+            reward_share=       self.reward_share,
+            table_cash_start=   self.table_cash_start)
 
         # remove not rewarded players (rare, but possible)
-        pids_not_rewarded = []
-        for pid in player_ids:
-            if not rewards[pid]:
-                pids_not_rewarded.append(pid)
-        if pids_not_rewarded:
-            self._logger.debug(f'got not rewarded players: {pids_not_rewarded}')
-            for pid in pids_not_rewarded:
-                player_ids.remove(pid)
-                rewards.pop(pid)
-
-        # share (down) + normalize rewards
-        for pid in player_ids:
-            for move_ixL in rewards[pid]:
-
-                # only when already not shared (..from previous update)
-                rIX = move_ixL[0] # index of reward
-                if self._states_dec[pid][rIX].reward_sh is None:
-
-                    if self.reward_share is None:
-                        rew_sh = self._states_dec[pid][rIX].reward / len(move_ixL)
-                    else:
-                        rew_sh = self._states_dec[pid][rIX].reward / self.reward_share
-
-                    for mIX in move_ixL:
-                        self._states_dec[pid][mIX].reward_sh = rew_sh / self.table_cash_start
-                else:
-                    break
+        slots = np.arange(len(self._player_ids)) # players in slots order
+        if (top_move < 0).any():
+            self._logger.debug(f'got not rewarded players: {[self._player_ids[s] for s in slots[top_move < 0]]}')
+            slots = slots[top_move >= 0]
 
         ### select players for update
 
-        last_rewarded_move = [(pid, rewards[pid][0][0]) for pid in player_ids] # [(pid, index of state)]
-        last_rewarded_move = sorted(last_rewarded_move, key=lambda x: x[1], reverse=True) # sort decreasing
-
-        half_players = len(self._player_ids) // 2
-        if len(last_rewarded_move) < half_players:
-            half_players = len(last_rewarded_move)
-
-        last_rewarded_move = last_rewarded_move[:half_players]          # trim
-        n_states_upd = last_rewarded_move[-1][1] + 1                    # n states to use for update (+1 since moves are indexed from 0 - height of the batch)
-        player_ids_upd = [e[0] for e in last_rewarded_move]                    # extract pid to update (width of the batch)
+        slots = slots[np.argsort(-top_move[slots], kind='stable')]  # sort decreasing by index of the last rewarded move
+        half_players = min(len(self._player_ids) // 2, len(slots))
+        slots = slots[:half_players]                                # trim
+        n_states_upd = int(top_move[slots[-1]]) + 1                 # n states to use for update (+1 since moves are indexed from 0 - height of the batch)
+        player_ids_upd = [self._player_ids[s] for s in slots]       # pid to update (width of the batch)
+        seq_len = [n_states_upd] * len(player_ids_upd)
+        rows = self._states.rows(player_ids=player_ids_upd, first=0, seq_len=seq_len)
 
         # publish UPD process stats
         if self.publishUPD:
 
             # num of states
-            n_sts = mam([len(self._states_dec[pid]) for pid in self._player_ids])
+            n_sts = mam(self._states.n_dec.tolist())
             self._tbwr.add(value=n_sts[0],     tag='process.UPD/a.n_sts_min', step=self.upd_step) # the shortest states list
             self._tbwr.add(value=n_states_upd, tag='process.UPD/b.n_sts_upd', step=self.upd_step) # == height of the batch
             self._tbwr.add(value=n_sts[2],     tag='process.UPD/c.n_sts_max', step=self.upd_step) # the longest states list
-            val = (n_states_upd * len(player_ids_upd)) / self._n_states_dec
+            val = (n_states_upd * len(player_ids_upd)) / self._states.n_dec_all
             self._tbwr.add(value=val,          tag='process.UPD/d.sts_updF',  step=self.upd_step) # factor of states taken for update
 
             # num of states with moves
-            n_mov = mam([sum([len(ml) for ml in rewards[pid]]) for pid in player_ids_upd])
+            n_mov = mam(n_moves[slots].tolist())
             self._tbwr.add(value=n_mov[0], tag='process.UPD/e.n_mov_min', step=self.upd_step)
             self._tbwr.add(value=n_mov[2], tag='process.UPD/f.n_mov_max', step=self.upd_step)
 
             # num of states with rewards
-            n_rew = mam([len(rewards[pid]) for pid in player_ids_upd])
+            n_rew = mam(n_rewards[slots].tolist())
             self._tbwr.add(value=n_rew[0], tag='process.UPD/g.n_rew_min', step=self.upd_step)
             self._tbwr.add(value=n_rew[2], tag='process.UPD/h.n_rew_max', step=self.upd_step)
 
@@ -1087,16 +1183,34 @@ class NeurDMK(ExaDMK):
             self._tbwr.add(value=n_sts[1]/n_rew[1], tag='process.UPD/j.n_sts/rew', step=self.upd_step)
             self._tbwr.add(value=n_mov[1]/n_rew[1], tag='process.UPD/k.n_mov/rew', step=self.upd_step)
 
+            # policy lag - number of updates since the policy that computed probs of states
+            lag = self.upd_step - self._states.take('policy_v', rows)
+            self._tbwr.add(value=float(lag.mean()), tag='process.UPD/l.policy_lag',     step=self.upd_step)
+            self._tbwr.add(value=int(lag.max()),    tag='process.UPD/m.policy_lag_max', step=self.upd_step)
+
         tr.log('prepare_data')
 
-        batch = self._mdl.build_batch(
-            player_ids=     player_ids_upd,
-            game_statesL=   [self._states_dec[pid][:n_states_upd] for pid in player_ids_upd],
-            for_training=   True)
+        if self._learner:
+            batch = self._learner.build_batch(
+                player_ids=     player_ids_upd,
+                states=         self._states,
+                rows=           rows,
+                seq_len=        seq_len)
+        else:
+            batch = self._mdl.build_batch(
+                player_ids=     player_ids_upd,
+                states=         self._states,
+                rows=           rows,
+                seq_len=        seq_len,
+                for_training=   True)
         tr.log('build_batch')
 
-        self._mdl.update_policy(player_ids=player_ids_upd, batch=batch)
-        tr.log('update_policy')
+        if self._learner:
+            self._learner.submit(player_ids=player_ids_upd, batch=batch)
+            tr.log('submit')
+        else:
+            self._mdl.update_policy(player_ids=player_ids_upd, batch=batch)
+            tr.log('update_policy')
 
         if self.publishUPD:
             time_rep = {}
@@ -1115,6 +1229,24 @@ class NeurDMK(ExaDMK):
 
         return n_states_upd, player_ids_upd
 
+    def set_learner_server(self, que_out:Que, que_in:Que):
+        """ sets ques of LearnerServer, which will update the policy """
+        self._learner_server_ques = que_out, que_in
+
+    def _update_done(self, block=False) -> bool:
+        """ loads weights published by the learner """
+        if not self._learner:
+            return True
+        if block:
+            self._learner.wait()
+        weights = self._learner.pop_weights()
+        if weights is None:
+            return False
+        version, state_dict, _ = weights
+        self._mdl.module.load_state_dict(state_dict)
+        self._logger.debug(f'{self.name} loaded policy v{version} from the learner')
+        return True
+
     def _flush_states_dec(self, ust_details) -> None:
         """ flush properly """
 
@@ -1126,8 +1258,7 @@ class NeurDMK(ExaDMK):
         else:
             n_moves_upd, upd_pid = ust_details
             for pid in upd_pid:
-                self._states_dec[pid] = self._states_dec[pid][n_moves_upd:]
-            self._n_states_dec -= n_moves_upd * len(upd_pid)
+                self._states.drop_dec(pid, n_moves_upd)
 
     def _pre_process(self):
         """ adds DMK_MOTorch """
@@ -1145,12 +1276,40 @@ class NeurDMK(ExaDMK):
         self._my_cards =   {pa: []        for pa in self._player_ids}  # current cards of player
         self._table_cash = {pa: [0,0,0,0] for pa in self._player_ids}  # current (before player move) table cash (from T$$ state)
         self._pos =        {pa: {}        for pa in self._player_ids}  # current players positions {pl_id:pos}
+        self._n_live =     {pa: 0         for pa in self._player_ids}  # number of players still in the hand (not folded)
+        self._equity =     {pa: {}        for pa in self._player_ids}  # cache of my cards equity {(n_cards,n_opponents): equity}
+        self._pfe = PreflopEquity(logger=get_child(self._logger)) if self.equity_samples else None
+
+        # learner updates its copy of the policy, self._mdl only runs it
+        if self.trainable and self._learner_server_ques:
+            que_to_server, que_from_server = self._learner_server_ques
+            self._learner = LearnerClient(
+                mdl=                self._mdl,
+                player_ids=         self._player_ids,
+                motorch_point=      self.motorch_point,
+                que_to_server=      que_to_server,
+                que_from_server=    que_from_server,
+                version=            self.upd_step,
+                do_TB=              self.publishUPD)
+        elif self.trainable and self.async_training:
+            mdl = self.motorch_type(
+                player_ids= self._player_ids,
+                logger=     self._logger,
+                tbwr=       self._tbwr,
+                do_TB=      self.publishUPD,
+                **self.motorch_point)
+            mdl.module.load_state_dict(self._mdl.module.state_dict())
+            self._learner = LearnerThread(mdl=mdl, version=self.upd_step)
+            self._learner.start()
 
     def _do_what_GM_says(self, message: QMessage):
 
         super()._do_what_GM_says(message)
 
         if message.type == 'reload_model':
+            if self._learner:
+                self._complete_update(block=True)
+                self._learner.load_ckpt()
             self._mdl.load_ckpt()
             dmk_message = QMessage(type='dmk_model_ckpt_reloaded', data=self.name)
             self._que_to_gm.put(dmk_message)
@@ -1160,6 +1319,9 @@ class NeurDMK(ExaDMK):
             dmk_message = QMessage(type='dmk_model_fwd_state_reset', data=self.name)
             self._que_to_gm.put(dmk_message)
 
+        if message.type == 'stop_dmk_process' and self._learner:
+            self._learner.stop()
+
     @classmethod
     def save_policy_backup(cls, dmk_name:str, save_topdir:Optional[str]=None):
         if not save_topdir: save_topdir=cls.SAVE_TOPDIR
@@ -1181,7 +1343,12 @@ class NeurDMK(ExaDMK):
             self._logger.error(err_msg)
             raise PyPoksException(err_msg)
 
-        self._mdl.save()
+        # learner model keeps the optimizer
+        if self._learner:
+            self._complete_update(block=True)
+            self._learner.save()
+        else:
+            self._mdl.save()
 
     @property
     def device(self):
@@ -1421,7 +1588,7 @@ class HumanDMK(StaMaDMK):
             self,
             player_id,
             player_stateL: List[STATE],
-    ) -> List[GameState]:
+    ) -> List[Tuple]:
         """ additionally sends incoming states to TK """
         for state in player_stateL:
             message = QMessage(type='state', data=state)
@@ -1432,21 +1599,23 @@ class HumanDMK(StaMaDMK):
         """ sends allowed_moves to TK -> human makes decision -> decision is cast to OH probs """
 
         probs = np.zeros(len(self.table_moves))
-        for pid in self._states_new:
-            if self._states_new[pid]:
-                last_state = self._states_new[pid][-1]
-                if last_state.allowed_moves:
+        for pid in self._player_ids:
+            last = self._states.last(pid)
+            if last:
+                allowed_moves = self._states.column('allowed_moves')[last]
+                if allowed_moves.any():
 
                     # send data to TK
                     message = QMessage(
                         type=   'allowed_moves',
                         data=   {
-                            'allowed_moves':    last_state.allowed_moves,
-                            'moves_cash':       last_state.moves_cash})
+                            'allowed_moves':    allowed_moves.tolist(),
+                            'moves_cash':       self._moves_cash[pid]})
                     self.gui_queI.put(message)
 
                     # get decision from TK
                     tk_message = self.gui_queO.get()
                     probs[tk_message.data] = 1
 
-                    last_state.probs = probs
\ No newline at end of file
+                    self._states.column('probs')[last] = probs
+                    self._states.set_probs_done(pid)
\ No newline at end of file
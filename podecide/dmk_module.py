@@ -23,6 +23,7 @@ class ProCNN_DMK_PG(Module):
             float_feat_size: int=           8,
             player_id_emb_width:int=        12,
             player_pos_emb_width: int=      12,
+            use_equity: bool=               False,      # adds my cards equity (float) to CNN input
             cnn_width=                      None,       # CNN representation width (number of filters), for None uses CNN input width
             n_lay=                          12,         # number of CNN layers >> makes network deep ( >> context length)
             cnn_ldrt_scale=                 0,
@@ -59,6 +60,7 @@ class ProCNN_DMK_PG(Module):
         Module.__init__(self, **kwargs)
 
         self.train_ce = train_ce
+        self.use_equity = use_equity
 
         card_net_MOTorch = CardNet_MOTorch(
             cards_emb_width=    cards_emb_width,
@@ -85,7 +87,7 @@ class ProCNN_DMK_PG(Module):
         my_initializer(self.player_pos_emb)
 
         n_st = 0#len(PLAYER_STATS_USED) # number of stats floats # INFO: since stats are temporary disabled
-        n_floats = 1 + 8 + n_st # cn_prob_win + 8 cash + stats
+        n_floats = 1 + 8 + n_st + int(use_equity) # cn_prob_win + 8 cash + stats + equity
         cnn_in_width =  cn_enc_width + event_emb_width + player_id_emb_width + player_pos_emb_width + n_floats
         cnn_out_width = cn_enc_width + event_emb_width + player_id_emb_width + player_pos_emb_width + n_floats * float_feat_size
         cnn_out_width = cnn_width or cnn_out_width
@@ -127,7 +129,9 @@ class ProCNN_DMK_PG(Module):
             pl_id: TNS,         # player id, 0 is me (int)          <- emb
             pl_pos: TNS,        # player pos, 0 is SB (int)         <- emb
             pl_stats: TNS,      # player stats (float,..)
+            equity: Optional[TNS]=          None,   # my cards equity (float), used with use_equity
             enc_cnn_state: Optional[TNS]=   None,   # state tensor
+            seq_len: Optional[TNS]=         None,   # lengths of (right padded) sequences, for given fin_state is taken at the end of every sequence
     ) -> DTNS:
 
         if self.train_ce:
@@ -147,11 +151,19 @@ class ProCNN_DMK_PG(Module):
             self.player_pos_emb[pl_pos],
             # pl_stats, # INFO: temporary disabled
         ]
+        if self.use_equity:
+            feats.append(torch.unsqueeze(equity, dim=-1))
         inp = torch.cat(feats, dim=-1)
 
-        enc_cnn_out = self.enc_cnn(
-            inp=        inp,
-            history=    enc_cnn_state)
+        if seq_len is None:
+            enc_cnn_out = self.enc_cnn(
+                inp=        inp,
+                history=    enc_cnn_state)
+        else:
+            enc_cnn_out = self._enc_cnn_packed(
+                inp=        inp,
+                history=    enc_cnn_state,
+                seq_len=    seq_len)
         output = enc_cnn_out['out']
         logits = self.logits(output)
 
@@ -166,6 +178,47 @@ class ProCNN_DMK_PG(Module):
             'zeroes_enc':       card_enc_out['zeroes'],
             'zeroes_cnn':       enc_cnn_out['zeroes']}
 
+    def step(self, inp:DTNS, cache:TNS) -> Tuple[TNS,TNS]:
+        """ streaming inference - processes exactly one new event of every player (inp: {feature: [batch,..]})
+        against cache of causal convolutions windows of all enc_cnn layers (cache: [batch,n_lay,kernel_size-1,n_filters]),
+        returns probs [batch,n_moves] and updated cache """
+        out = self(**{k: torch.unsqueeze(v, dim=1) for k,v in inp.items()}, enc_cnn_state=cache)
+        return torch.squeeze(out['probs'], dim=1), out['fin_state']
+
+    def _enc_cnn_packed(self, inp:TNS, history:TNS, seq_len:TNS) -> DTNS:
+        """ runs enc_cnn over batch of right padded sequences,
+        outputs of causal blocks are not affected by the padding, but the state (history) of every block
+        is taken at the end of every sequence (seq_len), blocks are run here the same way as by EncCNN.forward()
+        (checked for all DMK configurations with tests/podecide/test_dmk_motorch.py for pinned torchness version) """
+
+        if self.enc_cnn.in_TFdrop_lay:
+            inp = self.enc_cnn.in_TFdrop_lay(inp)
+        if self.enc_cnn.projection_lay:
+            inp = self.enc_cnn.projection_lay(inp)
+
+        # block state is a (kernel_size-1) window of [history,LN(input)] that ends with the last element of the sequence,
+        # LN is applied per element, so the window is gathered from [history,input] and LN is applied only to its input part
+        n_hist = self.enc_cnn.kernel_size - 1
+        ixs = seq_len.to(inp.device).view(-1,1) + torch.arange(n_hist, device=inp.device)
+        from_hist = (ixs < n_hist).unsqueeze(-1)
+        ixs = ixs.unsqueeze(-1).expand(-1, -1, inp.size(-1))
+
+        output = inp
+        states = []
+        zsL = []
+        for block, block_history in zip(self.enc_cnn.blocks, torch.unbind(history, dim=-3)):
+            block_out = block(output, history=block_history)
+            window = torch.gather(torch.concat([block_history.to(output.device, output.dtype), output], dim=-2), dim=-2, index=ixs)
+            state = torch.where(from_hist, window, block.lay_ln(window))
+            states.append(torch.unsqueeze(state.detach(), dim=-3))
+            zsL.append(block_out['zeroes'])
+            output = block_out['out']
+
+        return {
+            'out':      self.enc_cnn.out_ln(output),
+            'state':    torch.cat(states, dim=-3),
+            'zeroes':   torch.cat(zsL).detach() if self.enc_cnn.do_zeroes else None}
+
     def fwd_logprob(self, move:TNS, **kwargs) -> DTNS:
         """ FWD
         + preparation of logprob (ln(prob) of selected move)
@@ -240,6 +293,7 @@ class ProCNN_DMK_PG(Module):
             move: TNS,           # move (action) taken
             reward: TNS,         # (dreturns)
             allowed_moves: TNS,  # OH tensor
+            equity: Optional[TNS]=          None,
             enc_cnn_state: Optional[TNS]=   None,
             old_logprob: Optional[TNS]=     None, # not used by PG, added for compatibility with PPO
     ) -> DTNS:
@@ -251,6 +305,7 @@ class ProCNN_DMK_PG(Module):
             pl_id=          pl_id,
             pl_pos=         pl_pos,
             pl_stats=       pl_stats,
+            equity=         equity,
             enc_cnn_state=  enc_cnn_state)
 
         logits = out['logits']
@@ -1,3 +1,4 @@
+import numpy as np
 import os
 import random
 import shutil
@@ -9,8 +10,8 @@ from typing import Dict, Union, Optional, List, Iterable
 
 from envy import CN_MODELS_FD, DMK_MODELS_FD, get_cardNet_name, PyPoksException
 from podecide.dmk_module import ProCNN_DMK_PG, ProCNN_DMK_A2C, ProCNN_DMK_PPO
-from podecide.game_state import GameState
-
+from podecide.game_state import GameStatesStore
+from podecide.tools.tensor_arena import TensorArena
 
 
 class DMK_MOTorch(MOTorch):
@@ -58,9 +59,11 @@ class DMK_MOTorch(MOTorch):
         else:
             self._log.info(f'{self.name} has not loaded pretrained CN checkpoint (DMK saved_already:{saved_already}, load_cardnet_pretrained:{load_cardnet_pretrained})')
 
+        # states (cached windows of enc_cnn causal convolutions) of all players are kept in one tensor, indexed by player slot
         self._zero_state = self.convert(self.module.enc_cnn.get_zero_history())
-        self._last_fwd_state: Dict[str,TNS] = {pa: self._zero_state for pa in self._player_ids}  # state after last fwd
-        self._last_upd_state: Dict[str,TNS] = {pa: self._zero_state for pa in self._player_ids}  # state after last upd
+        self._slot: Dict[str,int] = {pid: ix for ix,pid in enumerate(self._player_ids)}
+        self._fwd_cache: TNS = self._zero_state.expand(len(self._slot), *self._zero_state.shape).clone() # states after last fwd
+        self._upd_cache: TNS = self._fwd_cache.clone()                                                  # states after last upd
 
         self._ze_pro_enc = ZeroesProcessor(
             intervals=      (5,20),
@@ -89,15 +92,20 @@ class DMK_MOTorch(MOTorch):
     def reset_fwd_state(self):
         """ resets agent FWD state,
         designed for inference mode <- single player game """
-        if len(self._last_fwd_state) > 1:
+        if len(self._slot) > 1:
             raise PyPoksException('reset_fwd_state is valid only for one player')
-        pid = list(self._last_fwd_state.keys())[0]
-        self._last_fwd_state[pid] = self._zero_state
+        self._fwd_cache[:] = self._zero_state
+
+    def _slots(self, player_ids:List[str]) -> TNS:
+        """ returns tensor with slots (cache indexes) of players """
+        return torch.tensor([self._slot[pid] for pid in player_ids], device=self._fwd_cache.device)
 
     def build_batch(
             self,
-            player_ids: List[str],                  # list of player_id
-            game_statesL: List[List[GameState]],    # list of GameState lists (for each player list of his GameStates)
+            player_ids: List[str],      # list of player_id
+            states: GameStatesStore,    # store with states of players
+            rows: np.ndarray,           # flat indexes of store rows [len(player_ids), max(seq_len)] (right padded)
+            seq_len: List[int],         # number of states of every player
             for_training=   True,
     ) -> DTNS:
         raise NotImplementedError
@@ -105,20 +113,25 @@ class DMK_MOTorch(MOTorch):
     def run_policy(self, player_ids:List[str], batch:DTNS):
         """ runs policy and returns numpy array with probs """
         out = self(bypass_data_conv=True, **batch)
+        self._fwd_cache[self._slots(player_ids)] = out['fin_state'] # save FWD states
+        return out['probs'].cpu().detach().numpy()
 
-        # save FWD states
-        for pid, state in zip(player_ids, out['fin_state']):
-            self._last_fwd_state[pid] = state
+    def run_policy_step(self, player_ids:List[str], inp:DTNS):
+        """ streaming inference - runs policy for one new event of every player (inp: {feature: [batch,..]})
+        against cached FWD states (slots of players), returns numpy array with probs [batch,n_moves] """
+        slots = self._slots(player_ids)
+        with torch.no_grad():
+            probs, self._fwd_cache[slots] = self.module.step(inp=inp, cache=self._fwd_cache[slots])
+        return probs.cpu().numpy()
 
-        return out['probs'].cpu().detach().numpy()
+    def get_upd_state(self, player_ids:List[str]) -> TNS:
+        """ returns states (of enc_cnn) of players after last upd """
+        return self._upd_cache[self._slots(player_ids)]
 
     def update_policy(self, player_ids:List[str], batch:DTNS) -> None:
         """ backward + save states (baseline) """
         out = self.backward(bypass_data_conv=True, **batch)
-
-        # save UPD states
-        for pid, state in zip(player_ids, out['fin_state']):
-            self._last_upd_state[pid] = state
+        self._upd_cache[self._slots(player_ids)] = out['fin_state'] # save UPD states
 
     # overriden here to allow load_cardnet_pretrained when not do_gx_ckpt
     @classmethod
@@ -201,6 +214,13 @@ class DMK_MOTorch_PG(DMK_MOTorch):
 
     def __init__(self, module_type=ProCNN_DMK_PG, **kwargs):
         DMK_MOTorch.__init__(self, module_type=module_type, **kwargs)
+        pin_memory = torch.device(self.device).type == 'cuda'
+        self._arena_fwd = TensorArena(pin_memory=pin_memory)
+        self._arena_upd = TensorArena(pin_memory=pin_memory)
+
+    def share_upd_memory(self):
+        """ training batches will be built in shared memory (to be sent to other process without copy) """
+        self._arena_upd = TensorArena(share_memory=True)
 
     def fwd_logprob(
             self,
@@ -258,55 +278,52 @@ class DMK_MOTorch_PG(DMK_MOTorch):
     def build_batch(
             self,
             player_ids: List[str],
-            game_statesL: List[List[GameState]],
+            states: GameStatesStore,
+            rows: np.ndarray,
+            seq_len: List[int],
             for_training=   True,
     ) -> DTNS:
-
-        n_moves = len(self.table_moves)
-
-        fwd_keys = ['cards','event_id','cash','pl_id','pl_pos','pl_stats']
-        bwd_keys = ['move','reward','allowed_moves']
-        batch_keys = [] + fwd_keys if not for_training else [] + fwd_keys + bwd_keys
-        batch_keys.append('enc_cnn_state')
-
-        batch = {k: [] for k in batch_keys}
-
-        # for every player
-        for pid, game_states in zip(player_ids,game_statesL):
-
-            # build seqs
-            seqs = {k: [] for k in batch_keys[:-1]}
-            for gs in game_states:
-
-                val = gs.state_orig_data
-
-                # pad cards
-                cards = val['cards']
-                cards += [52]*(7-len(cards))
-                seqs['cards'].append(cards)
-
-                for k in fwd_keys[1:]:
-                    seqs[k].append(val[k])
-
-                if for_training:
-                    move = gs.move
-                    seqs['move'].append(move if move is not None else 0)
-                    seqs['reward'].append(gs.reward_sh if gs.reward_sh is not None else 0)
-                    allowed_moves = gs.allowed_moves if move is not None else [False] * n_moves
-                    seqs['allowed_moves'].append(allowed_moves)
-
-            for k in seqs:
-                batch[k].append(seqs[k])
-            enc_cnn_state = self._last_upd_state[pid] if for_training else self._last_fwd_state[pid]
-            batch['enc_cnn_state'].append(enc_cnn_state)
-
-        # convert data for torch
-        batch_conv_torch = {}
-        for k in batch_keys[:-1]:
-            batch_conv_torch[k] = self.convert(batch[k])
-        batch_conv_torch['enc_cnn_state'] = torch.stack(batch['enc_cnn_state'])
-
-        return batch_conv_torch
+        """ batch is taken from store columns into preallocated (reused) buffers of the arena (separate for FWD and UPD),
+        returned tensors are valid until the next call of build_batch() with the same for_training """
+
+        keys = {
+            'cards':    torch.long,
+            'event_id': torch.long,
+            'cash':     self.dtype,
+            'pl_id':    torch.long,
+            'pl_pos':   torch.long,
+            'pl_stats': self.dtype}
+        if self.use_equity:
+            keys['equity'] = self.dtype
+        if for_training:
+            keys.update({
+                'move':             torch.long,
+                'reward_sh':        self.dtype,
+                'allowed_moves':    torch.bool})
+
+        arena = self._arena_upd if for_training else self._arena_fwd
+        batch = {}
+        for k, dtype in keys.items():
+            arr, tns = arena.get(name=k, shape=(*rows.shape, *states.shape(k)), dtype=dtype)
+            arr[:] = states.take(k, rows)
+            batch[k] = tns
+
+        # None values (states without move / reward) are taken as 0 / no allowed moves
+        if for_training:
+            move = batch['move'].numpy()
+            batch['allowed_moves'].numpy()[move < 0] = False
+            move[move < 0] = 0
+            np.nan_to_num(batch['reward_sh'].numpy(), copy=False, nan=0.0)
+            batch['reward'] = batch.pop('reward_sh')
+
+        batch = {k: self.convert(v) for k,v in batch.items()}
+        batch['enc_cnn_state'] = (self._upd_cache if for_training else self._fwd_cache)[self._slots(player_ids)]
+
+        # FWD sequences of different lengths are right padded (with the last state) to be run with one FWD
+        if not for_training and len(set(seq_len)) > 1:
+            batch['seq_len'] = torch.tensor(seq_len, dtype=torch.long)
+
+        return batch
 
     def update_policy(self, player_ids:List[str], batch:DTNS) -> None:
         """ + compute logprob + publish """
@@ -320,10 +337,7 @@ class DMK_MOTorch_PG(DMK_MOTorch):
         batch['old_logprob'] = pre_logprob_out['logprob']
 
         out = self.backward(bypass_data_conv=True, **batch)
-
-        # save UPD states
-        for pid,state in zip(player_ids, out['fin_state']):
-            self._last_upd_state[pid] = state
+        self._upd_cache[self._slots(player_ids)] = out['fin_state'] # save UPD states
 
         if self._TBwr:
 
@@ -0,0 +1,140 @@
+from multiprocessing import Process
+from multiprocessing.connection import wait
+import numpy as np
+from pypaq.lipytools.pylogger import get_pylogger
+from pypaq.mpython.mptools import Que, QMessage
+from typing import List, Dict, Optional
+
+from pologic.game_config import GameConfig
+from pologic.vptable import VPTable
+from podecide.dmk import QueDMK
+from podecide.tools.wait_que import WaitQue
+
+
+class DMKTablesWorker(Process):
+    """ DMKTablesWorker is a Process that hosts DMKs together with tables of their players (VPTable),
+    DMKs are not started as separate processes, worker builds them (_pre_process) in its own memory scope,
+    table players states and decisions are passed with direct calls of DMK methods (collect_states, make_decisions),
+    there are no players Ques, Ques are used only for GM control messages:
+    - DMKs receive messages from GM with their que_from_gm, as they do while running their own process
+    - tables receive messages from GM with worker que_from_gm """
+
+    def __init__(
+            self,
+            dmkL: List[QueDMK],
+            pl_ids: List[List[str]],    # ids of players for every table
+            game_config: GameConfig,
+            que_to_gm: Que,
+            int_cards: bool=    True,
+            seed: Optional[int]=None,
+            logger=             None,
+            loglevel=           20,
+    ):
+
+        Process.__init__(self, name='DMKTablesWorker', target=self.__worker_proc)
+
+        if not logger:
+            logger = get_pylogger(name='DMKTablesWorker', level=loglevel)
+        self.logger = logger
+
+        self.dmkD: Dict[str,QueDMK] = {dmk.name: dmk for dmk in dmkL}
+        self.dmk_of: Dict[str,QueDMK] = {pid: dmk for dmk in dmkL for pid in dmk.queD_to_player} # {pid: DMK of player}
+
+        self.que_to_gm = que_to_gm      # here worker (DMKs and tables) puts data for GM
+        self.que_from_gm = WaitQue()    # here worker receives data for tables from GM
+
+        self.table = VPTable(
+            name=           'tbl',
+            game_config=    game_config,
+            pl_ids=         pl_ids,
+            int_cards=      int_cards,
+            seed=           seed,
+            logger=         self.logger)
+
+        self.logger.info(f'*** DMKTablesWorker *** initialized with {len(self.dmkD)} DMKs and {len(pl_ids)} tables')
+
+    def __worker_proc(self):
+        """ target of Process """
+
+        self.que_to_gm.put(QMessage(type='table_started'))
+
+        for dmk in self.dmkD.values():
+            dmk._pre_process()
+            self.que_to_gm.put(QMessage(type='dmk_status', data=f'{dmk.name} (DMK) _pre_process() done'))
+
+        dmk_process = {dn: True for dn in self.dmkD}    # DMK process is running
+        dmk_loop = {dn: False for dn in self.dmkD}      # DMK decisions loop is running
+        tables_running = True
+
+        decisions = None
+        while any(dmk_process.values()):
+
+            # process GM messages for DMKs
+            for dn,dmk in self.dmkD.items():
+                message = dmk.que_from_gm.get(block=False)
+                if message:
+
+                    if message.type == 'start_dmk_loop':
+                        dmk_loop[dn] = True
+                        self.que_to_gm.put(QMessage(type='dmk_status', data=f'{dn} (DMK) decisions_loop started'))
+
+                    elif message.type == 'stop_dmk_loop':
+                        dmk_loop[dn] = False
+                        self.que_to_gm.put(QMessage(type='dmk_status', data=f'{dn} (DMK) decisions_loop stopped'))
+
+                    elif message.type == 'stop_dmk_process':
+                        dmk._do_what_GM_says(message)
+                        dmk_process[dn] = False
+                        if dmk.states_ring:
+                            dmk.states_ring.close(unlink=True)
+                        self.que_to_gm.put(QMessage(type='dmk_status', data=f'{dn} (DMK) process finished'))
+
+                    else:
+                        dmk._do_what_GM_says(message)
+
+            # process GM message for tables
+            message = self.que_from_gm.get(block=False)
+            if message and message.type == 'stop_table':
+                tables_running = False
+                self.que_to_gm.put(QMessage(type='table_stopped'))
+
+            if tables_running and all(dmk_loop.values()):
+                decisions = self._run_step(decisions)
+            elif any(dmk_process.values()):
+                # nothing to run, wait for GM messages
+                wait([self.que_from_gm.reader] + [dmk.que_from_gm.reader for dn,dmk in self.dmkD.items() if dmk_process[dn]], timeout=1.0)
+
+    def _run_step(self, decisions:Optional[Dict]) -> Dict:
+        """ runs tables step with given decisions,
+        passes states and decision requests to DMKs, returns their decisions for the next step """
+
+        if decisions is None: out = self.table.step()
+        else:                 out = self.table.step(**decisions)
+
+        for pid, states in out['state_changes']:
+            self.dmk_of[pid].collect_states(player_id=pid, player_states=states)
+
+        n_msg_decision = {dn: 0 for dn in self.dmkD}
+        dec = out['decisions']
+        for pid, allowed_moves, moves_cash in zip(dec['pl_ids'], dec['allowed_moves'].tolist(), dec['moves_cash'].tolist()):
+            dmk = self.dmk_of[pid]
+            dmk._collect_allowed_moves(
+                player_id=      pid,
+                allowed_moves=  allowed_moves,
+                moves_cash=     moves_cash)
+            n_msg_decision[dmk.name] += 1
+
+        # every DMK makes decisions for all its waiting players
+        moves = {}
+        for dn,dmk in self.dmkD.items():
+            n_waiting = 0
+            n_msg = n_msg_decision[dn]
+            while n_msg or n_waiting:
+                decL, n_waiting = dmk._decisions_round(n_msg, n_waiting)
+                n_msg = 0
+                for pid, move, probs in decL:
+                    moves[pid] = move, probs
+
+        return {
+            'selected_moves':   np.asarray([moves[pid][0] for pid in dec['pl_ids']]),
+            'probs':            np.asarray([moves[pid][1] for pid in dec['pl_ids']])}
@@ -9,15 +9,18 @@ from torchness.tbwr import TBwr
 import random
 import statistics
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 
 from envy import DMK_MODELS_FD, PyPoksException
 from pologic.potable import QPTable, StepQPTable
 from pologic.game_config import GameConfig
 from pologic.hand_history import states2HHtexts
-from podecide.dmk import RanDMK, FolDMK, HumanDMK
-from podecide.tools.update_sync import UpdSync
+from podecide.dmk import RanDMK, NeurDMK, FolDMK, HumanDMK
+from podecide.dmk_tables_worker import DMKTablesWorker
+from podecide.tools.update_sync import UpdSync, UpdPolicy
+from podecide.tools.learner import LearnerServer
 from podecide.tools.devices_monitor import DEVMonitor
+from podecide.tools.device_balancer import DeviceBalancer
 from gui.human_game_gui import HumanGameGUI
 
 
@@ -115,6 +118,11 @@ class GameManager:
             loglevel=               20,
             debug_dmks=             False,          # sets DMKs logger into debug mode
             debug_tables=           False,          # sets tables logger into debug mode
+            int_cards=              True,           # tables run with cards as ints (0-51), str only for rendering
+            colocated=              False,          # DMKs and tables run in one worker process, without players Ques
+            learner_servers=        False,          # trainable NeurDMKs are updated by LearnerServer (one per device)
+            upd_policy: Union[str,UpdPolicy]=   'fifo', # UpdSync scheduling policy of updates
+            device_balancer: Optional[DeviceBalancer]=  None,   # assigns devices to NeurDMKs
     ):
 
         if name is None:
@@ -136,6 +144,11 @@ class GameManager:
         self.seed = seed
         self.tables = None
         self.debug_tables = debug_tables
+        self.int_cards = int_cards
+        self.colocated = colocated
+        self.learner_servers = learner_servers
+        self.upd_policy = upd_policy
+        self.worker: Optional[DMKTablesWorker] = None
         self.que_to_gm = Que()  # here GM receives data from DMKs and Tables
 
         ### build DMKs
@@ -147,6 +160,10 @@ class GameManager:
             for dmk_point in dmk_pointL:
                 dmk_point['collect_loop_stats'] = True
 
+        self.device_balancer = device_balancer
+        if device_balancer:
+            device_balancer.assign([dmk_point for dmk_type,dmk_point in zip(dmk_typeL, dmk_pointL) if issubclass(dmk_type, NeurDMK)])
+
         dmk_logger = get_child(logger=self.logger, name='dmks_logger')
         if debug_dmks: dmk_logger.setLevel(10)
 
@@ -223,16 +240,43 @@ class GameManager:
         while quesL:
             table_ques.append(quesL.pop())
             if len(table_ques) == self.game_config.table_size:
-                self.tables.append(QPTable(
-                    name=           f'tbl{len(self.tables)}',
-                    game_config=    self.game_config,
-                    que_to_gm=      self.que_to_gm,
-                    pl_ques=        {t[0]: (t[1], t[2]) for t in table_ques},
-                    logger=         table_logger))
+                self.tables.append(self._build_table(table_ques=table_ques, logger=table_logger))
                 table_ques = []
 
+    def _build_table(self, table_ques:List[Tuple[str,Que,Que]], logger) -> Union[QPTable,List[str]]:
+        """ builds table for players given with (pid, que_to_pl, que_from_pl)
+        for colocated GM returns only ids of players, tables are run by DMKTablesWorker """
+        if self.colocated:
+            return [t[0] for t in table_ques]
+        pl_rings = {
+            pid: dmk.states_ring
+            for dmk in self.dmkD.values() if dmk.states_ring
+            for pid in dmk.queD_to_player}
+
+        return QPTable(
+            name=           f'tbl{len(self.tables)}',
+            game_config=    self.game_config,
+            que_to_gm=      self.que_to_gm,
+            pl_ques=        {t[0]: (t[1], t[2]) for t in table_ques},
+            pl_rings=       {t[0]: pl_rings[t[0]] for t in table_ques if t[0] in pl_rings},
+            int_cards=      self.int_cards,
+            logger=         logger)
+
     def _start_tables(self):
         self.logger.debug(f'GM starts {len(self.tables)} tables..')
+        if self.colocated:
+            self.worker = DMKTablesWorker(
+                dmkL=           list(self.dmkD.values()),
+                pl_ids=         self.tables,
+                game_config=    self.game_config,
+                que_to_gm=      self.que_to_gm,
+                int_cards=      self.int_cards,
+                seed=           self.seed,
+                logger=         get_child(self.logger, name='worker_logger'))
+            self.worker.start()
+            self.que_to_gm.get()
+            self.logger.debug(f'> DMKTablesWorker process started!')
+            return
         for tbl in self.tables:
             tbl.start()
         for _ in self.tables:
@@ -240,9 +284,11 @@ class GameManager:
         self.logger.debug(f'> all tables processes started!')
 
     def _start_dmks_processes(self):
+        """ for colocated GM DMKs are built (pre-processed) by already started DMKTablesWorker """
         self.logger.debug(f'GM starts {len(self.dmkD)} DMKs processes..')
-        for dmk in self.dmkD.values():
-            dmk.start()
+        if not self.colocated:
+            for dmk in self.dmkD.values():
+                dmk.start()
         for _ in self.dmkD:
             message = self.que_to_gm.get()
             self.logger.debug(f'> {message.type}: {message.data}')
@@ -273,9 +319,10 @@ class GameManager:
     def _stop_tables(self):
         self.logger.debug('GM stops tables loops..')
         message = QMessage(type='stop_table', data=None)
-        for table in self.tables:
+        tables = [self.worker] if self.colocated else self.tables
+        for table in tables:
             table.que_from_gm.put(message)
-        for _ in self.tables:
+        for _ in tables:
             self.que_to_gm.get()
         self.logger.debug('> all tables loops stopped!')
 
@@ -323,12 +370,29 @@ class GameManager:
 
         tbwr = TBwr(logdir=f'{DMK_MODELS_FD}/{self.name}') if publish else None
 
-        # UpdSync will be used if any trainable DMKs found
-        got_trainable = any([d.trainable for d in self.dmkD.values()])
+        # LearnerServer (per device) updates trainable NeurDMKs, it runs updates of its device one by one
+        learner_servers = []
+        if self.learner_servers:
+            dmk_dev = {}
+            for dmk in self.dmkD.values():
+                if dmk.trainable and isinstance(dmk, NeurDMK):
+                    dmk_dev[dmk.name] = dmk.device
+            for dev in set(dmk_dev.values()):
+                server = LearnerServer(
+                    device=     dev,
+                    dmk_names=  [dn for dn in dmk_dev if dmk_dev[dn] == dev],
+                    logger=     get_child(self.logger))
+                for dn in server.oqueD:
+                    self.dmkD[dn].set_learner_server(que_out=server.ique, que_in=server.oqueD[dn])
+                learner_servers.append(server)
+
+        # UpdSync will be used if any trainable DMKs found (not needed with learner servers)
+        trainable = [d for d in self.dmkD.values() if d.trainable]
         upd_sync = UpdSync(
-            dmkL=       list(self.dmkD.values()),
+            dmkL=       trainable,
+            policy=     self.upd_policy,
             tb_name=    f'UpdSync_{self.name}' if publish else None,
-            logger=     get_child(self.logger)) if got_trainable else None
+            logger=     get_child(self.logger)) if trainable and not learner_servers else None
 
         dev_monitor = DEVMonitor(tb_name=f'DEVMon_{self.name}') if publish else None
 
@@ -353,6 +417,7 @@ class GameManager:
 
         stime = time.time()
         time_last_report = stime
+        dev_report = {}
         n_hands_last_report = 0
 
         self.logger.info(f'> {self.name} starts a game..')
@@ -427,9 +492,9 @@ class GameManager:
 
                 if tbwr: tbwr.add(value=hspeed, tag=f'GM/speedH/s', step=loop_ix)
 
-                # not using report here, but triggers TB publish
+                # triggers TB publish, last report is returned with loop_stats
                 if dev_monitor:
-                    dev_monitor.get_report()
+                    dev_report = dev_monitor.get_report() or dev_report
 
             # games break - factor condition
             if game_factor == 1:
@@ -455,6 +520,7 @@ class GameManager:
             upd_sync.stop()
 
         if dev_monitor:
+            dev_report = dev_monitor.get_report() or dev_report
             dev_monitor.stop()
 
         self._stop_tables()
@@ -483,19 +549,45 @@ class GameManager:
             dmk_name = data.pop('dmk_name')
             dmk_results[dmk_name]['global_stats'] = data['global_stats']
 
+        dmk_load = self._get_device_load()
+
         self._save_dmks()
         self._stop_dmks_processes()
 
+        for server in learner_servers:
+            server.stop()
+
         taken_sec = time.time() - stime
         taken_nfo = f'{taken_sec / 60:.1f}min' if taken_sec > 100 else f'{taken_sec:.1f}sec'
         speed = n_hands / taken_sec
         self.logger.info(f'{self.name} finished run_game (condition: {fin_condition}), avg speed: {speed:.1f}H/s, time taken: {taken_nfo}')
-        loop_stats = {'speed': speed}
+        loop_stats = {
+            'speed':        speed,
+            'time':         taken_sec,
+            'dev_report':   dev_report,
+            'dmk_load':     dmk_load}
 
         return {
             'dmk_results':  dmk_results,
             'loop_stats':   loop_stats}
 
+    def _get_device_load(self) -> Dict[str,Dict]:
+        """ asks NeurDMKs for time of device usage, returns {dn: {device, trainable, fwd_time, upd_time}},
+        device is the one assigned by DeviceBalancer (may be virtual) or the device of DMK """
+        dmk_names = [dn for dn in self.dmkD if isinstance(self.dmkD[dn], NeurDMK)]
+        message = QMessage(type='send_device_load', data=None)
+        for dn in dmk_names:
+            self.dmkD[dn].que_from_gm.put(message)
+        dmk_load = {}
+        for _ in dmk_names:
+            data = self.que_to_gm.get().data
+            dn = data.pop('dmk_name')
+            dmk_load[dn] = {
+                'device':       self.device_balancer.assigned[dn] if self.device_balancer else self.dmkD[dn].device,
+                'trainable':    self.dmkD[dn].trainable,
+                **data}
+        return dmk_load
+
     def _get_reports(
             self,
             dmk_report_IV:Dict[str,int] # {dn: from_IV}
@@ -532,6 +624,7 @@ class GameManager_PTR(GameManager):
         2. only dmk_point_PLL             -> all DMKs are playing (against each other)
         3. dmk_point_TRL & dmk_point_refL -> DMKs_TRL are training against DMKs_ref
         4. dmk_point_PLL & dmk_point_refL -> DMKs_PLL are playing against DMKs_ref
+        with colocated=True (kwargs of GameManager) DMKs and tables run in one DMKTablesWorker process
         """
 
         if not (dmk_point_PLL or dmk_point_TRL):
@@ -662,12 +755,7 @@ class GameManager_PTR(GameManager):
                 table_ques.append(ques_refD[self.ref_pattern[rp_ix]].pop())
                 rp_ix += 1
 
-            self.tables.append(QPTable(
-                name=           f'tbl{len(self.tables)}',
-                game_config=    self.game_config,
-                que_to_gm=      self.que_to_gm,
-                pl_ques=        {t[0]: (t[1], t[2]) for t in table_ques},
-                logger=         table_logger))
+            self.tables.append(self._build_table(table_ques=table_ques, logger=table_logger))
             table_ques = []
 
     def run_game(self, **kwargs) -> Dict:
@@ -1,23 +1,347 @@
+import math
 import numpy as np
-from typing import List, Optional
-
-
-class GameState:
-    """
-        keeps information (data) from a point of time in a game, when player:
-        - receives state_data from a table
-        - is supposed to do a move      (no move is also a move)
-        - gets reward for that move     (no reward is also a reward)
-    """
-
-    def __init__(self, state_orig_data):
-        self.state_orig_data=          state_orig_data  # orig values of state (any object)
-        self.allowed_moves: Optional[List[bool]]= None  # list of (player) allowed moves
-        self.moves_cash:    Optional[List[int]]=  None  # cash for allowed moves, used only by TK for GUI
-        self.probs:         Optional[np.ndarray]= None  # probabilities of moves, updated by _calc_probs
-        self.move:          Optional[int]=        None  # move (selected)
-        self.reward:        Optional[float]=      None  # reward (for move), direct
-        self.reward_sh:     Optional[float]=      None  # reward (for move), shared (among all previous unrewarded moves)
-
-    def __str__(self):
-        return str(self.state_orig_data)
\ No newline at end of file
+from typing import Any, Dict, List, Optional, Tuple, Union, NamedTuple, Sequence
+
+
+class EncodedState(NamedTuple):
+    """ fixed-layout record of encoded state data (NN input),
+    fields order is the order of data columns of GameStatesStore (NeurDMK) """
+    cards: Sequence[int]        # 7 x int: my cards 0-51, right padded with 52 (no card)
+    event_id: int               # 0-(1+len(table_moves)) <- POS + all MOVes
+    cash: Sequence[float]       # 8 x float: move cash, pl.cash, pl.cash_ch, pl.cash_cs, table.pot, table.cash_cs, table.cash_tc
+    pl_id: int                  # player ID: 0-table_size
+    pl_pos: int                 # player pos: 0-table_size
+    pl_stats: Sequence[float]   # player stats 0.0-1.0
+    equity: float=  0.0         # my cards equity 0.0-1.0 (used only with equity column)
+
+
+class GameStatesStore:
+    """ columnar store of game states of many players (DMK), a state keeps information (data) from a point of time
+    in a game, when player receives state data from a table, is supposed to do a move and gets reward for that move
+    every field (column) is a numpy array [n_players, capacity, *shape],
+    rows of a player are kept contiguous: [start, start+n) and split into regions:
+    - decided states (moved to dec, waiting for update)     [0, n_dec)
+    - new states with probs computed                        [n_dec, n_probs)
+    - new states without probs                              [n_probs, n)
+    (indexes above are relative to start)
+    new rows are appended in chunks (capacity grows), rows removed from the beginning only move start,
+    None values: allowed_moves - all False, move - -1, reward, reward_sh - NaN """
+
+    def __init__(
+            self,
+            player_ids: List[str],
+            n_moves: int,
+            chunk: int=     64, # capacity of a player grows by (multiple of) chunk
+    ):
+        self._slot = {pid: ix for ix,pid in enumerate(player_ids)}
+        self.n_moves = n_moves
+        self.chunk = chunk
+        self._capacity = chunk
+
+        self._specs: Dict[str,Tuple[Tuple[int,...],np.dtype,Any]] = {}
+        self._cols: Dict[str,np.ndarray] = {}
+        self._data_names: List[str] = [] # names of columns of (encoded) state data, filled with append()
+
+        n_players = len(self._slot)
+        self.start =   np.zeros(n_players, dtype=np.int64)
+        self.n_dec =   np.zeros(n_players, dtype=np.int64)
+        self.n_probs = np.zeros(n_players, dtype=np.int64)
+        self.n =       np.zeros(n_players, dtype=np.int64)
+
+        self.add_column('allowed_moves', shape=(n_moves,), dtype=np.bool_,   fill=False, data=False)
+        self.add_column('probs',         shape=(n_moves,), dtype=np.float32, fill=0.0,   data=False)
+        self.add_column('move',          shape=(),         dtype=np.int8,    fill=-1,    data=False)
+        self.add_column('reward',        shape=(),         dtype=np.float32, fill=np.nan, data=False)
+        self.add_column('reward_sh',     shape=(),         dtype=np.float32, fill=np.nan, data=False)
+
+    def add_column(self, name:str, shape:Tuple[int,...], dtype, fill=0, data=True):
+        """ adds column, data column values are set with append() """
+        self._specs[name] = (shape, np.dtype(dtype), fill)
+        self._cols[name] = np.full((len(self._slot), self._capacity, *shape), fill, dtype=dtype)
+        if data:
+            self._data_names.append(name)
+
+    def column(self, name:str) -> np.ndarray:
+        """ returns column array [n_players, capacity, *shape],
+        returned array is valid only until the next append() """
+        return self._cols[name]
+
+    def shape(self, name:str) -> Tuple[int,...]:
+        return self._specs[name][0]
+
+    @property
+    def n_new_all(self) -> int:
+        return int((self.n - self.n_dec).sum())
+
+    @property
+    def n_dec_all(self) -> int:
+        return int(self.n_dec.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return sum([c.nbytes for c in self._cols.values()])
+
+    def slot(self, player_id:str) -> int:
+        return self._slot[player_id]
+
+    def n_new(self, player_id:str) -> int:
+        s = self._slot[player_id]
+        return int(self.n[s] - self.n_dec[s])
+
+    def _grow(self, capacity:int):
+        """ grows capacity of all columns, rows of every player are moved to the beginning """
+        capacity = self.chunk * math.ceil(capacity / self.chunk)
+        for name, (shape, dtype, fill) in self._specs.items():
+            col = np.full((len(self._slot), capacity, *shape), fill, dtype=dtype)
+            for s in range(len(self._slot)):
+                col[s,:self.n[s]] = self._cols[name][s,self.start[s]:self.start[s]+self.n[s]]
+            self._cols[name] = col
+        self.start[:] = 0
+        self._capacity = capacity
+
+    def _reserve(self, s:int, n_rows:int):
+        """ makes space for n_rows new rows of slot s """
+        start, n = self.start[s], self.n[s]
+        if start + n + n_rows > self._capacity:
+            if n + n_rows > self._capacity:
+                self._grow(max(2 * self._capacity, n + n_rows))
+            else:
+                for col in self._cols.values():
+                    col[s,:n] = col[s,start:start+n]
+                self.start[s] = 0
+
+    def append(self, player_id:str, states:List[Tuple]):
+        """ appends new states of player,
+        state is a record (tuple, e.g. EncodedState) with values of data columns in order of columns """
+        if not states:
+            return
+        s = self._slot[player_id]
+        n_rows = len(states)
+        self._reserve(s, n_rows)
+        fr = self.start[s] + self.n[s]
+        for name, values in zip(self._data_names, zip(*states)):
+            self._cols[name][s,fr:fr+n_rows] = values
+        for name, (_, _, fill) in self._specs.items():
+            if name not in self._data_names:
+                self._cols[name][s,fr:fr+n_rows] = fill
+        self.n[s] += n_rows
+
+    def last(self, player_id:str) -> Tuple[int,int]:
+        """ returns (slot, index) of the last state of player, or None if player has no new states """
+        s = self._slot[player_id]
+        if self.n[s] == self.n_dec[s]:
+            return None
+        return s, int(self.start[s] + self.n[s] - 1)
+
+    def last_dec(self, player_id:str) -> Tuple[int,int]:
+        """ returns (slot, index) of the last decided state of player, or None if player has no decided states """
+        s = self._slot[player_id]
+        if not self.n_dec[s]:
+            return None
+        return s, int(self.start[s] + self.n_dec[s] - 1)
+
+    def dec(self, player_id:str, name:str) -> np.ndarray:
+        """ returns (view) array of decided states values of player """
+        s = self._slot[player_id]
+        return self._cols[name][s,self.start[s]:self.start[s]+self.n_dec[s]]
+
+    def rows(self, player_ids:List[str], first:Union[int,List[int]], seq_len:List[int]) -> np.ndarray:
+        """ returns flat indexes of rows [len(player_ids), max(seq_len)],
+        for every player seq_len rows starting from first (relative to start),
+        shorter sequences are right padded with the last row """
+        slots = np.asarray([self._slot[pid] for pid in player_ids])
+        seq_len = np.asarray(seq_len)
+        ixs = np.minimum(np.arange(seq_len.max()), seq_len[:,None] - 1)
+        return slots[:,None] * self._capacity + (self.start[slots] + first)[:,None] + ixs
+
+    def dec_rows(self) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        """ returns flat indexes of decided states rows of all players (players in slots order),
+        with slot of every row and index of row among player decided states """
+        seq_len = self.n_dec
+        pix = np.repeat(np.arange(len(seq_len)), seq_len)
+        local = np.arange(len(pix)) - (np.cumsum(seq_len) - seq_len)[pix]
+        return pix * self._capacity + self.start[pix] + local, pix, local
+
+    def take(self, name:str, rows:np.ndarray) -> np.ndarray:
+        """ returns values of rows (flat indexes) """
+        col = self._cols[name]
+        return col.reshape(-1, *col.shape[2:])[rows]
+
+    def put(self, name:str, rows:np.ndarray, values):
+        """ sets values of rows (flat indexes) """
+        col = self._cols[name]
+        col.reshape(-1, *col.shape[2:])[rows] = values
+
+    def new_without_probs(self) -> Tuple[List[str],List[int],List[int]]:
+        """ returns players with new states without probs, first of those states and their number """
+        player_ids, first, seq_len = [], [], []
+        for pid, s in self._slot.items():
+            if self.n[s] > self.n_probs[s]:
+                player_ids.append(pid)
+                first.append(int(self.n_probs[s]))
+                seq_len.append(int(self.n[s] - self.n_probs[s]))
+        return player_ids, first, seq_len
+
+    def set_probs_done(self, player_id:str):
+        """ marks all new states of player as having probs """
+        s = self._slot[player_id]
+        self.n_probs[s] = self.n[s]
+
+    def move_new_to_dec(self, player_id:str):
+        s = self._slot[player_id]
+        self.n_dec[s] = self.n_probs[s] = self.n[s]
+
+    def drop_new(self, player_id:str):
+        s = self._slot[player_id]
+        self.n[s] = self.n_probs[s] = self.n_dec[s]
+        if not self.n[s]:
+            self.start[s] = 0
+
+    def drop_dec(self, player_id:str, n_rows:Optional[int]=None):
+        """ removes first n_rows (all for None) decided states of player """
+        s = self._slot[player_id]
+        if n_rows is None or n_rows > self.n_dec[s]:
+            n_rows = self.n_dec[s]
+        self.start[s] += n_rows
+        self.n[s] -= n_rows
+        self.n_probs[s] -= n_rows
+        self.n_dec[s] -= n_rows
+        if not self.n[s]:
+            self.start[s] = 0
+
+
+def share_rewards(
+        states: GameStatesStore,
+        reward_share: Optional[int],    # for None reward is shared by all moves of the group, for int by N
+        table_cash_start: int,
+) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """ moves rewards of decided states down to moves and shares them (reward_sh) among moves, for every player:
+    - rewards are summed and moved down to the (next lower) move, rewards below the lowest move are dropped
+    - moves above the last reward are skipped (those do not have rewards yet)
+    - a rewarded move starts a group of moves: itself and moves down till the next rewarded one
+    - reward_sh of group moves = reward / len(group) (or / reward_share) / table_cash_start,
+      groups are shared from the top, till a group already shared (by previous update)
+    returns arrays (for players in slots order) of: index of the last rewarded move (-1 for none),
+    number of moves in groups, number of groups """
+
+    n_players = len(states.n_dec)
+    top_move = np.full(n_players, -1)
+    rows, pix, local = states.dec_rows()
+    if not len(rows):
+        return top_move, np.zeros(n_players, dtype=int), np.zeros(n_players, dtype=int)
+
+    reward = states.take('reward', rows).astype(np.float64)
+    is_rew = ~np.isnan(reward)
+
+    # moves up to the last reward of player
+    last_rew = np.full(n_players, -1)
+    np.maximum.at(last_rew, pix[is_rew], local[is_rew])
+    is_mov = (states.take('move', rows) != -1) & (local <= last_rew[pix])
+    mov = np.flatnonzero(is_mov)
+
+    # segments of rows: from a move up to the next move (or the end) of player, rows below the lowest move of player
+    seg_start = is_mov.copy()
+    seg_start[local == 0] = True
+    seg = np.cumsum(seg_start) - 1
+    # rewards summed (as moved down) from the top
+    rew_sum = np.bincount(seg[::-1], weights=np.where(is_rew, reward, 0.0)[::-1])
+    rew_cnt = np.bincount(seg, weights=is_rew)
+
+    rewarded = rew_cnt[seg[mov]] > 0
+    mov_rew = mov[rewarded]
+    reward[:] = np.nan
+    reward[mov_rew] = rew_sum[seg[mov_rew]]
+    states.put('reward', rows=rows, values=reward)
+
+    # group of every move (groups counted from the top, the highest move of player is always rewarded)
+    grp = np.cumsum(rewarded[::-1])[::-1] - 1
+    grp_size = np.bincount(grp)
+    grp_reward = np.empty(len(grp_size))
+    grp_reward[grp[rewarded]] = reward[mov_rew]
+
+    # groups are shared from the top till the highest already shared group of player
+    reward_sh = states.take('reward_sh', rows)
+    shared = ~np.isnan(reward_sh[mov_rew])
+    top_shared = np.full(n_players, -1)
+    np.maximum.at(top_shared, pix[mov_rew[shared]], local[mov_rew[shared]])
+    grp_share = np.zeros(len(grp_size), dtype=bool)
+    grp_share[grp[rewarded]] = local[mov_rew] > top_shared[pix[mov_rew]]
+
+    grp_reward_sh = grp_reward / (grp_size if reward_share is None else reward_share) / table_cash_start
+    share = grp_share[grp]
+    reward_sh[mov[share]] = grp_reward_sh[grp[share]]
+    states.put('reward_sh', rows=rows, values=reward_sh)
+
+    np.maximum.at(top_move, pix[mov], local[mov])
+    n_mov = np.bincount(pix[mov], minlength=n_players)
+    n_rew = np.bincount(pix[mov_rew], minlength=n_players)
+    return top_move, n_mov, n_rew
+
+
+if __name__ == "__main__":
+    """ RSS of trainable FolDMK (process) while its store fills up to upd_trigger decided states """
+
+    from multiprocessing import Process, Queue
+    from pypaq.mpython.mptools import Que
+    import tempfile
+
+    from pologic.game_config import GameConfig
+    from podecide.dmk import FolDMK
+    from podecide.dmk_motorch import DMK_MOTorch_PPO
+    from podecide.dmk_tables_worker import DMKTablesWorker
+
+    game_config = GameConfig.from_name('3players_2bets')
+    n_players = 300
+    upd_trigger = 30000
+
+    def get_rss() -> int:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS'):
+                    return int(line.split()[1])
+
+    def fill_states(save_topdir:str, que:Queue):
+        """ plays with FolDMK (without update) till upd_trigger decided states, puts RSS (kB) to que:
+        after first 1000 decided states (NN is warmed up) and at upd_trigger fill """
+        dmk = FolDMK(
+            name=                   'dmk_rss',
+            save_topdir=            save_topdir,
+            n_players=              n_players,
+            table_size=             game_config.table_size,
+            table_moves=            game_config.table_moves,
+            table_cash_start=       game_config.table_cash_start,
+            motorch_type=           DMK_MOTorch_PPO,
+            motorch_point=          {'load_cardnet_pretrained':False, 'device':None},
+            trainable=              True,
+            upd_trigger=            10**9, # update is never triggered
+            publish_player_stats=   False,
+            publishFWD=             False,
+            publishUPD=             False,
+            loglevel=               30)
+        pids = list(dmk.queD_to_player)
+        ts = game_config.table_size
+        worker = DMKTablesWorker(
+            dmkL=           [dmk],
+            pl_ids=         [pids[ix:ix+ts] for ix in range(0, len(pids), ts)],
+            game_config=    game_config,
+            que_to_gm=      Que(),
+            seed=           123,
+            loglevel=       30)
+        dmk._pre_process()
+
+        rss_warm = None
+        decisions = None
+        while dmk._states.n_dec_all < upd_trigger:
+            decisions = worker._run_step(decisions)
+            if rss_warm is None and dmk._states.n_dec_all >= 1000:
+                rss_warm = get_rss()
+        que.put((rss_warm, get_rss(), dmk._states.n_dec_all))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        que = Queue()
+        proc = Process(target=fill_states, args=(tmp_dir, que))
+        proc.start()
+        rss_warm, rss_fill, n_dec = que.get()
+        proc.join()
+    print(f'FolDMK ({n_players} players) RSS: {rss_warm/1024:.0f} MB at 1000 decided states, '
+          f'{rss_fill/1024:.0f} MB at {n_dec} decided states (+{(rss_fill-rss_warm)/1024:.1f} MB)')
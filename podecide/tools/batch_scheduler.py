@@ -0,0 +1,60 @@
+import math
+from typing import Tuple
+
+
+class BatchScheduler:
+    """ BatchScheduler decides when DMK should make decisions for waiting players
+    it learns online a curve of decisions round latency vs batch width (number of waiting players): L(w) = a + b*w
+    (exponentially weighted least squares) and an arrival rate of decision requests (r, requests/s)
+
+    waiting for more players up to width w gives throughput: w / (L(w) + (w-n)/r),
+    it grows with w while a > n/r (fixed latency of a round is bigger than time of collecting n requests),
+    so the decisions should be made when n >= a*r <- threshold,
+    waiting time is additionally limited by a deadline (of DMK loop), so tables are not starving """
+
+    def __init__(
+            self,
+            n_players: int,         # max batch width
+            decay: float=   0.99,   # decay of observations weight
+            min_obs: int=   10,     # min number of observations before threshold is estimated
+    ):
+        self.n_players = n_players
+        self.decay = decay
+        self.min_obs = min_obs
+
+        self.n_obs = 0
+        # weighted sums of: 1, w, w^2, L, w*L
+        self._sums = [0.0] * 5
+        self.arrival_rate = None
+
+    def observe_round(self, width:int, latency:float):
+        """ adds observation of decisions round """
+        self.n_obs += 1
+        self._sums = [s * self.decay + v for s,v in zip(self._sums, [1.0, width, width * width, latency, width * latency])]
+
+    def observe_requests(self, n_requests:int, interval:float):
+        """ adds observation of arrival of decision requests """
+        if interval > 0:
+            rate = n_requests / interval
+            self.arrival_rate = rate if self.arrival_rate is None else self.decay * self.arrival_rate + (1 - self.decay) * rate
+
+    @property
+    def curve(self) -> Tuple[float,float]:
+        """ returns (a,b) of latency curve: L(w) = a + b*w """
+        s1, sw, sww, sl, swl = self._sums
+        den = s1 * sww - sw * sw
+        if not s1:
+            return 0.0, 0.0
+        if den <= 1e-9 * s1 * s1: # all observations of the same width
+            return sl / s1, 0.0
+        b = (s1 * swl - sw * sl) / den
+        a = (sl - b * sw) / s1
+        return a, b
+
+    @property
+    def threshold(self) -> int:
+        """ number of waiting players that should trigger decisions """
+        if self.n_obs < self.min_obs or not self.arrival_rate:
+            return 1
+        a, _ = self.curve
+        return max(1, min(self.n_players, math.ceil(round(a * self.arrival_rate, 6))))
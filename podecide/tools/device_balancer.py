@@ -0,0 +1,132 @@
+import os
+import torch
+from pypaq.lipytools.pylogger import get_pylogger
+from typing import Dict, List, Optional, Any
+
+from envy import DMK_MODELS_FD, PyPoksException
+from podecide.dmk_motorch import DMK_MOTorch
+
+
+class DeviceBalancer:
+    """ assigns devices to NeurDMKs (motorch_point['device']) with a capacity model:
+    - cost of DMK: fraction of device time used by DMK in the last game - FWD (+UPD while training)
+    - memory of DMK: size of model (checkpoint) * mem_factor_tr for trainable (params, grads, Adam moments)
+    - load of device: processing & memory used by others - DEVMonitor report of the last game minus assigned DMKs
+    processing of devices is kept as a fraction of the device capacity (units of DEVMonitor report),
+    DMK using GPU for a fraction of time loads it with the same fraction, DMK using CPU loads cpu_share of all cores,
+    DMKs are assigned greedily - the most costly first, to the device with the lowest load where DMK fits in memory,
+    devices may be virtual (any labels) mapped to torch devices with device_map (e.g. CPU-only setup for tests),
+    assign() is called by GM while building DMKs, observe() with loop_stats returned by GM.run_game() """
+
+    def __init__(
+            self,
+            devices: Dict[Any,float],                       # {device: memory size (MB)}
+            device_map: Optional[Dict[Any,Any]]=    None,   # {device: torch device given to DMK} for virtual devices
+            default_cost: float=                    0.1,    # cost of DMK without measurements (and no other measured)
+            default_mem: float=                     100.0,  # size of model (MB) of DMK without checkpoint
+            mem_factor_tr: float=                   4.0,
+            cpu_share: Optional[float]=             None,   # fraction of CPU (all cores) used by DMK running FWD, for None torch threads / cores
+            save_topdir: str=                       DMK_MODELS_FD,
+            logger=                                 None,
+            loglevel=                               20):
+
+        if not devices:
+            raise PyPoksException('DeviceBalancer needs at least one device')
+
+        if not logger:
+            logger = get_pylogger(name='DeviceBalancer', level=loglevel)
+        self.logger = logger
+
+        self.devices = devices
+        self.device_map = device_map or {}
+        self.default_cost = default_cost
+        self.default_mem = default_mem
+        self.mem_factor_tr = mem_factor_tr
+        self.save_topdir = save_topdir
+        if cpu_share is None:
+            cpu_share = min(1.0, torch.get_num_threads() / (os.cpu_count() or 1))
+        self.cpu_share = cpu_share
+
+        self.fwd_cost: Dict[str,float] = {}                         # measured costs of DMKs
+        self.upd_cost: Dict[str,float] = {}
+        self.dev_proc: Dict[Any,float] = {d: 0.0 for d in devices}  # processing (fraction of capacity) used by others
+        self.dev_mem: Dict[Any,float] = {d: 0.0 for d in devices}   # memory (MB) used by others
+        self.assigned: Dict[str,Any] = {}                           # {dmk_name: device} of the last assignment
+
+    def dmk_cost(self, name:str, trainable:bool) -> float:
+        """ expected fraction of device time used by DMK, for not measured DMK mean of measured is used """
+        cost = self.fwd_cost.get(name, _mean(self.fwd_cost, self.default_cost))
+        if trainable:
+            cost += self.upd_cost.get(name, _mean(self.upd_cost, 0.0))
+        return cost
+
+    def dmk_mem(self, name:str, trainable:bool) -> float:
+        """ expected memory (MB) of DMK model on device """
+        ckpt_path = DMK_MOTorch._get_ckpt_path(model_name=name, save_topdir=self.save_topdir)
+        mem = os.path.getsize(ckpt_path) / 1024**2 if os.path.isfile(ckpt_path) else self.default_mem
+        return mem * self.mem_factor_tr if trainable else mem
+
+    def _dev_key(self, device) -> str:
+        """ key of (physical) device in DEVMonitor report """
+        dev = self.device_map.get(device, device)
+        return f'GPU{dev}' if type(dev) is int else 'CPU'
+
+    def dev_load(self, device, cost:float) -> float:
+        """ converts DMK cost (fraction of time) to the load of device (fraction of capacity) """
+        return cost if self._dev_key(device) != 'CPU' else cost * self.cpu_share
+
+    def observe(self, loop_stats:Dict) -> None:
+        """ updates the model with loop_stats of a game """
+
+        dmk_load = loop_stats['dmk_load']
+        for dn, load in dmk_load.items():
+            self.fwd_cost[dn] = load['fwd_time'] / loop_stats['time']
+            if load['trainable']:
+                self.upd_cost[dn] = load['upd_time'] / loop_stats['time']
+
+        # used by others = reported by DEVMonitor - used by DMKs assigned to the (physical) device
+        report = loop_stats.get('dev_report')
+        if report:
+            for d in self.devices:
+                key = self._dev_key(d)
+                if f'{key}_proc' in report:
+                    dmks = [dn for dn in dmk_load if dmk_load[dn]['device'] in self.devices and self._dev_key(dmk_load[dn]['device']) == key]
+                    proc = report[f'{key}_proc'] / 100 - sum([self.dev_load(dmk_load[dn]['device'], self.dmk_cost(dn, dmk_load[dn]['trainable'])) for dn in dmks])
+                    mem = report[f'{key}_mem'] / 100 * self.devices[d] - sum([self.dmk_mem(dn, dmk_load[dn]['trainable']) for dn in dmks])
+                    self.dev_proc[d] = max(0.0, proc)
+                    self.dev_mem[d] = max(0.0, mem)
+
+    def assign(self, dmk_points:List[Dict]) -> Dict[str,Any]:
+        """ assigns devices to DMKs - sets device in motorch_point of given points, returns {dmk_name: device} """
+
+        dmks = {}
+        for point in dmk_points:
+            trainable = point.get('trainable', False)
+            dmks[point['name']] = self.dmk_cost(point['name'], trainable), self.dmk_mem(point['name'], trainable)
+
+        proc = dict(self.dev_proc)
+        mem = dict(self.dev_mem)
+        self.assigned = {}
+        for dn in sorted(dmks, key=lambda x: dmks[x][0], reverse=True):
+            cost, dmk_mem = dmks[dn]
+            fit = [d for d in self.devices if mem[d] + dmk_mem <= self.devices[d]]
+            if not fit:
+                fit = [max(self.devices, key=lambda x: self.devices[x] - mem[x])]
+                self.logger.warning(f'DMK {dn} ({dmk_mem:.0f}MB) does not fit memory of any device, assigned to the one with the most free memory: {fit[0]}')
+            d = min(fit, key=lambda x: proc[x])
+            proc[d] += self.dev_load(d, cost)
+            mem[d] += dmk_mem
+            self.assigned[dn] = d
+
+        for point in dmk_points:
+            if not point.get('motorch_point'):
+                point['motorch_point'] = {}
+            point['motorch_point']['device'] = self.device_map.get(self.assigned[point['name']], self.assigned[point['name']])
+
+        load_nfo = ', '.join([f'{d}: {proc[d]:.2f} ({mem[d]:.0f}/{self.devices[d]:.0f}MB)' for d in self.devices])
+        self.logger.info(f'DeviceBalancer assigned {len(dmk_points)} DMKs, load of devices: {load_nfo}')
+        return dict(self.assigned)
+
+
+def _mean(costs:Dict[str,float], default:float) -> float:
+    return sum(costs.values()) / len(costs) if costs else default
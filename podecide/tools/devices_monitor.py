@@ -74,7 +74,7 @@ class DEVMonitor(ExSubprocess):
         self.logger.debug(f'UpdSync stopped process loop')
 
     def _prep_report(self) -> Dict[str,float]:
-        n = len(self.gpu_proc[self.gpu_dev_keys[0]])
+        n = len(self.cpu_proc)
         if n:
 
             report = {
@@ -0,0 +1,244 @@
+from pypaq.lipytools.pylogger import get_child
+from pypaq.mpython.mptools import ExSubprocess, Que, QMessage
+import queue
+import threading
+import time
+from torchness.tbwr import TBwr
+from torchness.types import DTNS
+from typing import List, Optional, Dict, Tuple
+
+from envy import PyPoksException
+from podecide.dmk_motorch import DMK_MOTorch
+from podecide.game_state import GameStatesStore
+
+
+class LearnerThread(threading.Thread):
+    """ LearnerThread runs updates of DMK policy in a thread - concurrently with the DMK decisions loop (actor)
+    learner owns a model (with optimizer) - a copy of the actor policy,
+    it consumes batches built (with learner model) from decided states, one update at a time,
+    after every update publishes weights of the model with a version (number of updates done) """
+
+    def __init__(self, mdl:DMK_MOTorch, version:int=0):
+        threading.Thread.__init__(self, name=f'LearnerThread:{mdl.name}', daemon=True)
+        self.mdl = mdl
+        self.version = version
+        self.lock = threading.Lock()    # held while updating, allows to use the model out of the thread
+        self._task_que = queue.Queue()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._weights: Optional[Tuple[int,Dict,float]] = None # last published (version, state_dict, time)
+        self._weights_lock = threading.Lock()
+        self._exception: Optional[Exception] = None
+
+    @property
+    def busy(self) -> bool:
+        return not self._idle.is_set()
+
+    def build_batch(self, player_ids:List[str], states:GameStatesStore, rows, seq_len:List[int]) -> DTNS:
+        """ builds training batch (with the learner model), may be called only while learner is not busy """
+        return self.mdl.build_batch(player_ids=player_ids, states=states, rows=rows, seq_len=seq_len, for_training=True)
+
+    def submit(self, player_ids:List[str], batch:DTNS) -> None:
+        """ submits update of the policy with the batch built with self.mdl """
+        if self.busy:
+            raise PyPoksException(f'{self.name} is busy, cannot submit next update')
+        self._idle.clear()
+        self._task_que.put((player_ids, batch))
+
+    def wait(self) -> None:
+        """ waits till submitted update is done """
+        self._idle.wait()
+
+    def pop_weights(self) -> Optional[Tuple[int,Dict,float]]:
+        """ returns (and removes) weights published after the last update: (version, state_dict, publish time) """
+        if self._exception:
+            raise PyPoksException(f'{self.name} update failed: {self._exception}')
+        with self._weights_lock:
+            weights, self._weights = self._weights, None
+        return weights
+
+    def run(self):
+        while True:
+            task = self._task_que.get()
+            if task is None:
+                break
+            player_ids, batch = task
+            try:
+                with self.lock:
+                    self.mdl.update_policy(player_ids=player_ids, batch=batch)
+                    self.version += 1
+                    weights = {k: v.detach().clone() for k,v in self.mdl.module.state_dict().items()}
+                with self._weights_lock:
+                    self._weights = self.version, weights, time.time()
+            except Exception as e:
+                self._exception = e
+            self._idle.set()
+
+    def save(self):
+        with self.lock:
+            self.mdl.save()
+
+    def load_ckpt(self):
+        with self.lock:
+            self.mdl.load_ckpt()
+
+    def stop(self):
+        self.wait()
+        self._task_que.put(None)
+        self.join()
+
+
+class LearnerClient:
+    """ LearnerClient is used by DMK (in DMK process) like LearnerThread, but updates are done by LearnerServer
+    training batches are built by the actor model in shared memory, so (for CPU actor) are sent to the server without copy,
+    client registers DMK policy at the server while initializing """
+
+    def __init__(
+            self,
+            mdl: DMK_MOTorch,           # actor model, builds batches
+            player_ids: List[str],
+            motorch_point: Dict,        # point of the actor model, server builds the learner model with it
+            que_to_server: Que,
+            que_from_server: Que,
+            version: int=   0,
+            do_TB: bool=    False,
+    ):
+        self.name = mdl.name
+        self.mdl = mdl
+        self.mdl.share_upd_memory()
+        self._que_to_server = que_to_server
+        self._que_from_server = que_from_server
+        self._busy = False
+        self._weights: Optional[Tuple[int,Dict,float]] = None
+
+        self._que_to_server.put(QMessage(type='register', data={
+            'name':             self.name,
+            'motorch_type':     type(mdl),
+            'motorch_point':    motorch_point,
+            'player_ids':       player_ids,
+            'state_dict':       {k: v.cpu() for k,v in mdl.module.state_dict().items()},
+            'version':          version,
+            'do_TB':            do_TB}))
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def build_batch(self, player_ids:List[str], states:GameStatesStore, rows, seq_len:List[int]) -> DTNS:
+        """ builds training batch (with the actor model), may be called only while learner is not busy """
+        return self.mdl.build_batch(player_ids=player_ids, states=states, rows=rows, seq_len=seq_len, for_training=True)
+
+    def submit(self, player_ids:List[str], batch:DTNS) -> None:
+        if self._busy:
+            raise PyPoksException(f'learner of {self.name} is busy, cannot submit next update')
+        self._busy = True
+        batch = {k: v.cpu() for k,v in batch.items() if k != 'enc_cnn_state'} # server uses its states
+        self._que_to_server.put(QMessage(type='update', data={'name':self.name, 'player_ids':player_ids, 'batch':batch}))
+
+    def __receive(self, block:bool) -> None:
+        msg = self._que_from_server.get(block=block)
+        if msg:
+            if msg.type != 'weights':
+                raise PyPoksException(f'learner of {self.name} received unexpected message: {msg.type}')
+            self._weights = msg.data
+            self._busy = False
+
+    def wait(self) -> None:
+        if self._busy:
+            self.__receive(block=True)
+
+    def pop_weights(self) -> Optional[Tuple[int,Dict,float]]:
+        if self._busy:
+            self.__receive(block=False)
+        weights, self._weights = self._weights, None
+        return weights
+
+    def __request(self, msg_type:str) -> None:
+        """ sends request and waits for confirmation """
+        self.wait()
+        self._que_to_server.put(QMessage(type=msg_type, data=self.name))
+        self._que_from_server.get()
+
+    def save(self):
+        self.__request('save')
+
+    def load_ckpt(self):
+        self.__request('load_ckpt')
+
+    def stop(self): pass
+
+
+class LearnerServer(ExSubprocess):
+    """ LearnerServer updates policies of many DMKs on one device
+    holds learner models (with optimizers) of registered DMKs (LearnerClient),
+    runs updates (with batches sent by DMKs) back-to-back, after every update sends weights to DMK """
+
+    def __init__(
+            self,
+            device,                 # device of learner models, for False device of DMK point is used
+            dmk_names: List[str],
+            **kwargs):
+
+        ExSubprocess.__init__(self, ique=Que(), **kwargs)
+
+        self.device = device
+        self.oqueD: Dict[str,Que] = {dn: Que() for dn in dmk_names} # here server puts weights for DMK
+
+        self.logger.info(f'*** LearnerServer *** initialized for {len(dmk_names)} DMKs, device: {device}')
+        self.start()
+
+    def subprocess_method(self):
+
+        mdlD: Dict[str,DMK_MOTorch] = {}
+        version: Dict[str,int] = {}
+
+        while True:
+
+            # all waiting messages are processed back-to-back
+            msgL = [self.ique.get()]
+            while True:
+                msg = self.ique.get(block=False)
+                if msg: msgL.append(msg)
+                else: break
+            self.logger.debug(f'LearnerServer got {len(msgL)} messages: {[m.type for m in msgL]}')
+
+            for msg in msgL:
+
+                if msg.type == 'stop':
+                    self.logger.debug('LearnerServer stopped')
+                    return
+
+                if msg.type == 'register':
+                    d = msg.data
+                    point = {}
+                    point.update(d['motorch_point'])
+                    point['load_cardnet_pretrained'] = False # weights are taken from DMK
+                    if self.device is not False:
+                        point['device'] = self.device
+                    mdl = d['motorch_type'](
+                        player_ids= d['player_ids'],
+                        logger=     get_child(self.logger),
+                        tbwr=       TBwr(logdir=f'{point["save_topdir"]}/{d["name"]}') if d['do_TB'] else None,
+                        do_TB=      d['do_TB'],
+                        **point)
+                    mdl.module.load_state_dict(d['state_dict'])
+                    mdlD[d['name']] = mdl
+                    version[d['name']] = d['version']
+                    self.logger.debug(f'LearnerServer registered {d["name"]}')
+
+                if msg.type == 'update':
+                    d = msg.data
+                    mdl = mdlD[d['name']]
+                    batch = {k: v.to(mdl.device) for k,v in d['batch'].items()}
+                    batch['enc_cnn_state'] = mdl.get_upd_state(d['player_ids'])
+                    mdl.update_policy(player_ids=d['player_ids'], batch=batch)
+                    version[d['name']] += 1
+                    weights = {k: v.detach().to('cpu', copy=True) for k,v in mdl.module.state_dict().items()}
+                    self.oqueD[d['name']].put(QMessage(type='weights', data=(version[d['name']], weights, time.time())))
+
+                if msg.type in ['save','load_ckpt']:
+                    getattr(mdlD[msg.data], msg.type)()
+                    self.oqueD[msg.data].put(QMessage(type=f'{msg.type}_done', data=None))
+
+    def stop(self):
+        self.ique.put(QMessage(type='stop', data=None))
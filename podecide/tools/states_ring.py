@@ -0,0 +1,134 @@
+from multiprocessing import Condition, Pipe
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from pypaq.pytypes import NPL
+from typing import List, Tuple, Optional
+
+from envy import PyPoksException
+from pologic.hand_history import STATE, states_dtype, encode_states, decode_states
+
+
+class StatesRing:
+    """ shared memory ring buffer of states sent by table players to DMK
+    states are kept as fixed-layout records (pologic.hand_history.states_dtype),
+    many producers (players at tables - processes) write with a lock, one consumer (DMK) drains,
+    producer notifies the consumer with a Pipe (once per drain) - reader may be waited on with multiprocessing.connection.wait,
+    when the ring is full producer waits (releasing the lock) till the consumer drains """
+
+    def __init__(
+            self,
+            player_ids: List[str],  # ids of players (of DMK) allowed to write
+            n_moves: int,           # number of table moves
+            size: int=  100000,     # capacity (number of records)
+    ):
+        self.player_ids = list(player_ids)
+        self._pix = {pid: ix for ix,pid in enumerate(self.player_ids)}
+        self.n_moves = n_moves
+        self.size = size
+        self.dtype = states_dtype(n_moves)
+
+        # header: total number of written & read records, notification sent flag, number of waiting producers
+        # followed by records
+        self._shm = SharedMemory(create=True, size=32 + self.size * self.dtype.itemsize)
+        self._cond = Condition()
+        self.reader, self._writer = Pipe(duplex=False)
+
+        self._header: Optional[NPL] = None
+        self._records: Optional[NPL] = None
+        self._map()
+        self._header[:] = 0
+
+    def _map(self):
+        self._header = np.ndarray((4,), dtype=np.int64, buffer=self._shm.buf)
+        self._records = np.ndarray((self.size,), dtype=self.dtype, buffer=self._shm.buf, offset=32)
+
+    def __getstate__(self):
+        """ views of shared memory are not pickled, they are mapped again """
+        state = self.__dict__.copy()
+        state['_header'] = None
+        state['_records'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._map()
+
+    @property
+    def n_waiting(self) -> int:
+        """ number of records written and not drained yet """
+        return int(self._header[0] - self._header[1])
+
+    def write(self, player_id:str, states:List[STATE]):
+        """ encodes and writes states of the player """
+
+        if not states:
+            return
+
+        records = encode_states(states, n_moves=self.n_moves, pix=self._pix[player_id])
+        n = len(records)
+        if n > self.size:
+            raise PyPoksException(f'StatesRing (size:{self.size}) cannot take {n} records at once')
+
+        with self._cond:
+
+            # wait for the consumer to make space, timeout covers notify missed by the consumer
+            while self._header[0] - self._header[1] + n > self.size:
+                self._header[3] += 1
+                self._cond.wait(timeout=0.01)
+                self._header[3] -= 1
+
+            wix = int(self._header[0] % self.size)
+            n_end = min(n, self.size - wix)
+            self._records[wix:wix+n_end] = records[:n_end]
+            if n_end < n:
+                self._records[:n-n_end] = records[n_end:]
+            self._header[0] += n
+
+            notify = not self._header[2]
+            if notify:
+                self._header[2] = 1
+
+        if notify:
+            self._writer.send_bytes(b'')
+
+    def drain(self) -> NPL:
+        """ returns contiguous array (copy) of all written records and releases their space """
+
+        # notification is cleared before reading, so any later write notifies again
+        self._header[2] = 0
+        while self.reader.poll():
+            self.reader.recv_bytes()
+
+        w, r = int(self._header[0]), int(self._header[1])
+        rix, wix = r % self.size, w % self.size
+        if w - r == 0:
+            return self._records[:0].copy()
+        if rix < wix:
+            records = self._records[rix:wix].copy()
+        else:
+            records = np.concatenate([self._records[rix:], self._records[:wix]])
+        self._header[1] = w
+
+        if self._header[3]:
+            with self._cond:
+                self._cond.notify_all()
+
+        return records
+
+    def drain_states(self) -> List[Tuple[str,List[STATE]]]:
+        """ drains and decodes records, returns list of (player_id, states) in order of writing """
+        records = self.drain()
+        if not len(records):
+            return []
+        states = decode_states(records)
+        pix = records['pix']
+        splits = (np.flatnonzero(pix[1:] != pix[:-1]) + 1).tolist()
+        return [(self.player_ids[pix[fr]], states[fr:to]) for fr,to in zip([0] + splits, splits + [len(records)])]
+
+    def close(self, unlink:bool=False):
+        """ closes shared memory of the ring (in current process), optionally unlinks it """
+        self._header = None
+        self._records = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
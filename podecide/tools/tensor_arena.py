@@ -0,0 +1,32 @@
+import numpy as np
+import torch
+from typing import Dict, Tuple
+
+
+class TensorArena:
+    """ TensorArena keeps preallocated (flat) buffers, reused between calls, for named arrays of a batch
+    a buffer grows (doubles) only when a requested array does not fit,
+    returned numpy array and torch tensor share memory with the buffer (and with arrays returned before),
+    so an array is valid only until the next request for the same name """
+
+    def __init__(self, pin_memory:bool=False, share_memory:bool=False):
+        self.pin_memory = pin_memory # pinned memory speeds up host -> CUDA copy
+        self.share_memory = share_memory # tensors of shared memory are sent to other processes without copy
+        self._buffers: Dict[str,torch.Tensor] = {}
+
+    def get(self, name:str, shape:Tuple[int,...], dtype:torch.dtype) -> Tuple[np.ndarray, torch.Tensor]:
+        """ returns contiguous (numpy, torch) views of given shape of the name buffer """
+        size = int(np.prod(shape))
+        buf = self._buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.numel() < size:
+            capacity = size if buf is None or buf.dtype != dtype else max(size, 2 * buf.numel())
+            buf = torch.empty(capacity, dtype=dtype, pin_memory=self.pin_memory)
+            if self.share_memory:
+                buf.share_memory_()
+            self._buffers[name] = buf
+        tns = buf[:size].view(shape)
+        return tns.numpy(), tns
+
+    @property
+    def nbytes(self) -> int:
+        return sum([b.numel() * b.element_size() for b in self._buffers.values()])
@@ -1,29 +1,99 @@
+import numpy as np
 from pypaq.mpython.mptools import ExSubprocess, Que, QMessage
 import time
 from torchness.tbwr import TBwr
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 
-from envy import DMK_MODELS_FD
+from envy import DMK_MODELS_FD, PyPoksException
 from podecide.dmk import NeurDMK
 
 
+class UpdPolicy:
+    """ scheduling policy of UpdSync, selects DMK (of waiting for a device ticket) to update next
+    DMK with the lowest cost is selected, baseline cost gives FIFO order,
+    aging decreases cost of DMK by aging * waiting time (sec) <- prevents starvation of DMKs with high cost """
+
+    def __init__(self, aging:float=0.0):
+        self.aging = aging
+        self.n_players: Dict[str,int] = {}          # number of players of DMK <- blocked while DMK updates
+        self.upd_time: Dict[str,float] = {}         # expected (moving average of measured) update time of DMK
+        self.upd_time_total: Dict[str,float] = {}   # total update time of DMK
+
+    def add_dmk(self, name:str, n_players:int):
+        self.n_players[name] = n_players
+        self.upd_time[name] = 0.0
+        self.upd_time_total[name] = 0.0
+
+    def observe_update(self, name:str, upd_time:float):
+        """ saves measured update time of DMK """
+        self.upd_time[name] = 0.7 * self.upd_time[name] + 0.3 * upd_time if self.upd_time_total[name] else upd_time
+        self.upd_time_total[name] += upd_time
+
+    def cost(self, name:str, wait_time:float) -> float:
+        return -wait_time
+
+    def select(self, waiting:Dict[str,float]) -> str:
+        """ selects DMK from waiting {name: request time}, ties are resolved by request order """
+        now = time.time()
+        return min(waiting, key=lambda dn: self.cost(dn, now - waiting[dn]) - self.aging * (now - waiting[dn]))
+
+
+class ShortestUpdFirst(UpdPolicy):
+    """ DMK with the shortest expected update time first, DMK without measured time goes first """
+
+    def cost(self, name:str, wait_time:float) -> float:
+        return self.upd_time[name]
+
+
+class MostBlockedFirst(UpdPolicy):
+    """ DMK with the highest number of players (blocked while DMK updates) first """
+
+    def cost(self, name:str, wait_time:float) -> float:
+        return -self.n_players[name]
+
+
+class FairShare(UpdPolicy):
+    """ weighted fair-share, DMK with the lowest update time (taken so far) per player first """
+
+    def cost(self, name:str, wait_time:float) -> float:
+        return self.upd_time_total[name] / self.n_players[name]
+
+
+UPD_POLICIES = {
+    'fifo':     UpdPolicy,
+    'suf':      ShortestUpdFirst,
+    'blocked':  MostBlockedFirst,
+    'fair':     FairShare}
+
+
 class UpdSync(ExSubprocess):
     """ Update Synchronizer for DMK
-    build by GM while starting a game """
+    build by GM while starting a game,
+    gives device tickets to DMKs waiting for update in order set by the policy """
 
     def __init__(
             self,
             dmkL:List[NeurDMK],
-            tb_name: Optional[str]= None,
+            policy: Union[str,UpdPolicy]=   'fifo', # name (of UPD_POLICIES) or policy object
+            tb_name: Optional[str]=         None,
             **kwargs):
 
         ExSubprocess.__init__(self, ique=Que(), **kwargs)
 
+        if type(policy) is str:
+            if policy not in UPD_POLICIES:
+                raise PyPoksException(f'unknown UpdSync policy: {policy}, supported: {list(UPD_POLICIES.keys())}')
+            policy = UPD_POLICIES[policy]()
+        self.policy = policy
+        for dmk in dmkL:
+            self.policy.add_dmk(name=dmk.name, n_players=len(dmk.queD_to_player))
+
         self.dmk_device = {dmk.name: dmk.device for dmk in dmkL}        # {dmk_name: device}
         devices = set(self.dmk_device.values())
         self.oqueD: Dict[str,Que] = {dmk.name: Que() for dmk in dmkL}   # here UpdSync puts ticket for waiting DMK
         self.ticket = {d: True for d in devices}                        # tickets, per device
-        self.dmks_waiting_for_ticket = {d: [] for d in devices}         # DMK waiting list per device
+        self.dmks_waiting_for_ticket: Dict[str,Dict[str,float]] = {d: {} for d in devices} # DMKs waiting (with request time) per device
+        self._ticket_holder = {d: None for d in devices}                # (DMK name, ticket time) per device
 
         # activate DMKs for requested updates
         for dmk in dmkL:
@@ -36,6 +106,7 @@ class UpdSync(ExSubprocess):
         self._stime_log = {d: {'update':[], 'idle':[]} for d in devices}
         self._tb_counter = {d: 0 for d in devices}
         self._tb_freq = 10
+        self._wait_log = {dmk.name: [] for dmk in dmkL}                 # wait times of DMKs for ticket
 
         self.logger.info(f'*** UpdSync *** initialized and started for {len(dmkL)} DMKs')
         self.start()
@@ -61,6 +132,8 @@ class UpdSync(ExSubprocess):
                 self.logger.debug(f'UpdSync received ticket from {msg.data}')
 
                 ctime = time.time()
+                dmk_name, ticket_time = self._ticket_holder[dev]
+                self.policy.observe_update(name=dmk_name, upd_time=ctime-ticket_time)
                 if self._stime[dev] is not None:
                     self._stime_log[dev]['update'].append(ctime - self._stime[dev])
                 self._stime[dev] = ctime
@@ -69,19 +142,22 @@ class UpdSync(ExSubprocess):
             if msg.type == 'update_request':
 
                 dev = self.dmk_device[msg.data]
-                self.dmks_waiting_for_ticket[dev].append(msg.data)
+                self.dmks_waiting_for_ticket[dev][msg.data] = time.time()
                 self.logger.debug(f'UpdSync received ticket request for dev:{dev} from {msg.data}, dmks_waiting: {self.dmks_waiting_for_ticket}')
 
             for dev in self.ticket:
                 if self.ticket[dev] and self.dmks_waiting_for_ticket[dev]:
 
-                    dmk_name = self.dmks_waiting_for_ticket[dev].pop(0)
+                    dmk_name = self.policy.select(self.dmks_waiting_for_ticket[dev])
+                    request_time = self.dmks_waiting_for_ticket[dev].pop(dmk_name)
                     msg = QMessage(type='ticket', data=None)
                     self.oqueD[dmk_name].put(msg)
                     self.ticket[dev] = False
                     self.logger.debug(f'UpdSync sent dev:{dev} ticket to {dmk_name}')
 
                     ctime = time.time()
+                    self._ticket_holder[dev] = dmk_name, ctime
+                    self._wait_log[dmk_name].append(ctime - request_time)
                     if self._stime[dev] is not None:
                         self._stime_log[dev]['idle'].append(ctime - self._stime[dev])
                     self._stime[dev] = ctime
@@ -100,10 +176,18 @@ class UpdSync(ExSubprocess):
                             waiting = len(self.dmks_waiting_for_ticket[dev])
                             tbwr.add(value=waiting, tag=f'UpdSync/GPU{dev}_waiting',    step=self._tb_counter[dev])
 
+                            # wait times (for ticket) of DMKs of device
+                            for dn in self._wait_log:
+                                if self.dmk_device[dn] == dev and self._wait_log[dn]:
+                                    tbwr.add_histogram(values=np.asarray(self._wait_log[dn]), tag=f'UpdSync/{dn}_wait', step=self._tb_counter[dev])
+
                             self._tb_counter[dev] += 1
 
                         self._stime_log[dev]['idle'] = []
                         self._stime_log[dev]['update'] = []
+                        for dn in self._wait_log:
+                            if self.dmk_device[dn] == dev:
+                                self._wait_log[dn] = []
 
         self.logger.debug(f'UpdSync stopped process loop')
 
@@ -0,0 +1,23 @@
+from multiprocessing import Pipe
+from pypaq.mpython.mptools import Que, QMessage
+from typing import Optional
+
+
+class WaitQue(Que):
+    """ Que that may be waited on (with multiprocessing.connection.wait) together with other ques / connections
+    every put() sends an empty notification with own Pipe, every got message consumes one,
+    reader (Connection) is ready when there are messages put and not got yet """
+
+    def __init__(self):
+        Que.__init__(self)
+        self.reader, self._writer = Pipe(duplex=False)
+
+    def put(self, msg:QMessage, **kwargs):
+        Que.put(self, msg, **kwargs)
+        self._writer.send_bytes(b'')
+
+    def get(self, block:bool=True, timeout:Optional[float]=None) -> Optional[QMessage]:
+        msg = Que.get(self, block=block, timeout=timeout)
+        if msg is not None:
+            self.reader.recv_bytes()
+        return msg
@@ -1,11 +1,21 @@
+from functools import lru_cache
+from itertools import repeat
+import numpy as np
 from pypaq.lipytools.files import w_jsonl, r_jsonl
+from pypaq.pytypes import NPL
 from typing import List, Tuple, Optional, Dict
 
-from envy import TBL_STT, DEBUG_MODE, get_pos_names
+from envy import TBL_STT, DEBUG_MODE, get_pos_names, PyPoksException
 from pologic.game_config import GameConfig
+from pologic.podeck import PDeck, HND_RNK
 
 STATE = Tuple[str,Tuple] # state type
 
+# names of STATEs, index is a code of STATE used by fixed-layout (numpy) encoding
+STATE_NAMES = ('GCF','HST','TST','POS','PSB','PBB','T$$','PLH','TCD','MOV','PRS','HFN')
+STATE_CODE = {nm: ix for ix,nm in enumerate(STATE_NAMES)}
+STATE_SV_SIZE = 32 # max length of str value of encoded STATE (names, PRS full_rank str)
+
 
 # poker hand history
 class HHistory:
@@ -107,14 +117,15 @@ def states2HHtexts(
             text = f'table POT: {st[1][0]}'
 
         if st[0] == 'PLH':
-            text = f'PLH: {st[1][0]} {st[1][1]} {st[1][2]}'
+            ca, cb = [PDeck.cts(c) if type(c) is int else c for c in st[1][1:]] # cards may be given as ints
+            text = f'PLH: {st[1][0]} {ca} {cb}'
 
         if st[0] == 'TST':
             if st[1][0] != 0: # not idle
                 text = f'** {TBL_STT[st[1][0]]}'
 
         if st[0] == 'TCD':
-            text = f'TCD: {" ".join(st[1])}'
+            text = f'TCD: {" ".join([PDeck.cts(c) for c in st[1]])}'
 
         if st[0] == 'MOV':
             text = f'MOV: {st[1][0]} {game_config.table_moves[st[1][1]][0]} {st[1][2]}'
@@ -132,4 +143,131 @@ def states2HHtexts(
         for k in rename:
             texts = [t.replace(k,rename[k]) for t in texts]
 
-    return texts
\ No newline at end of file
+    return texts
+
+
+@lru_cache
+def states_dtype(n_moves:int) -> np.dtype:
+    """ fixed-layout record of encoded STATE (for given number of table moves) """
+    return np.dtype([
+        ('pix', np.int32),                  # index of player the state is for (set by transport)
+        ('ev',  np.int8),                   # STATE code
+        ('iv',  np.int64, (10,)),           # int values (player index, cash, cards as ints, ..)
+        ('fv',  np.float64, (n_moves,)),    # float values (MOV probs, PRS won)
+        ('sv',  f'S{STATE_SV_SIZE}')])      # str value (names, PRS full_rank str)
+
+
+def encode_states(
+        states: List[STATE],
+        n_moves: int,
+        pix: int=   0,
+) -> NPL:
+    """ encodes (translated) states into array of fixed-layout records,
+    cards are encoded as ints (-1 for None) and are decoded as ints,
+    str values longer than STATE_SV_SIZE are not allowed (would be cut by the record) """
+
+    iv_zeros = (0,) * 10
+    fv_zeros = (0.0,) * n_moves
+
+    records = []
+    for nm, data in states:
+
+        iv = iv_zeros
+        fv = fv_zeros
+        sv = ''
+
+        if nm in ('TST','POS','PSB','PBB','T$$'):
+            iv = data + iv_zeros[len(data):]
+
+        elif nm == 'MOV':
+            iv = (*data[:3], *data[4], len(data[3]), 0, 0, 0)
+            fv = data[3] + [0.0] * (n_moves - len(data[3]))
+
+        elif nm == 'PLH':
+            iv = (data[0], *[-1 if c is None else PDeck.cti(c) for c in data[1:]]) + iv_zeros[3:]
+
+        elif nm == 'TCD':
+            iv = (len(data), *[PDeck.cti(c) for c in data]) + iv_zeros[1+len(data):]
+
+        elif nm in ('HST','HFN'):
+            sv = data[0]
+            iv = (data[1],) + iv_zeros[1:]
+
+        elif nm == 'GCF':
+            sv = data[0]
+
+        else: # PRS
+            fv = (data[1],) + fv_zeros[1:]
+            full_rank = data[2]
+            if type(full_rank) is str:
+                sv = full_rank
+                iv = (data[0], type(data[1]) is float) + iv_zeros[2:]  # type flag to decode won with its type
+            else:
+                iv = (data[0], type(data[1]) is float, full_rank[0], full_rank[1], *[PDeck.cti(c) for c in full_rank[2]], 1)
+
+        if len(sv) > STATE_SV_SIZE:
+            raise PyPoksException(f'str value of {nm} state is too long to encode (max {STATE_SV_SIZE}): {sv}')
+        records.append((pix, STATE_CODE[nm], iv, fv, sv))
+
+    return np.array(records, dtype=states_dtype(n_moves))
+
+
+def _decode_prs(iv:List[int], fv:List[float], sv:bytes) -> Tuple:
+    """ decodes PRS data """
+    won = fv[0] if iv[1] else int(fv[0])
+    if iv[9]:
+        five_cards = [PDeck.ctt(c) for c in iv[4:9]]
+        string = f'{HND_RNK[iv[2]]} {iv[3]:7} {" ".join([PDeck.cts(c) for c in five_cards])}'
+        full_rank = (iv[2], iv[3], five_cards, string)
+    else:
+        full_rank = sv.decode()
+    return iv[0], won, full_rank
+
+
+def decode_states(records:NPL) -> List[STATE]:
+    """ decodes array of fixed-layout records into states,
+    records are decoded in groups of the same STATE (by columns), then put back in order """
+
+    evs = records['ev']
+    states = np.empty(len(records), dtype=object)
+    for ev in np.unique(evs).tolist():
+
+        ixs = np.flatnonzero(evs == ev)
+        nm = STATE_NAMES[ev]
+        iv = records['iv'][ixs]
+
+        if nm == 'T$$':
+            data = map(tuple, iv[:,:4].tolist())
+
+        elif nm == 'TST':
+            data = zip(iv[:,0].tolist())
+
+        elif nm == 'MOV':
+            n_probs = iv[:,6].tolist()
+            probs = [p[:n] for p,n in zip(records['fv'][ixs].tolist(), n_probs)]
+            data = zip(*iv[:,:3].T.tolist(), probs, map(tuple, iv[:,3:6].tolist()))
+
+        elif nm == 'POS':
+            data = map(tuple, iv[:,:3].tolist())
+
+        elif nm in ('PSB','PBB'):
+            data = map(tuple, iv[:,:2].tolist())
+
+        elif nm == 'PLH':
+            data = [(c[0], *[None if c == -1 else c for c in c[1:3]]) for c in iv[:,:3].tolist()]
+
+        elif nm == 'TCD':
+            data = [tuple(c[1:1+c[0]]) for c in iv[:,:6].tolist()]
+
+        elif nm == 'GCF':
+            data = zip([sv.decode() for sv in records['sv'][ixs].tolist()])
+
+        elif nm in ('HST','HFN'):
+            data = zip([sv.decode() for sv in records['sv'][ixs].tolist()], iv[:,0].tolist())
+
+        else: # PRS
+            data = map(_decode_prs, iv.tolist(), records['fv'][ixs].tolist(), records['sv'][ixs].tolist())
+
+        states[ixs] = np.fromiter(zip(repeat(nm), data), dtype=object, count=len(ixs))
+
+    return states.tolist()
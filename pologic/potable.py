@@ -4,7 +4,7 @@ from pypaq.lipytools.pylogger import get_pylogger
 from pypaq.pytypes import NPL
 from pypaq.mpython.mptools import Que, QMessage
 import time
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 
 from envy import get_pos_names, DEBUG_MODE, PyPoksException
 from pologic.game_config import GameConfig
@@ -12,6 +12,186 @@ from pologic.hand_history import HHistory, STATE
 from pologic.podeck import PDeck
 
 
+def amc_helpers(table_moves:List) -> Tuple[bool, bool, List[int]]:
+    """ prepares helpers of amc() for given table_moves: enabledBRM, enabledBRA, indexesBRX """
+    enabledBRM = table_moves[3][0] == 'BRM'
+    enabledBRA = table_moves[-1][0] == 'BRA'
+    indexesBRX = [ix for ix in range(len(table_moves)) if 'BR' in table_moves[ix][0]]
+    if enabledBRM:
+        indexesBRX = indexesBRX[1:]
+    if enabledBRA:
+        indexesBRX = indexesBRX[:-1]
+    return enabledBRM, enabledBRA, indexesBRX
+
+
+def amc(
+        cash: int,              # player cash
+        cash_cs: int,           # player cash current street
+        table_cash_tc: int,
+        table_cash_rs: int,
+        table_pot: int,
+        table_state: int,
+        table_moves: List,
+        enabledBRM: bool,       # helpers prepared with amc_helpers()
+        enabledBRA: bool,
+        indexesBRX: List[int],
+) -> Tuple[List[bool], List[int]]:
+    """ computes allowed_moves and moves_cash
+    returned moves_cash values = cash to be added to pot with current move
+    it is a diff between BET-TO and player cash_cs """
+
+    allowed_moves = [True] * len(table_moves) # by now all are allowed
+    moves_cash =    [0]    * len(table_moves) # by now all have 0
+
+    moves_cash[2] = table_cash_tc - cash_cs # CLL
+
+    min_bet_size = table_cash_tc + table_cash_rs
+
+    if enabledBRM:
+        moves_cash[3] = min_bet_size - cash_cs
+
+    # BR-X
+    for mIX in indexesBRX:
+
+        mov_def = table_moves[mIX]
+        if table_state == 1: val = round(mov_def[1] * table_cash_tc)
+        else:                     val = round(mov_def[2] * table_pot)
+
+        # check if bet meets min-bet size condition
+        if val < min_bet_size:
+            allowed_moves[mIX] = False
+        else:
+            moves_cash[mIX] = val - cash_cs # reduce by cash already put by the player on the current street
+
+    # BRA (all-in)
+    if enabledBRA:
+        moves_cash[-1] = cash
+
+    ### up to now "baseline" is set, it is time to update with more conditions
+
+    # if there is cash to CLL then cannot CCK
+    if moves_cash[2] > 0:
+        allowed_moves[0] = False
+    # if CLL cash is 0 then cannot CLL (nobody bet on the street yet -> CCK or BR)
+    else:
+        allowed_moves[2] = False
+
+    # if can CCK then cannot FLD
+    if allowed_moves[0]:
+        allowed_moves[1] = False
+
+    # not enough to make full CLL -> reduce
+    if moves_cash[2] > cash:
+        moves_cash[2] = cash
+
+    # disable BRA if BRA cash == CLL cash
+    if enabledBRA and moves_cash[2] == moves_cash[-1]:
+        allowed_moves[-1] = False
+        moves_cash[-1] = 0
+
+    # eventually reduce moves_cash of BRM + BR-X and disable all next (higher)
+    # INFO: if BRM will be reduced then this is not-valid-raise case
+    already_reduced = False
+    indexes_to_reduce = indexesBRX if not enabledBRM else [3] + indexesBRX
+    for mIX in indexes_to_reduce:
+
+        if already_reduced:
+            allowed_moves[mIX] = False
+            moves_cash[mIX] = 0
+
+        else:
+            if allowed_moves[mIX] and moves_cash[mIX] >= cash:
+                if not enabledBRA:
+                    moves_cash[mIX] = cash
+                else:
+                    allowed_moves[mIX] = False
+                    moves_cash[mIX] = 0
+                already_reduced = True
+
+    return allowed_moves, moves_cash
+
+
+def amc_NPL(
+        cash: NPL,              # players cash, shape (n,)
+        cash_cs: NPL,           # players cash current street
+        table_cash_tc: NPL,
+        table_cash_rs: NPL,
+        table_pot: NPL,
+        table_state: NPL,
+        table_moves: List,
+) -> Tuple[NPL, NPL]:
+    """ vectorized amc() for n decision points at once
+    returns allowed_moves (bool) and moves_cash (int64) arrays of shape (n,n_moves), bit-exact with amc() """
+
+    cash, cash_cs, table_cash_tc, table_cash_rs, table_pot = [
+        np.asarray(a, dtype=np.int64) for a in [cash, cash_cs, table_cash_tc, table_cash_rs, table_pot]]
+    table_state = np.asarray(table_state)
+
+    enabledBRM, enabledBRA, indexesBRX = amc_helpers(table_moves)
+
+    allowed_moves = np.ones((len(cash), len(table_moves)), dtype=bool)
+    moves_cash = np.zeros((len(cash), len(table_moves)), dtype=np.int64)
+
+    moves_cash[:,2] = table_cash_tc - cash_cs # CLL
+
+    min_bet_size = table_cash_tc + table_cash_rs
+
+    if enabledBRM:
+        moves_cash[:,3] = min_bet_size - cash_cs
+
+    # BR-X, np.round() as round() rounds half to even
+    if indexesBRX:
+        mul_preflop = np.asarray([table_moves[mIX][1] for mIX in indexesBRX])
+        mul_postflop = np.asarray([table_moves[mIX][2] for mIX in indexesBRX])
+        val = np.where(
+            table_state[:,None] == 1,
+            np.round(mul_preflop * table_cash_tc[:,None]),
+            np.round(mul_postflop * table_pot[:,None])).astype(np.int64)
+        # check if bet meets min-bet size condition
+        meets = val >= min_bet_size[:,None]
+        allowed_moves[:,indexesBRX] = meets
+        moves_cash[:,indexesBRX] = np.where(meets, val - cash_cs[:,None], 0)
+
+    # BRA (all-in)
+    if enabledBRA:
+        moves_cash[:,-1] = cash
+
+    # if there is cash to CLL then cannot CCK, if CLL cash is 0 then cannot CLL
+    cll = moves_cash[:,2] > 0
+    allowed_moves[cll,0] = False
+    allowed_moves[~cll,2] = False
+
+    # if can CCK then cannot FLD
+    allowed_moves[allowed_moves[:,0],1] = False
+
+    # not enough to make full CLL -> reduce
+    moves_cash[:,2] = np.minimum(moves_cash[:,2], cash)
+
+    # disable BRA if BRA cash == CLL cash
+    if enabledBRA:
+        same = moves_cash[:,2] == moves_cash[:,-1]
+        allowed_moves[same,-1] = False
+        moves_cash[same,-1] = 0
+
+    # eventually reduce moves_cash of BRM + BR-X and disable all next (higher)
+    already_reduced = np.zeros(len(cash), dtype=bool)
+    indexes_to_reduce = indexesBRX if not enabledBRM else [3] + indexesBRX
+    for mIX in indexes_to_reduce:
+
+        allowed_moves[already_reduced,mIX] = False
+        moves_cash[already_reduced,mIX] = 0
+
+        reduce = ~already_reduced & allowed_moves[:,mIX] & (moves_cash[:,mIX] >= cash)
+        if not enabledBRA:
+            moves_cash[reduce,mIX] = cash[reduce]
+        else:
+            allowed_moves[reduce,mIX] = False
+            moves_cash[reduce,mIX] = 0
+        already_reduced |= reduce
+
+    return allowed_moves, moves_cash
+
+
 class PPlayer:
     """ PPlayer is an interface of player @table
     PPlayer is "a part of" poker table (PTable)
@@ -45,13 +225,7 @@ class PPlayer:
 
         # helpers prepared once and used in _amc()
         self.n_moves = len(self.table_moves)
-        self.enabledBRM = self.table_moves[3][0] == 'BRM'
-        self.enabledBRA = self.table_moves[-1][0] == 'BRA'
-        self.indexesBRX = [ix for ix in range(len(self.table_moves)) if 'BR' in self.table_moves[ix][0]]
-        if self.enabledBRM:
-            self.indexesBRX = self.indexesBRX[1:]
-        if self.enabledBRA:
-            self.indexesBRX = self.indexesBRX[:-1]
+        self.enabledBRM, self.enabledBRA, self.indexesBRX = amc_helpers(self.table_moves)
 
         self.nhs_IX = 0     # next hand_state index to update from (while sending game states)
 
@@ -61,76 +235,17 @@ class PPlayer:
         """ computes allowed_moves and moves_cash
         returned moves_cash values = cash to be added to pot with current move
         it is a diff between BET-TO and player.cash_cs """
-
-        allowed_moves = [True] * self.n_moves # by now all are allowed
-        moves_cash =    [0]    * self.n_moves # by now all have 0
-
-        moves_cash[2] = self.table.cash_tc - self.cash_cs # CLL
-
-        min_bet_size = self.table.cash_tc + self.table.cash_rs
-
-        if self.enabledBRM:
-            moves_cash[3] = min_bet_size - self.cash_cs
-
-        # BR-X
-        for mIX in self.indexesBRX:
-
-            mov_def = self.table_moves[mIX]
-            if self.table.state == 1: val = round(mov_def[1] * self.table.cash_tc)
-            else:                     val = round(mov_def[2] * self.table.pot)
-
-            # check if bet meets min-bet size condition
-            if val < min_bet_size:
-                allowed_moves[mIX] = False
-            else:
-                moves_cash[mIX] = val - self.cash_cs # reduce by cash already put by the player on the current street
-
-        # BRA (all-in)
-        if self.enabledBRA:
-            moves_cash[-1] = self.cash
-
-        ### up to now "baseline" is set, it is time to update with more conditions
-
-        # if there is cash to CLL then cannot CCK
-        if moves_cash[2] > 0:
-            allowed_moves[0] = False
-        # if CLL cash is 0 then cannot CLL (nobody bet on the street yet -> CCK or BR)
-        else:
-            allowed_moves[2] = False
-
-        # if can CCK then cannot FLD
-        if allowed_moves[0]:
-            allowed_moves[1] = False
-
-        # not enough to make full CLL -> reduce
-        if moves_cash[2] > self.cash:
-            moves_cash[2] = self.cash
-
-        # disable BRA if BRA cash == CLL cash
-        if self.enabledBRA and moves_cash[2] == moves_cash[-1]:
-            allowed_moves[-1] = False
-            moves_cash[-1] = 0
-
-        # eventually reduce moves_cash of BRM + BR-X and disable all next (higher)
-        # INFO: if BRM will be reduced then this is not-valid-raise case
-        already_reduced = False
-        indexes_to_reduce = self.indexesBRX if not self.enabledBRM else [3] + self.indexesBRX
-        for mIX in indexes_to_reduce:
-
-            if already_reduced:
-                allowed_moves[mIX] = False
-                moves_cash[mIX] = 0
-
-            else:
-                if allowed_moves[mIX] and moves_cash[mIX] >= self.cash:
-                    if not self.enabledBRA:
-                        moves_cash[mIX] = self.cash
-                    else:
-                        allowed_moves[mIX] = False
-                        moves_cash[mIX] = 0
-                    already_reduced = True
-
-        return allowed_moves, moves_cash
+        return amc(
+            cash=           self.cash,
+            cash_cs=        self.cash_cs,
+            table_cash_tc=  self.table.cash_tc,
+            table_cash_rs=  self.table.cash_rs,
+            table_pot=      self.table.pot,
+            table_state=    self.table.state,
+            table_moves=    self.table_moves,
+            enabledBRM=     self.enabledBRM,
+            enabledBRA=     self.enabledBRA,
+            indexesBRX=     self.indexesBRX)
 
     def _make_decision(
             self,
@@ -218,8 +333,10 @@ class PTable:
             name: str,
             game_config: GameConfig,
             pl_ids: List[str],
-            logger=     None,
-            loglevel=   20,
+            int_cards: bool=    False,  # cards (PLH, TCD, players hands, table cards) are kept as ints (0-51), not str
+            seed: Optional[int]=None,   # seed of table deck, allows to reproduce deals
+            logger=             None,
+            loglevel=           20,
     ):
         if not logger:
             logger = get_pylogger(name='PTable', level=loglevel)
@@ -227,7 +344,8 @@ class PTable:
 
         self.name = name
         self.gc = game_config
-        self.deck =     PDeck()
+        self.int_cards = int_cards
+        self.deck =     PDeck(seed=seed)
 
         self.state =   0            # table state while running hand (int)
         self.cards =   []           # table cards (max 5)
@@ -285,6 +403,18 @@ class PTable:
         """ rotates table players (moves BTN right) """
         self.players.append(self.players.pop(0))
 
+    def _deal_card(self) -> Union[int,str]:
+        """ deals one card from deck in table representation """
+        if self.int_cards:
+            return self.deck.get_card_int()
+        return PDeck.cts(self.deck.get_card())
+
+    def _given_card(self, card:str) -> Union[int,str]:
+        """ converts card given with hh (str) to table representation """
+        if self.int_cards:
+            return PDeck.cti(card)
+        return card
+
     def add_hh_event(self, event:STATE):
         self.hh.events.append(event)
         """
@@ -394,10 +524,9 @@ class PTable:
                 cb = self.deck.get_ex_card(cbs)
                 if ca is None or cb is None:
                     raise PyPoksException(f'hh_mvh player {pl.id} cards not valid')
-                pl.hand = cas, cbs
+                pl.hand = self._given_card(cas), self._given_card(cbs)
             else:
-                ca, cb = self.deck.get_card(), self.deck.get_card()
-                pl.hand = PDeck.cts(ca), PDeck.cts(cb)
+                pl.hand = self._deal_card(), self._deal_card()
             self.add_hh_event(event=('PLH', (pl.id, pl.hand[0], pl.hand[1])))
 
         # set preflop values
@@ -434,19 +563,19 @@ class PTable:
                         tc = self.deck.get_ex_card(c)
                         if tc is None:
                             raise PyPoksException(f'hh_mvh table card {c} at state {self.state} not valid')
-                        new_table_cards.append(c)
+                        new_table_cards.append(self._given_card(c))
                 # eventually fill with random
                 while len(new_table_cards) < 3:
-                    new_table_cards.append(PDeck.cts(self.deck.get_card()))
+                    new_table_cards.append(self._deal_card())
             if self.state in [3,4]:
                 if hh_mvh:
                     c = hh_mvh.pop(0)[1]
                     tc = self.deck.get_ex_card(c)
                     if tc is None:
                         raise PyPoksException(f'hh_mvh table card {c} at state {self.state} not valid')
-                    new_table_cards = [c]
+                    new_table_cards = [self._given_card(c)]
                 else:
-                    new_table_cards = [PDeck.cts(self.deck.get_card())]
+                    new_table_cards = [self._deal_card()]
             if new_table_cards:
                 self.cards += new_table_cards
                 self.add_hh_event(event=('TCD', tuple(new_table_cards)))
@@ -555,26 +684,25 @@ class PTable:
             else:
                 self.add_hh_event(event=('TST', (5,)))
 
-                # get their ranks and top rank
+                # get their rank values and top rank
                 top_rank = 0
+                rank_values = {}
                 for pl in hand_pls:
-                    cards = list(pl.hand)+self.cards
-                    rank = PDeck.cards_rank(cards)
-                    winnersD[pl.id]['full_rank'] = rank
-                    if top_rank < rank[1]: top_rank = rank[1]
+                    cards = list(pl.hand) + self.cards
+                    if not self.int_cards:
+                        cards = [PDeck.cti(c) for c in cards]
+                    rank_values[pl.id] = PDeck.cards_rank_value(cards)
+                    if top_rank < rank_values[pl.id]: top_rank = rank_values[pl.id]
 
-                # who's got top rank
+                # who's got top rank, full rank is computed only for winners
                 n_winners = 0
-                for pln in winnersD:
-                    if winnersD[pln]['full_rank'][1] == top_rank:
-                        winnersD[pln]['winner'] = True
+                for pl in hand_pls:
+                    if rank_values[pl.id] == top_rank:
+                        winnersD[pl.id]['winner'] = True
+                        winnersD[pl.id]['full_rank'] = PDeck.cards_rank(list(pl.hand)+self.cards)
                         n_winners += 1
-
-                # not shown for rest
-                for pln in winnersD:
-                    if not winnersD[pln]['winner']:
-                        if winnersD[pln]['full_rank'] != 'muck':
-                            winnersD[pln]['full_rank'] = 'not_shown'
+                    else:
+                        winnersD[pl.id]['full_rank'] = 'not_shown'
 
             # manage cash and information about
             prize = self.pot / n_winners
@@ -611,10 +739,12 @@ class QPPlayer(PPlayer):
             self,
             que_to_player: Que,   # DMK -> player, player receives decision from DMK
             que_from_player: Que, # player -> DMK, player sends to DMK state_changes & make_decision (extracted from hh)
+            states_ring=    None, # optional DMK states ring (podecide.tools.states_ring.StatesRing), if given state_changes are written there
             **kwargs):
         PPlayer.__init__(self, **kwargs)
         self.que_to_player = que_to_player
         self.que_from_player = que_from_player
+        self.states_ring = states_ring
 
     def _prepare_nt_states(self, hh:HHistory) -> List[STATE]:
         """ prepares list of new & translated events from table hh """
@@ -624,6 +754,9 @@ class QPPlayer(PPlayer):
 
     def take_hh(self, hh: HHistory):
         """ takes actual hh from table, sends new & translated states to DMK """
+        if self.states_ring is not None:
+            self.states_ring.write(self.id, self._prepare_nt_states(hh))
+            return
         message = QMessage(
             type = 'state_changes',
             data = {'id':self.id, 'state_changes':self._prepare_nt_states(hh)})
@@ -654,6 +787,7 @@ class QPTable(PTable, Process):
             self,
             pl_ques: Dict[str, Tuple[Que, Que]],
             que_to_gm :Que,
+            pl_rings: Optional[Dict]=   None, # {pid: StatesRing} for players whose DMK receives states with a ring
             **kwargs):
 
         Process.__init__(
@@ -665,6 +799,7 @@ class QPTable(PTable, Process):
         self.que_from_gm = Que()   # here Table receives data from GM
 
         self.pl_ques = pl_ques
+        self.pl_rings = pl_rings or {}
 
         PTable.__init__(self, pl_ids=list(self.pl_ques.keys()), **kwargs)
 
@@ -675,6 +810,7 @@ class QPTable(PTable, Process):
                 table_moves=        self.gc.table_moves,
                 que_to_player=      self.pl_ques[id][0],
                 que_from_player=    self.pl_ques[id][1],
+                states_ring=        self.pl_rings.get(id),
                 logger=             self.logger,
             ) for id in pl_ids]
         return players
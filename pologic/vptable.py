@@ -0,0 +1,472 @@
+import numpy as np
+from pypaq.lipytools.pylogger import get_pylogger
+from pypaq.pytypes import NPL
+from typing import List, Dict, Tuple, Optional, Any
+
+from envy import PyPoksException
+from pologic.game_config import GameConfig
+from pologic.hand_history import HHistory, STATE
+from pologic.podeck import PDeck
+from pologic.potable import amc_NPL
+
+# results of VPTable._advance()
+_ADV_DEC = 0 # player has to make a decision
+_ADV_FLD = 1 # hand finished, everybody folded to one player
+_ADV_SDN = 2 # hand finished with showdown
+
+
+class VPTable:
+    """ VPTable (vectorized PTable) runs hands of many poker tables in lockstep
+    table state of all tables is kept with numpy arrays (tables x seats),
+    seats of a table are ordered by positions in the current hand (SB, BB, ..), players are rotated after every hand,
+    every step applies decisions of all waiting players at once and runs all tables till players have to make next decisions,
+    for every table VPTable builds the same HH (events) as PTable, players state changes are translated as with QPPlayer,
+    replaying HH with hh_given is not supported """
+
+    def __init__(
+            self,
+            name: str,
+            game_config: GameConfig,
+            pl_ids: List[List[str]],    # ids of players for every table
+            int_cards: bool=    True,   # cards (PLH, TCD) are kept as ints (0-51), not str
+            seed: Optional[int]=None,   # seed of cards dealing, allows to reproduce deals
+            logger=             None,
+            loglevel=           20,
+    ):
+        if not logger:
+            logger = get_pylogger(name='VPTable', level=loglevel)
+        self.logger = logger
+
+        self.name = name
+        self.gc = game_config
+        self.int_cards = int_cards
+
+        self.n_tables = len(pl_ids)
+        self.table_size = self.gc.table_size
+        if any([len(ids) != self.table_size for ids in pl_ids]):
+            raise PyPoksException(f'every table should have {self.table_size} players')
+        all_ids = [pl_id for ids in pl_ids for pl_id in ids]
+        if len(set(all_ids)) != len(all_ids):
+            raise PyPoksException('players ids should be unique')
+
+        self.names = [f'{self.name}_{ix}' for ix in range(self.n_tables)]
+
+        # order of players reflects their current positions at table
+        self.players: List[List[str]] = [list(ids) for ids in pl_ids]
+
+        # players names with self on 1st pos, then next to me, then next.. (as PPlayer.pls)
+        self.pls: Dict[str,List[str]] = {}
+        for ids in pl_ids:
+            for pl_id in ids:
+                pls = list(ids)
+                while pls[0] != pl_id:
+                    pls.append(pls.pop(0))
+                self.pls[pl_id] = pls
+        self.nhs_IX: Dict[str,int] = {pl_id: 0 for pl_id in all_ids} # index of next hh state to send to player
+
+        self.rng = np.random.default_rng(seed)
+
+        shape = (self.n_tables, self.table_size)
+        self.cash =     np.zeros(shape, dtype=np.int64) # players cash
+        self.cash_ch =  np.zeros(shape, dtype=np.int64) # players cash current hand
+        self.cash_cs =  np.zeros(shape, dtype=np.int64) # players cash current street
+        self.in_hand =  np.zeros(shape, dtype=bool)     # player has not folded
+
+        self.pot =      np.zeros(self.n_tables, dtype=np.int64) # table pot (main)
+        self.tbl_cs =   np.zeros(self.n_tables, dtype=np.int64) # table cash of current street
+        self.cash_tc =  np.zeros(self.n_tables, dtype=np.int64) # cash to call by player (on current street)
+        self.cash_rs =  np.zeros(self.n_tables, dtype=np.int64) # legal raise size (recent raise)
+
+        self.state =    np.zeros(self.n_tables, dtype=np.int8)  # table state while running hand
+        self.mv_seat =  np.zeros(self.n_tables, dtype=np.int8)  # moving player seat
+        self.lc_seat =  np.zeros(self.n_tables, dtype=np.int8)  # loop closing player seat
+
+        # cards dealt for the hand: players hands (seat by seat) followed by 5 table cards
+        self.cards =    np.zeros((self.n_tables, 2*self.table_size + 5), dtype=np.int8)
+
+        self.hand_ID =  np.zeros(self.n_tables, dtype=np.int64)
+        self.hh: List[Optional[HHistory]] = [None] * self.n_tables
+
+        # tables waiting for decisions (asked in the recent step), with allowed moves & cash of their moving players
+        self.dec_tables: Optional[NPL] = None
+        self.allowed_moves: Optional[NPL] = None
+        self.moves_cash: Optional[NPL] = None
+
+        self.logger.info(f'*** VPTable : {self.name} (tables:{self.n_tables} size:{self.table_size}) *** initialized')
+
+    @property
+    def is_headsup(self) -> bool:
+        return self.table_size == 2
+
+    def _card(self, card) -> Any:
+        """ converts card from cards array to table representation """
+        return int(card) if self.int_cards else PDeck.cts(int(card))
+
+    def _tcs_event(self, tix:int) -> STATE:
+        return 'T$$', (int(self.pot[tix]), int(self.tbl_cs[tix]), int(self.cash_tc[tix]), int(self.cash_rs[tix]))
+
+    def _next_seat(self, tix:int, seat:int, step:int=1) -> int:
+        """ returns next (or previous with step=-1) seat of player in hand """
+        in_hand = self.in_hand[tix]
+        for _ in range(self.table_size):
+            seat = (seat + step) % self.table_size
+            if in_hand[seat]:
+                return seat
+        raise PyPoksException(f'no players in hand at table {self.names[tix]}')
+
+    def _take_hh(self, tix:int, seat:int, state_changes:List[Tuple[str,List[STATE]]]):
+        """ appends new & translated states of the player to state_changes (as QPPlayer.take_hh) """
+        pl_id = self.players[tix][seat]
+        hh = self.hh[tix]
+        state_changes.append((pl_id, hh.translated(pls=self.pls[pl_id], fr=self.nhs_IX[pl_id])))
+        self.nhs_IX[pl_id] = len(hh.events)
+
+    def _start_hands(self, tables:NPL):
+        """ starts hands at given tables: deals cards, puts blinds, runs events till preflop """
+
+        n_cards = self.cards.shape[1]
+        deck = np.tile(np.arange(52, dtype=np.int8), (len(tables), 1))
+        self.cards[tables] = self.rng.permuted(deck, axis=1)[:, :n_cards]
+
+        sb, bb = self.gc.table_cash_sb, self.gc.table_cash_bb
+
+        self.cash[tables] = self.gc.table_cash_start
+        self.cash_ch[tables] = 0
+        self.cash_cs[tables] = 0
+        self.in_hand[tables] = True
+
+        self.cash[tables,0] -= sb
+        self.cash_ch[tables,0] = sb
+        self.cash_cs[tables,0] = sb
+        self.cash[tables,1] -= bb
+        self.cash_ch[tables,1] = bb
+        self.cash_cs[tables,1] = bb
+
+        self.pot[tables] = sb + bb
+        self.tbl_cs[tables] = sb + bb
+        self.cash_tc[tables] = bb
+        self.cash_rs[tables] = bb
+
+        # preflop loop closing & moving players
+        self.state[tables] = 1
+        self.lc_seat[tables] = 1
+        self.mv_seat[tables] = 0 if self.is_headsup else 2
+
+        # at heads-up BB is dealt first
+        deal_order = list(range(self.table_size))
+        if self.is_headsup:
+            deal_order.append(deal_order.pop(0))
+
+        for tix in tables:
+            players = self.players[tix]
+            hand_ID = int(self.hand_ID[tix])
+            cards = self.cards[tix]
+            for pl_id in players:
+                self.nhs_IX[pl_id] = 0
+
+            hh = HHistory(game_config=self.gc)
+            ev = hh.events
+            ev.append(('HST', (self.names[tix], hand_ID)))
+            ev.append(('TST', (0,)))
+            ev.append(('T$$', (0, 0, 0, 0)))
+            for ix,pl_id in enumerate(players):
+                ev.append(('POS', (pl_id, ix, self.gc.table_cash_start)))
+            ev.append(('PSB', (players[0], sb)))
+            ev.append(('PBB', (players[1], bb)))
+            ev.append(('T$$', (sb+bb, sb+bb, bb, bb)))
+            for seat in deal_order:
+                ev.append(('PLH', (players[seat], self._card(cards[2*seat]), self._card(cards[2*seat+1]))))
+            ev.append(('TST', (1,)))
+            self.hh[tix] = hh
+
+    def _next_street(self, tix:int):
+        """ starts next (postflop) street at table """
+
+        self.state[tix] += 1
+        state = int(self.state[tix])
+        ev = self.hh[tix].events
+        ev.append(('TST', (state,)))
+
+        seats = np.flatnonzero(self.in_hand[tix])
+        if self.is_headsup:
+            self.lc_seat[tix], self.mv_seat[tix] = seats[0], seats[1]
+        else:
+            self.lc_seat[tix], self.mv_seat[tix] = seats[-1], seats[0]
+
+        self.tbl_cs[tix] = 0
+        self.cash_tc[tix] = 0
+        self.cash_rs[tix] = self.gc.table_cash_bb
+        self.cash_cs[tix] = 0
+        ev.append(self._tcs_event(tix))
+
+        tc_ix = 2*self.table_size
+        tc = self.cards[tix, tc_ix:tc_ix+3] if state == 2 else self.cards[tix, tc_ix+state:tc_ix+state+1]
+        ev.append(('TCD', tuple([self._card(c) for c in tc])))
+
+    def _advance(self, tix:int, street_closed:bool=False) -> int:
+        """ runs table till moving player has to make a decision or hand finishes
+        street_closed - loop closing player has just made a move (without raise) """
+        while True:
+
+            n_in_hand = int(self.in_hand[tix].sum())
+
+            if not street_closed and n_in_hand > 1:
+                seat = int(self.mv_seat[tix])
+                if self.cash[tix,seat]: # player has cash (not all-in-ed yet)
+                    return _ADV_DEC
+                if self.lc_seat[tix] == seat:
+                    street_closed = True
+                else:
+                    self.mv_seat[tix] = self._next_seat(tix, seat)
+                continue
+
+            # EXIT if river finished or everybody folded (to one player)
+            if self.state[tix] == 4 or n_in_hand == 1:
+                return _ADV_FLD if n_in_hand == 1 else _ADV_SDN
+
+            self._next_street(tix)
+            street_closed = False
+
+    def _finish_hand(
+            self,
+            tix: int,
+            rank_values: Optional[NPL],     # rank values of seats for showdown
+            state_changes: List[Tuple[str,List[STATE]]],
+    ) -> HHistory:
+        """ finishes hand at table: computes results, adds final events, players take hh, rotates players """
+
+        players = self.players[tix]
+        hh = self.hh[tix]
+        ev = hh.events
+        in_hand = self.in_hand[tix]
+
+        full_ranks = ['not_shown' if in_hand[seat] else 'muck' for seat in range(self.table_size)]
+
+        if rank_values is None:
+            winners = [int(np.flatnonzero(in_hand)[0])]
+        else:
+            ev.append(('TST', (5,)))
+            seats = np.flatnonzero(in_hand)
+            top_rank = rank_values[seats].max()
+            winners = [int(seat) for seat in seats if rank_values[seat] == top_rank]
+            tc_ix = 2*self.table_size
+            for seat in winners:
+                cards = self.cards[tix, [2*seat, 2*seat+1] + list(range(tc_ix, tc_ix+5))]
+                full_ranks[seat] = PDeck.cards_rank([int(c) for c in cards])
+
+        prize = int(self.pot[tix]) / len(winners)
+        for seat,pl_id in enumerate(players):
+            my_won = -int(self.cash_ch[tix,seat]) # netto lost
+            if seat in winners: my_won += prize # add netto winning
+            ev.append(('PRS', (pl_id, my_won, full_ranks[seat])))
+        ev.append(('HFN', (self.names[tix], int(self.hand_ID[tix]))))
+
+        # occasion to take a reward
+        for seat in range(self.table_size):
+            self._take_hh(tix, seat, state_changes)
+
+        players.append(players.pop(0)) # rotate table players for next hand
+        self.hand_ID[tix] += 1
+        return hh
+
+    def _apply_decisions(self, selected_moves:NPL, probs:NPL) -> List[Tuple[int,bool]]:
+        """ applies decisions of players from waiting tables,
+        returns list of (table ix, street_closed) to advance """
+
+        tables = self.dec_tables
+        if len(selected_moves) != len(tables):
+            raise PyPoksException(f'got {len(selected_moves)} decisions for {len(tables)} waiting tables')
+
+        rows = np.arange(len(tables))
+        seats = self.mv_seat[tables].astype(np.int64)
+        if not self.allowed_moves[rows,selected_moves].all():
+            raise PyPoksException('some of selected moves are not allowed')
+        mv_cash = self.moves_cash[rows,selected_moves]
+
+        # cleaned probs saved with HH (as PPlayer.select_move)
+        probs = probs * self.allowed_moves
+        probs = probs / probs.sum(axis=-1, keepdims=True)
+
+        # players cash before move
+        cash_pre = np.stack([
+            self.cash[tables,seats],
+            self.cash_ch[tables,seats],
+            self.cash_cs[tables,seats]], axis=-1).tolist()
+
+        self.cash[tables,seats] -= mv_cash
+        self.cash_ch[tables,seats] += mv_cash
+        self.cash_cs[tables,seats] += mv_cash
+        self.pot[tables] += mv_cash
+        self.tbl_cs[tables] += mv_cash
+
+        # FLD case
+        folded = selected_moves == 1
+        self.in_hand[tables[folded],seats[folded]] = False
+
+        # BR case
+        raised = selected_moves > 2
+        t_br, s_br = tables[raised], seats[raised]
+        self.cash_rs[t_br] = self.cash_cs[t_br,s_br] - self.cash_tc[t_br]
+        self.cash_tc[t_br] = self.cash_cs[t_br,s_br]
+
+        to_advance = []
+        for tix,seat,mv_id,mc,pr,cp,br in zip(
+                tables.tolist(),
+                seats.tolist(),
+                selected_moves.tolist(),
+                mv_cash.tolist(),
+                probs.tolist(),
+                cash_pre,
+                raised.tolist(),
+        ):
+            ev = self.hh[tix].events
+            ev.append(('MOV', (self.players[tix][seat], mv_id, mc, pr, tuple(cp))))
+            ev.append(self._tcs_event(tix))
+
+            if br:
+                self.lc_seat[tix] = self._next_seat(tix, seat, step=-1) # player before in loop
+
+            # player closing loop made decision (without raise)
+            street_closed = self.lc_seat[tix] == seat and not br
+            if not street_closed:
+                self.mv_seat[tix] = self._next_seat(tix, seat)
+            to_advance.append((tix, street_closed))
+
+        return to_advance
+
+    def _amc(self, tables:NPL) -> Tuple[NPL,NPL]:
+        """ computes allowed_moves and moves_cash of moving players at given tables """
+        seats = self.mv_seat[tables]
+        return amc_NPL(
+            cash=           self.cash[tables,seats],
+            cash_cs=        self.cash_cs[tables,seats],
+            table_cash_tc=  self.cash_tc[tables],
+            table_cash_rs=  self.cash_rs[tables],
+            table_pot=      self.pot[tables],
+            table_state=    self.state[tables],
+            table_moves=    self.gc.table_moves)
+
+    def step(
+            self,
+            selected_moves: Optional[NPL]=  None,   # moves selected by players of waiting tables (self.dec_tables)
+            probs: Optional[NPL]=           None,   # probs of players of waiting tables
+    ) -> Dict[str,Any]:
+        """ applies decisions of waiting players (from previous step) and runs all tables till next decisions,
+        hands are started at all tables with the first step, finished hands are started again,
+        returns:
+        - state_changes: list of (pl_id, new & translated states) in order of taking hh by players
+        - decisions: tables, pl_ids, allowed_moves and moves_cash of players that have to make a decision now
+        - hh: HH of finished hands """
+
+        if self.dec_tables is None:
+            tables = np.arange(self.n_tables)
+            self._start_hands(tables)
+            to_advance = [(tix, False) for tix in tables.tolist()]
+        else:
+            if probs is None:
+                probs = self.allowed_moves.astype(float)
+            to_advance = self._apply_decisions(np.asarray(selected_moves), np.asarray(probs))
+
+        state_changes = []
+        waiting = []
+        hh_done = []
+        while to_advance:
+
+            showdown = []
+            finished = []
+            for tix,street_closed in to_advance:
+                res = self._advance(tix, street_closed)
+                if res == _ADV_DEC:
+                    self._take_hh(tix, int(self.mv_seat[tix]), state_changes)
+                    waiting.append(tix)
+                elif res == _ADV_SDN:
+                    showdown.append(tix)
+                else:
+                    hh_done.append(self._finish_hand(tix, None, state_changes))
+                    finished.append(tix)
+
+            # rank values of showdown tables are computed at once
+            if showdown:
+                tc_ix = 2*self.table_size
+                cards = self.cards[showdown]
+                cards7 = np.concatenate([
+                    cards[:,:tc_ix].reshape(len(showdown), self.table_size, 2),
+                    np.repeat(cards[:,None,tc_ix:], self.table_size, axis=1)], axis=-1)
+                rank_values = PDeck.cards_rank_value_NPL(cards7.astype(np.int64))
+                for tix,rv in zip(showdown, rank_values):
+                    hh_done.append(self._finish_hand(tix, rv, state_changes))
+                finished += showdown
+
+            to_advance = []
+            if finished:
+                finished = np.asarray(finished)
+                self._start_hands(finished)
+                to_advance = [(tix, False) for tix in finished.tolist()]
+
+        self.dec_tables = np.asarray(waiting, dtype=np.int64)
+        self.allowed_moves, self.moves_cash = self._amc(self.dec_tables)
+
+        return {
+            'state_changes':    state_changes,
+            'decisions': {
+                'tables':           self.dec_tables,
+                'pl_ids':           [self.players[tix][self.mv_seat[tix]] for tix in waiting],
+                'allowed_moves':    self.allowed_moves,
+                'moves_cash':       self.moves_cash},
+            'hh':               hh_done}
+
+    def random_decisions(self) -> Tuple[NPL,NPL]:
+        """ baseline random decisions for all waiting tables (as PPlayer._make_decision) """
+        probs = self.rng.random(self.allowed_moves.shape) * self.allowed_moves
+        probs /= probs.sum(axis=-1, keepdims=True)
+        u = self.rng.random(len(probs))
+        selected_moves = (probs.cumsum(axis=-1) > u[:,None]).argmax(axis=-1)
+        return selected_moves, probs
+
+    def run_hands(self, n_hands:int, return_hh:bool=False) -> List[HHistory]:
+        """ runs at least n_hands (summed over all tables) with random decisions (headless)
+        returns HH of finished hands if requested """
+        hh = []
+        n_done = 0
+        out = self.step() if self.dec_tables is None else self.step(*self.random_decisions())
+        while True:
+            n_done += len(out['hh'])
+            if return_hh:
+                hh += out['hh']
+            if n_done >= n_hands:
+                break
+            out = self.step(*self.random_decisions())
+        return hh
+
+
+if __name__ == "__main__":
+    """ speed (h/s) of VPTable with different number of tables vs PTable (headless random self-play) """
+
+    import time
+    from pologic.potable import PTable
+
+    game_config = GameConfig.from_name('3players_2bets')
+    n_hands = 20000
+
+    table = PTable(
+        name=           'table',
+        game_config=    game_config,
+        pl_ids=         [f'pl{ix}' for ix in range(game_config.table_size)],
+        int_cards=      True,
+        loglevel=       30)
+    table.run_hand() # builds evaluator tables before timing
+    stime = time.time()
+    for _ in range(n_hands):
+        table.run_hand()
+    print(f'PTable -> {int(n_hands/(time.time()-stime))} h/s')
+
+    for n_tables in [1, 10, 100, 1000]:
+        vpt = VPTable(
+            name=           'vpt',
+            game_config=    game_config,
+            pl_ids=         [[f't{tix}pl{ix}' for ix in range(game_config.table_size)] for tix in range(n_tables)],
+            loglevel=       30)
+        vpt.run_hands(n_hands=10)
+        stime = time.time()
+        vpt.run_hands(n_hands=n_hands)
+        print(f'VPTable tables: {n_tables:4} -> {int(n_hands/(time.time()-stime))} h/s')
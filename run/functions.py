@@ -15,6 +15,7 @@ from pologic.game_config import GameConfig
 from podecide.dmk import FolDMK
 from podecide.dmk_motorch import DMK_MOTorch, DMK_MOTorch_PG, DMK_MOTorch_A2C, DMK_MOTorch_PPO
 from podecide.game_manager import GameManager_PTR
+from podecide.tools.device_balancer import DeviceBalancer
 
 
 def check_continuation() -> Dict:
@@ -304,6 +305,17 @@ def set_LR(mul=0.5):
         print(nm, point)
         DMK_MOTorch.oversave_point(name=nm, baseLR=point['baseLR']*mul)
 
+def build_device_balancer(n_gpu:int, logger=None) -> DeviceBalancer:
+    """ builds DeviceBalancer for n_gpu first GPUs or for CPU (device None) """
+    import GPUtil
+    from pypaq.mpython.mptools import sys_res_nfo
+    if n_gpu:
+        devices = {d.id: d.memoryTotal for d in GPUtil.getGPUs()[:n_gpu]}
+    else:
+        devices = {None: sys_res_nfo()['mem_total_GB'] * 1024}
+    return DeviceBalancer(devices=devices, logger=get_child(logger) if logger else None)
+
+
 @proc_return
 def run_PTR_game(
         logger,
@@ -320,6 +332,8 @@ def run_PTR_game(
         sep_pairs_factor: float=                    0.9,
         sep_n_stddev: float=                        1.0,
         publish: bool=                              True,
+        colocated: bool=                            False,
+        device_balancer: Optional[DeviceBalancer]=  None,
 ) -> Dict[str, Dict]:
     """ runs GM PTR game in a subprocess """
     gm = GameManager_PTR(
@@ -330,6 +344,8 @@ def run_PTR_game(
         dmk_point_PLL=  dmk_point_PLL,
         dmk_point_TRL=  dmk_point_TRL,
         n_tables=       n_tables,
+        colocated=      colocated,
+        device_balancer=device_balancer,
         logger=         logger)
     return gm.run_game(
         game_size=          game_size,
@@ -7,7 +7,8 @@ import random
 import shutil
 
 from envy import DMK_MODELS_FD, TR_CONFIG_FP, TR_RESULTS_FP
-from run.functions import check_continuation, run_PTR_game, build_single_foldmk, copy_dmks, dmk_name, get_saved_dmks_names
+from run.functions import check_continuation, run_PTR_game, build_single_foldmk, copy_dmks, dmk_name, get_saved_dmks_names, \
+    build_device_balancer
 from run.after_run.reports import results_report, nice_hpms_report
 from pologic.game_config import GameConfig
 from podecide.dmk import FolDMK
@@ -21,6 +22,7 @@ LOOP_CONFIG = {
     'n_dmk':                    20,         # number of DMKs
     'n_dmk_refs':               0,          # number of refs DMKs
     'n_gpu':                    2,
+    'balance_devices':          False,      # DMKs devices are assigned by DeviceBalancer (rebalanced every loop)
     'n_tables':                 1000,       # target number of tables (for any game: TR, PMT)
     'game_size_TR':             100000,
         # remove / new DMKs
@@ -106,6 +108,8 @@ def run(game_config_name:str, use_saved_dmks=True, del_removed_dmks=False):
             'points_motorch':   {dn: DMK_MOTorch.load_point(name=dn) for dn in dmk_ranked},
             'scores':           {}}
 
+    device_balancer = build_device_balancer(n_gpu=cm.n_gpu, logger=logger) if cm.balance_devices else None
+
     while True:
 
         if cm.exit_after == loop_ix - 1:
@@ -217,8 +221,11 @@ def run(game_config_name:str, use_saved_dmks=True, del_removed_dmks=False):
             dmk_point_TRL=  dmk_point_TRL,
             game_size=      cm.game_size_TR,
             n_tables=       cm.n_tables,
+            device_balancer=device_balancer,
             logger=         logger)
         dmk_results = rgd['dmk_results']
+        if device_balancer:
+            device_balancer.observe(rgd['loop_stats'])
         dmk_ranked = sorted(dmk_ranked, key=lambda x: dmk_results[x]['last_wonH_afterIV'], reverse=True)
 
         logger.info(f'train results:\n{results_report(dmk_results)}')
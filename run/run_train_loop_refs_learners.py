@@ -16,7 +16,7 @@ from podecide.dmk import FolDMK
 from podecide.dmk_motorch import DMK_MOTorch
 from podecide.game_manager import separation_report, separated_factor
 from run.functions import check_continuation, get_saved_dmks_names, run_PTR_game, copy_dmks, build_single_foldmk, \
-    dmk_name
+    dmk_name, build_device_balancer
 from run.after_run.reports import results_report
 from run.after_run.review_points import merged_point_in_psdd, points_nice_table
 
@@ -36,6 +36,8 @@ LOOP_CONFIG = {
     'against_best':             3,          # every Nth loop train against only best ref
     'game_size_TS':             100000,
     'n_tables':                 1000,       # target number of tables (TR & TS)
+    'n_gpu':                    2,
+    'balance_devices':          False,      # devices of DMKs in TR are assigned by DeviceBalancer (rebalanced every game)
         # replace / new
     'n_stddev':                 1.0,        # number of stddev that is considered to be valid separation distance
     'remove_key':               [4,1],      # [A,B] remove DMK if in last A+B life marks there are A -| and last is not +/
@@ -326,6 +328,8 @@ def run(game_config_name: str):
 
     logger.info(f'> game config: {game_config}')
 
+    device_balancer = build_device_balancer(n_gpu=cm.n_gpu, logger=logger) if cm.balance_devices else None
+
     while True:
 
         loop_stime = time.time()
@@ -481,7 +485,7 @@ def run(game_config_name: str):
             dmk_refs_sel = [best] + best_copies
 
         for trg in tr_groups:
-            run_PTR_game(
+            rgd = run_PTR_game(
                 game_config=    game_config,
                 name=           f'GM_TR{loop_ix:03}',
                 gm_loop=        loop_ix,
@@ -489,7 +493,10 @@ def run(game_config_name: str):
                 dmk_point_TRL=  [{'name':dn, 'motorch_point':{'device':i%2}, **PUB_TR}  for i,dn in enumerate(trg)],
                 game_size=      cm.game_size_TR,
                 n_tables=       cm.n_tables,
+                device_balancer=device_balancer,
                 logger=         logger)
+            if device_balancer:
+                device_balancer.observe(rgd['loop_stats'])
 
         # eventually remove copies
         for dn in best_copies:
@@ -1,6 +1,9 @@
+import numpy as np
+import tempfile
 import unittest
 
 from podecide.cardNet.cardNet_batcher import prep2X7batch
+from pologic.podeck import PreflopEquity, monte_carlo_prob_won_NPL
 
 
 class Test_cardNet_batch(unittest.TestCase):
@@ -9,3 +12,26 @@ class Test_cardNet_batch(unittest.TestCase):
         batch = prep2X7batch(batch_size=5)
         for k in batch:
             print(f'{k}: ({len(batch[k])}) {batch[k]}')
+
+
+    def test_preflop_equity(self):
+        """ lookup of preflop equity for preflop-masked rows gives values of Monte Carlo """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pfe = PreflopEquity(file_FP=f'{tmp_dir}/preflop_equity.npy', n_samples=2000, use_QMP=False)
+
+        batch = prep2X7batch(batch_size=1000)
+        cards = np.asarray(batch['cards_A'])
+        cards = cards[(cards[:,2:] == 52).all(axis=-1)] # preflop-masked rows
+        print(f'got {len(cards)} preflop-masked rows')
+        self.assertTrue(len(cards) > 0)
+
+        n_monte = 2000
+        prob_monte = np.asarray(monte_carlo_prob_won_NPL(cards=cards, n_samples=n_monte))
+        prob_pfe = np.asarray(monte_carlo_prob_won_NPL(cards=cards, n_samples=n_monte, pfe=pfe))
+        self.assertTrue(np.allclose(prob_pfe, [pfe.equity(c[:2]) for c in cards.tolist()]))
+        # both are estimates with standard error <= 0.5/sqrt(n_samples)
+        err = np.abs(prob_pfe - prob_monte)
+        print(f'mean abs diff: {err.mean():.4f}, max: {err.max():.4f}')
+        self.assertTrue(err.mean() < 0.02)
+        self.assertTrue(err.max() < 5 * 0.5 * np.sqrt(2 / n_monte))
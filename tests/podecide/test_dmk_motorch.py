@@ -0,0 +1,257 @@
+import numpy as np
+import random
+import torch
+from typing import List
+import unittest
+
+from envy import PLAYER_STATS_USED
+from pologic.game_config import GameConfig
+from podecide.dmk_motorch import DMK_MOTorch_PPO
+from podecide.game_state import EncodedState, GameStatesStore
+from run.functions import get_fresh_dna
+
+GAME_CONFIG = GameConfig.from_name('3players_2bets')
+
+TMP_MODELS_DIR = f'tests/podecide/_tmp/_models'
+
+
+def get_state() -> EncodedState:
+    cards = random.sample(range(52), random.choice([2,5,6,7]))
+    return EncodedState(
+        cards=      cards + [52] * (7 - len(cards)),
+        event_id=   random.randrange(1 + len(GAME_CONFIG.table_moves)),
+        cash=       [random.random() for _ in range(8)],
+        pl_id=      random.randrange(GAME_CONFIG.table_size),
+        pl_pos=     random.randrange(GAME_CONFIG.table_size),
+        pl_stats=   [random.random() for _ in PLAYER_STATS_USED])
+
+
+def get_store(player_ids:List[str], equity:bool=False) -> GameStatesStore:
+    """ store with columns of NeurDMK """
+    store = GameStatesStore(player_ids=player_ids, n_moves=len(GAME_CONFIG.table_moves), chunk=4)
+    store.add_column('cards',    shape=(7,),                     dtype=np.int8)
+    store.add_column('event_id', shape=(),                       dtype=np.int8)
+    store.add_column('cash',     shape=(8,),                     dtype=np.float32)
+    store.add_column('pl_id',    shape=(),                       dtype=np.int8)
+    store.add_column('pl_pos',   shape=(),                       dtype=np.int8)
+    store.add_column('pl_stats', shape=(len(PLAYER_STATS_USED),), dtype=np.float32)
+    if equity:
+        store.add_column('equity', shape=(), dtype=np.float32)
+    return store
+
+
+def new_batch(mdl, store:GameStatesStore, player_ids:List[str], statesL:List[List[EncodedState]]):
+    """ appends new states to the store and builds FWD batch of them """
+    for pid, states in zip(player_ids, statesL):
+        store.append(pid, states)
+    pids, first, seq_len = store.new_without_probs()
+    for pid in pids:
+        store.set_probs_done(pid)
+    return mdl.build_batch(
+        player_ids=     pids,
+        states=         store,
+        rows=           store.rows(player_ids=pids, first=first, seq_len=seq_len),
+        seq_len=        seq_len,
+        for_training=   False)
+
+
+class TestDMK_MOTorch(unittest.TestCase):
+
+    def test_packed_run_policy(self):
+        """ packed (padded sequences) FWD gives same probs and states as FWD of every row of states """
+
+        random.seed(123)
+        player_ids = ['a','b','c','d']
+        mdl = DMK_MOTorch_PPO(
+            name=                       'dmk_packed',
+            player_ids=                 player_ids,
+            table_size=                 GAME_CONFIG.table_size,
+            table_moves=                GAME_CONFIG.table_moves,
+            save_topdir=                TMP_MODELS_DIR,
+            load_cardnet_pretrained=    False,
+            device=                     None,
+            loglevel=                   30)
+
+        store_rows = get_store(player_ids)
+        store_packed = get_store(player_ids)
+        for _ in range(3):
+
+            statesL = [[get_state() for _ in range(n)] for n in [3,1,5,2]]
+
+            # rows, from the current state
+            start_cache = mdl._fwd_cache.clone()
+            probs_rows = {pid: [] for pid in player_ids}
+            for r in range(max([len(states) for states in statesL])):
+                pids = [pid for pid,states in zip(player_ids, statesL) if len(states) > r]
+                batch = new_batch(mdl, store_rows, pids, [[states[r]] for states in statesL if len(states) > r])
+                self.assertNotIn('seq_len', batch)
+                for pid, probs in zip(pids, mdl.run_policy(player_ids=pids, batch=batch)):
+                    probs_rows[pid].append(probs[0])
+            cache_rows = mdl._fwd_cache.clone()
+
+            # packed, from the same state
+            mdl._fwd_cache = start_cache
+            batch = new_batch(mdl, store_packed, player_ids, statesL)
+            self.assertIn('seq_len', batch)
+            probs_packed = mdl.run_policy(player_ids=player_ids, batch=batch)
+
+            for pid, states, probs in zip(player_ids, statesL, probs_packed):
+                self.assertTrue(np.allclose(np.stack(probs_rows[pid]), probs[:len(states)], atol=1e-5))
+            self.assertTrue(torch.allclose(cache_rows, mdl._fwd_cache, atol=1e-5))
+
+    def test_packed_dna(self):
+        """ packed FWD of module gives the same outputs and states as FWD of every sequence alone,
+        for module configurations of all DMK families """
+
+        torch.manual_seed(123)
+        for family in 'abcdp':
+            point = get_fresh_dna(game_config=GAME_CONFIG, name=f'dmk_{family}', family=family)
+            motorch_point = dict(point['motorch_point'])
+            motorch_point.pop('psdd')
+            motorch_point.update({'load_cardnet_pretrained': False, 'device': None})
+            mdl = point['motorch_type'](
+                name=           point['name'],
+                player_ids=     ['a'],
+                table_size=     point['table_size'],
+                table_moves=    point['table_moves'],
+                save_topdir=    TMP_MODELS_DIR,
+                loglevel=       30,
+                **motorch_point)
+            module = mdl.module
+            module.eval()
+
+            seq_len = torch.tensor([1,2,7,4,1])
+            n_seq, max_len = len(seq_len), int(seq_len.max())
+            inp = {
+                'cards':    torch.randint(53, size=(n_seq,max_len,7)),
+                'event_id': torch.randint(1 + len(GAME_CONFIG.table_moves), size=(n_seq,max_len)),
+                'cash':     torch.rand(size=(n_seq,max_len,8)),
+                'pl_id':    torch.randint(GAME_CONFIG.table_size, size=(n_seq,max_len)),
+                'pl_pos':   torch.randint(GAME_CONFIG.table_size, size=(n_seq,max_len)),
+                'pl_stats': torch.rand(size=(n_seq,max_len,len(PLAYER_STATS_USED)))}
+            history = torch.rand(size=[n_seq] + list(module.enc_cnn.get_zero_history().shape))
+
+            with torch.no_grad():
+                out = module(**inp, enc_cnn_state=history, seq_len=seq_len)
+                for ix, sl in enumerate(seq_len.tolist()):
+                    out_seq = module(
+                        **{k: v[ix:ix+1,:sl] for k,v in inp.items()},
+                        enc_cnn_state=  history[ix:ix+1])
+                    self.assertTrue(torch.allclose(out['probs'][ix,:sl], out_seq['probs'][0], atol=1e-5), family)
+                    self.assertTrue(torch.allclose(out['fin_state'][ix], out_seq['fin_state'][0], atol=1e-5), family)
+
+    def test_run_policy_step(self):
+        """ streaming step gives same probs and states as FWD of one event sequences """
+
+        random.seed(123)
+        player_ids = ['a','b','c','d']
+        mdl = DMK_MOTorch_PPO(
+            name=                       'dmk_step',
+            player_ids=                 player_ids,
+            table_size=                 GAME_CONFIG.table_size,
+            table_moves=                GAME_CONFIG.table_moves,
+            save_topdir=                TMP_MODELS_DIR,
+            load_cardnet_pretrained=    False,
+            device=                     None,
+            loglevel=                   30)
+
+        store = get_store(player_ids)
+        step_cache = mdl._fwd_cache.clone()
+        for _ in range(5):
+            pids = sorted(random.sample(player_ids, 3)) # store returns players in slots order
+            batch = new_batch(mdl, store, pids, [[get_state()] for _ in pids])
+            probs = mdl.run_policy(player_ids=pids, batch=batch)
+
+            fwd_cache = mdl._fwd_cache
+            mdl._fwd_cache = step_cache
+            inp = {k: torch.squeeze(v, dim=1) for k,v in batch.items() if k != 'enc_cnn_state'}
+            probs_step = mdl.run_policy_step(player_ids=pids, inp=inp)
+            step_cache = mdl._fwd_cache
+            mdl._fwd_cache = fwd_cache
+
+            self.assertTrue(np.allclose(probs[:,0], probs_step, atol=1e-5))
+            self.assertTrue(torch.allclose(fwd_cache, step_cache, atol=1e-5))
+
+    def test_equity_input(self):
+        """ equity of encoded states is taken to the batch and changes policy input """
+
+        random.seed(123)
+        player_ids = ['a','b']
+        mdl = DMK_MOTorch_PPO(
+            name=                       'dmk_equity',
+            player_ids=                 player_ids,
+            table_size=                 GAME_CONFIG.table_size,
+            table_moves=                GAME_CONFIG.table_moves,
+            use_equity=                 True,
+            save_topdir=                TMP_MODELS_DIR,
+            load_cardnet_pretrained=    False,
+            device=                     None,
+            loglevel=                   30)
+
+        states = [get_state() for _ in range(2)]
+        probs = []
+        for equity in [0.1, 0.9]:
+            store = get_store(player_ids, equity=True)
+            batch = new_batch(mdl, store, player_ids, [[st._replace(equity=equity)] for st in states])
+            self.assertTrue(torch.allclose(batch['equity'], torch.full((2,1), equity)))
+            with torch.no_grad():
+                out = mdl.module(**{k: v for k,v in batch.items() if k != 'enc_cnn_state'}, enc_cnn_state=batch['enc_cnn_state'])
+            probs.append(out['probs'])
+        self.assertFalse(torch.allclose(probs[0], probs[1]))
+
+    def test_build_batch(self):
+        """ build_batch takes the same values as given to the store """
+
+        random.seed(123)
+        player_ids = ['a','b','c','d']
+        n_moves = len(GAME_CONFIG.table_moves)
+        mdl = DMK_MOTorch_PPO(
+            name=                       'dmk_batch',
+            player_ids=                 player_ids,
+            table_size=                 GAME_CONFIG.table_size,
+            table_moves=                GAME_CONFIG.table_moves,
+            save_topdir=                TMP_MODELS_DIR,
+            load_cardnet_pretrained=    False,
+            device=                     None,
+            loglevel=                   30)
+
+        for for_training, lens in [(True,[4,4,4,4]), (False,[3,1,5,2]), (True,[6,6,6,6]), (False,[1,1,1,1])]:
+
+            store = get_store(player_ids)
+            statesL = [[get_state() for _ in range(n)] for n in lens]
+            decL = [[None for _ in states] for states in statesL] # (move, allowed_moves, reward_sh) of decided states
+
+            if for_training:
+                for pid, states, dec in zip(player_ids, statesL, decL):
+                    store.append(pid, states)
+                    store.move_new_to_dec(pid)
+                    for ix in range(len(states)):
+                        if random.random() < 0.5:
+                            dec[ix] = (random.randrange(n_moves), [random.random() < 0.5 for _ in range(n_moves)], random.random())
+                            store.dec(pid, 'move')[ix] = dec[ix][0]
+                            store.dec(pid, 'allowed_moves')[ix] = dec[ix][1]
+                            store.dec(pid, 'reward_sh')[ix] = dec[ix][2]
+                batch = mdl.build_batch(
+                    player_ids=     player_ids,
+                    states=         store,
+                    rows=           store.rows(player_ids=player_ids, first=0, seq_len=lens),
+                    seq_len=        lens,
+                    for_training=   True)
+            else:
+                batch = new_batch(mdl, store, player_ids, statesL)
+
+            for ix, (states, dec) in enumerate(zip(statesL, decL)):
+                for r in range(max(lens)):
+                    val = states[min(r, len(states) - 1)]
+                    for k in ['cards','event_id','pl_id','pl_pos']:
+                        self.assertEqual(batch[k][ix,r].tolist(), getattr(val, k))
+                    for k in ['cash','pl_stats']:
+                        self.assertTrue(np.allclose(batch[k][ix,r].numpy(), getattr(val, k)))
+                    if for_training:
+                        move, allowed_moves, reward_sh = dec[r] or (0, [False] * n_moves, 0.0)
+                        self.assertEqual(batch['move'][ix,r].item(), move)
+                        self.assertEqual(batch['allowed_moves'][ix,r].tolist(), allowed_moves)
+                        self.assertAlmostEqual(batch['reward'][ix,r].item(), reward_sh, places=6)
+            self.assertEqual(batch['cards'].dtype, torch.long)
+            self.assertEqual(batch['cash'].dtype, torch.float32)
+            self.assertEqual('seq_len' in batch, len(set(lens)) > 1)
@@ -0,0 +1,76 @@
+import shutil
+import unittest
+
+from pologic.game_config import GameConfig
+from podecide.dmk import RanDMK, FolDMK
+from podecide.dmk_motorch import DMK_MOTorch_PG
+from podecide.game_manager import GameManager
+
+GAME_CONFIG = GameConfig.from_name('3players_2bets')
+
+TMP_MODELS_DIR = f'tests/podecide/_tmp/_models'
+
+
+class TestDMKTablesWorker(unittest.TestCase):
+
+    def tearDown(self):
+        shutil.rmtree(TMP_MODELS_DIR, ignore_errors=True)
+
+    def test_colocated_foldmk(self):
+        """ trainable FolDMK (async training with LearnerThread) colocated with RanDMK: updates, is saved and stopped """
+        point_common = {
+            'n_players':            9,
+            'table_size':           GAME_CONFIG.table_size,
+            'table_moves':          GAME_CONFIG.table_moves,
+            'publish_player_stats': False,
+            'publishFWD':           False,
+            'publishUPD':           False}
+        point_fol = {
+            'name':                 'dmk_fol',
+            'save_topdir':          TMP_MODELS_DIR,
+            'table_cash_start':     GAME_CONFIG.table_cash_start,
+            'motorch_type':         DMK_MOTorch_PG,
+            'motorch_point':        {'load_cardnet_pretrained':False, 'device':None},
+            'trainable':            True,
+            'upd_trigger':          300,
+            'async_training':       True,
+            **point_common}
+        point_ran = {'name':'dmk_ran', 'trainable':False, **point_common}
+        gm = GameManager(
+            game_config=    GAME_CONFIG,
+            dmks_recipe=    [(FolDMK,point_fol), (RanDMK,point_ran)],
+            colocated=      True,
+            loglevel=       30)
+        res = gm.run_game(game_size=1000, sleep=1, publish=False, progress_report=False)
+        for dr in res['dmk_results'].values():
+            self.assertTrue(len(dr['wonH_IV']) > 0)
+        gm.worker.join(timeout=10)
+        self.assertFalse(gm.worker.is_alive())
+
+        point = FolDMK.load_point(name='dmk_fol', save_topdir=TMP_MODELS_DIR)
+        self.assertTrue(point['upd_step'] > 0)
+
+    def test_colocated_speed(self, game_size=3000):
+        """ compares H/s of GM running DMKs & tables colocated with H/s of GM running tables and DMKs as processes """
+        speed = {}
+        for colocated in [True, False]:
+            points = [{
+                'name':                 f'dmk{n:02}',
+                'n_players':            30,
+                'table_size':           GAME_CONFIG.table_size,
+                'table_moves':          GAME_CONFIG.table_moves,
+                'trainable':            False,
+                'publish_player_stats': False,
+                'publishFWD':           False,
+                'publishUPD':           False,
+            } for n in range(3)]
+            gm = GameManager(
+                game_config=    GAME_CONFIG,
+                dmks_recipe=    [(RanDMK,point) for point in points],
+                colocated=      colocated,
+                loglevel=       30)
+            res = gm.run_game(game_size=game_size, sleep=1, publish=False, progress_report=False)
+            speed[colocated] = res['loop_stats']['speed']
+            for dr in res['dmk_results'].values():
+                self.assertTrue(len(dr['wonH_IV']) > 0)
+        print(f'colocated: {speed[True]:.1f}H/s, processes: {speed[False]:.1f}H/s')
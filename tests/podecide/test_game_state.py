@@ -0,0 +1,148 @@
+import math
+import numpy as np
+import unittest
+
+from podecide.game_state import GameStatesStore, share_rewards
+
+
+def get_store() -> GameStatesStore:
+    store = GameStatesStore(player_ids=['a','b'], n_moves=3, chunk=2)
+    store.add_column('val', shape=(), dtype=np.int32)
+    return store
+
+
+class TestGameStatesStore(unittest.TestCase):
+
+    def test_lifecycle(self):
+        store = get_store()
+        store.append('a', [(v,) for v in range(3)])
+        store.append('b', [(10,)])
+        self.assertEqual(store.n_new_all, 4)
+        self.assertEqual(store.new_without_probs(), (['a','b'], [0,0], [3,1]))
+
+        # rows are right padded with the last one
+        rows = store.rows(player_ids=['a','b'], first=0, seq_len=[3,1])
+        self.assertEqual(store.take('val', rows).tolist(), [[0,1,2],[10,10,10]])
+
+        store.set_probs_done('a')
+        self.assertEqual(store.new_without_probs(), (['b'], [0], [1]))
+        self.assertEqual(store.column('move')[store.last('a')], -1)
+        self.assertTrue(np.isnan(store.column('reward')[store.last('a')]))
+
+        store.move_new_to_dec('a')
+        self.assertEqual(store.n_dec_all, 3)
+        self.assertIsNone(store.last('a'))
+        self.assertEqual(store.dec('a', 'val').tolist(), [0,1,2])
+
+        store.drop_new('b')
+        self.assertEqual(store.n_new_all, 0)
+
+        store.drop_dec('a', 2)
+        self.assertEqual(store.dec('a', 'val').tolist(), [2])
+
+    def test_grow(self):
+        """ rows of players are kept while the store grows and moves rows """
+        store = get_store()
+        vals = {'a': [], 'b': []}
+        for ix in range(50):
+            pid = 'ab'[ix % 2]
+            new = [(ix * 10 + i,) for i in range(ix % 3 + 1)]
+            store.append(pid, new)
+            store.move_new_to_dec(pid)
+            vals[pid] += [v[0] for v in new]
+            if ix % 7 == 0:
+                store.drop_dec(pid, 3)
+                vals[pid] = vals[pid][3:]
+        for pid in vals:
+            self.assertEqual(store.dec(pid, 'val').tolist(), vals[pid])
+            self.assertTrue(np.all(store.dec(pid, 'move') == -1))
+
+
+def share_rewards_loop(states:GameStatesStore, player_ids, reward_share, table_cash_start):
+    """ reference (loop over reversed states of every player) implementation of share_rewards """
+    top_move, n_mov, n_rew = [], [], []
+    for pid in player_ids:
+        rewards = []
+        rewardL = states.dec(pid, 'reward').tolist()
+        moveL = states.dec(pid, 'move').tolist()
+        reward = None
+        passed_first_reward = False
+        move_ixL = []
+        for ix in reversed(range(len(rewardL))):
+            if not math.isnan(rewardL[ix]):
+                passed_first_reward = True
+                if reward is not None:
+                    reward += rewardL[ix]
+                else:
+                    reward = rewardL[ix]
+                rewardL[ix] = math.nan
+            if moveL[ix] != -1 and passed_first_reward:
+                if reward is not None:
+                    rewardL[ix] = reward
+                    reward = None
+                    if move_ixL:
+                        rewards.append(move_ixL)
+                        move_ixL = []
+                move_ixL.append(ix)
+        if move_ixL: rewards.append(move_ixL)
+        states.dec(pid, 'reward')[:] = rewardL
+
+        reward_sh = states.dec(pid, 'reward_sh')
+        for move_ixL in rewards:
+            rIX = move_ixL[0]
+            if math.isnan(reward_sh[rIX]):
+                if reward_share is None:
+                    rew_sh = rewardL[rIX] / len(move_ixL)
+                else:
+                    rew_sh = rewardL[rIX] / reward_share
+                reward_sh[move_ixL] = rew_sh / table_cash_start
+            else:
+                break
+
+        top_move.append(rewards[0][0] if rewards else -1)
+        n_mov.append(sum([len(ml) for ml in rewards]))
+        n_rew.append(len(rewards))
+    return np.asarray(top_move), np.asarray(n_mov), np.asarray(n_rew)
+
+
+class TestShareRewards(unittest.TestCase):
+
+    def test_equal_to_loop(self, n_cases=300):
+        """ share_rewards gives the same rewards, reward_sh and results as the loop, for random states and updates """
+        rng = np.random.default_rng(123)
+        for _ in range(n_cases):
+
+            n_players = int(rng.integers(1, 6))
+            player_ids = [f'p{ix}' for ix in range(n_players)]
+            reward_share = [None, 3, 5][int(rng.integers(3))]
+            p_move, p_reward = rng.random(2)
+            stores = [GameStatesStore(player_ids=player_ids, n_moves=3, chunk=8) for _ in range(2)]
+
+            for _ in range(int(rng.integers(1, 4))): # updates
+
+                # new decided states
+                for pid in player_ids:
+                    n = int(rng.integers(0, 30))
+                    move = np.where(rng.random(n) < p_move, rng.integers(0, 3, n), -1)
+                    reward = np.where(rng.random(n) < p_reward, rng.integers(-500, 500, n), np.nan)
+                    for store in stores:
+                        store.append(pid, [()] * n)
+                        store.move_new_to_dec(pid)
+                        if n:
+                            store.dec(pid, 'move')[-n:] = move
+                            store.dec(pid, 'reward')[-n:] = reward
+
+                res = share_rewards(stores[0], reward_share=reward_share, table_cash_start=500)
+                res_loop = share_rewards_loop(stores[1], player_ids, reward_share=reward_share, table_cash_start=500)
+                for a, b in zip(res, res_loop):
+                    self.assertEqual(a.tolist(), b.tolist())
+                for pid in player_ids:
+                    for k in ['reward', 'reward_sh']:
+                        np.testing.assert_array_equal(stores[0].dec(pid, k), stores[1].dec(pid, k))
+
+                # flush some states as after update
+                n_upd = int(rng.integers(0, 20))
+                for pid in player_ids:
+                    if rng.random() < 0.5:
+                        for store in stores:
+                            store.drop_dec(pid, n_upd)
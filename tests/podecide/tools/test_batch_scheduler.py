@@ -0,0 +1,30 @@
+import numpy as np
+import unittest
+
+from podecide.tools.batch_scheduler import BatchScheduler
+
+
+class TestBatchScheduler(unittest.TestCase):
+
+    def test_curve(self):
+        rng = np.random.default_rng(123)
+        bs = BatchScheduler(n_players=300)
+        self.assertEqual(bs.threshold, 1)
+        for _ in range(1000):
+            width = int(rng.integers(1, 300))
+            bs.observe_round(width=width, latency=0.01 + 0.0001 * width + rng.normal(0, 0.0005))
+            bs.observe_requests(n_requests=10, interval=0.01)
+        a, b = bs.curve
+        self.assertAlmostEqual(a, 0.01, delta=0.001)
+        self.assertAlmostEqual(b, 0.0001, delta=0.00001)
+        self.assertTrue(9 <= bs.threshold <= 11)
+
+    def test_same_width(self):
+        bs = BatchScheduler(n_players=10)
+        for _ in range(20):
+            bs.observe_round(width=5, latency=0.1)
+            bs.observe_requests(n_requests=5, interval=0.1)
+        a, b = bs.curve
+        self.assertAlmostEqual(a, 0.1)
+        self.assertEqual(b, 0.0)
+        self.assertEqual(bs.threshold, 5)
@@ -0,0 +1,102 @@
+import os
+import shutil
+import unittest
+
+from podecide.dmk_motorch import DMK_MOTorch
+from podecide.tools.device_balancer import DeviceBalancer
+
+TMP_MODELS_DIR = f'tests/podecide/_tmp/_models'
+
+
+def get_balancer(devices, device_map=None, cpu_share=None) -> DeviceBalancer:
+    """ virtual devices (for CPU only setup) """
+    if device_map is None:
+        device_map = {d: None for d in devices}
+    return DeviceBalancer(devices=devices, device_map=device_map, cpu_share=cpu_share, save_topdir=TMP_MODELS_DIR, loglevel=30)
+
+
+def get_loop_stats(costs, device, trainable=False, dev_report=None):
+    """ loop_stats of a game (1 sec) with given costs {name: fwd cost} of DMKs on the device """
+    return {
+        'time':         1.0,
+        'dev_report':   dev_report or {},
+        'dmk_load':     {dn: {
+            'device':       device,
+            'trainable':    trainable,
+            'fwd_time':     costs[dn],
+            'upd_time':     costs[dn]} for dn in costs}}
+
+
+class TestDeviceBalancer(unittest.TestCase):
+
+    def tearDown(self):
+        shutil.rmtree(TMP_MODELS_DIR, ignore_errors=True)
+
+    def test_assign_sets_device(self):
+        db = get_balancer(devices={'v0':1000, 'v1':1000})
+        points = [{'name':'a'}, {'name':'b', 'motorch_point':{'device':0, 'family':'a'}}]
+        assigned = db.assign(points)
+        self.assertEqual(set(assigned.values()), {'v0','v1'})
+        for point in points:
+            self.assertIsNone(point['motorch_point']['device'])
+        self.assertEqual(points[1]['motorch_point']['family'], 'a')
+
+    def test_balance(self):
+        db = get_balancer(devices={'v0':1000, 'v1':1000})
+        db.observe(get_loop_stats(costs={'a':0.6, 'b':0.3, 'c':0.2, 'd':0.1}, device='v0'))
+        assigned = db.assign([{'name':dn} for dn in 'dcba'])
+        self.assertEqual(assigned, {'a':'v0', 'b':'v1', 'c':'v1', 'd':'v1'})
+
+        # not measured DMK costs mean of measured
+        self.assertAlmostEqual(db.dmk_cost('e', trainable=False), 0.3)
+        # trainable costs FWD + UPD
+        db.observe(get_loop_stats(costs={'b':0.3}, device='v1', trainable=True))
+        self.assertAlmostEqual(db.dmk_cost('b', trainable=True), 0.6)
+
+    def test_memory_fit(self):
+        db = get_balancer(devices={'v0':1000, 'v1':300})
+        db.observe(get_loop_stats(costs={'a':0.5, 'b':0.5}, device='v0'))
+        # trainable DMKs without checkpoint: 4 * 100MB, does not fit v1
+        assigned = db.assign([{'name':'a', 'trainable':True}, {'name':'b', 'trainable':True}])
+        self.assertEqual(assigned, {'a':'v0', 'b':'v0'})
+        # when fits nowhere -> device with the most free memory
+        assigned = db.assign([{'name':dn, 'trainable':True} for dn in 'abc'])
+        self.assertEqual(sorted(assigned.values()), ['v0','v0','v1'])
+
+        # memory of DMK from checkpoint size
+        ckpt_path = DMK_MOTorch._get_ckpt_path(model_name='c', save_topdir=TMP_MODELS_DIR)
+        os.makedirs(os.path.dirname(ckpt_path), exist_ok=True)
+        with open(ckpt_path, 'wb') as f:
+            f.write(b'0' * 1024**2)
+        self.assertAlmostEqual(db.dmk_mem('c', trainable=False), 1.0)
+        self.assertAlmostEqual(db.dmk_mem('c', trainable=True), 4.0)
+
+    def test_device_load(self):
+        """ load of others (reported by DEVMonitor - assigned DMKs) is taken into account """
+        db = get_balancer(devices={'v0':1000, 'v1':1000}, device_map={'v0':None, 'v1':0})
+        report = {'CPU_proc':10.0, 'CPU_mem':10.0, 'GPU0_proc':90.0, 'GPU0_mem':50.0}
+        db.observe(get_loop_stats(costs={'a':0.3}, device='v1', dev_report=report))
+        self.assertAlmostEqual(db.dev_proc['v1'], 0.6)
+        self.assertAlmostEqual(db.dev_mem['v1'], 400)
+        self.assertAlmostEqual(db.dev_proc['v0'], 0.1)
+        assigned = db.assign([{'name':'a'}, {'name':'b'}])
+        self.assertEqual(assigned, {'a':'v0', 'b':'v0'})
+
+    def test_device_load_units(self):
+        """ DMK costs (fraction of time) are converted to the load of device (fraction of capacity) as reported by DEVMonitor,
+        virtual devices of one physical device share its load """
+        db = get_balancer(devices={'v0':1000, 'v1':1000, 'v2':1000}, device_map={'v0':None, 'v1':None, 'v2':0}, cpu_share=0.25)
+        self.assertAlmostEqual(db.dev_load('v0', 0.4), 0.1)
+        self.assertAlmostEqual(db.dev_load('v2', 0.4), 0.4)
+
+        report = {'CPU_proc':30.0, 'CPU_mem':10.0, 'GPU0_proc':50.0, 'GPU0_mem':10.0}
+        stats = get_loop_stats(costs={'a':0.4, 'b':0.4}, device='v0', dev_report=report)
+        stats['dmk_load']['b']['device'] = 'v1'
+        db.observe(stats)
+        # CPU: 0.3 - 2 * 0.4 * 0.25
+        self.assertAlmostEqual(db.dev_proc['v0'], 0.1)
+        self.assertAlmostEqual(db.dev_proc['v1'], 0.1)
+        self.assertAlmostEqual(db.dev_proc['v2'], 0.5)
+        # a + b on CPU: 0.1+0.1+0.1 < 0.5
+        assigned = db.assign([{'name':'a'}, {'name':'b'}])
+        self.assertEqual(set(assigned.values()), {'v0','v1'})
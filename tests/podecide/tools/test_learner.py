@@ -0,0 +1,145 @@
+import numpy as np
+import torch
+import unittest
+
+from envy import PyPoksException, PLAYER_STATS_USED
+from pologic.game_config import GameConfig
+from podecide.dmk_motorch import DMK_MOTorch_PPO
+from podecide.game_state import GameStatesStore
+from podecide.tools.learner import LearnerThread, LearnerClient, LearnerServer
+
+GAME_CONFIG = GameConfig.from_name('3players_2bets')
+
+TMP_MODELS_DIR = f'tests/podecide/_tmp/_models'
+
+
+def get_point(name:str):
+    return {
+        'name':                     name,
+        'table_size':               GAME_CONFIG.table_size,
+        'table_moves':              GAME_CONFIG.table_moves,
+        'save_topdir':              TMP_MODELS_DIR,
+        'load_cardnet_pretrained':  False,
+        'warm_up':                  None, # LR of the first steps of warm up is ~0
+        'device':                   None,
+        'loglevel':                 30}
+
+
+def get_model(name:str, player_ids) -> DMK_MOTorch_PPO:
+    return DMK_MOTorch_PPO(player_ids=player_ids, **get_point(name))
+
+
+def get_batch(mdl, player_ids, n_states:int, rng):
+    """ builds training batch of random decided states """
+    n_moves = len(GAME_CONFIG.table_moves)
+    store = GameStatesStore(player_ids=player_ids, n_moves=n_moves)
+    store.add_column('cards',    shape=(7,),                     dtype=np.int8)
+    store.add_column('event_id', shape=(),                       dtype=np.int8)
+    store.add_column('cash',     shape=(8,),                     dtype=np.float32)
+    store.add_column('pl_id',    shape=(),                       dtype=np.int8)
+    store.add_column('pl_pos',   shape=(),                       dtype=np.int8)
+    store.add_column('pl_stats', shape=(len(PLAYER_STATS_USED),), dtype=np.float32)
+    for pid in player_ids:
+        store.append(pid, [(
+            rng.choice(52, 7, replace=False).tolist(),
+            int(rng.integers(1 + n_moves)),
+            rng.random(8).tolist(),
+            int(rng.integers(GAME_CONFIG.table_size)),
+            int(rng.integers(GAME_CONFIG.table_size)),
+            rng.random(len(PLAYER_STATS_USED)).tolist(),
+        ) for _ in range(n_states)])
+        store.move_new_to_dec(pid)
+        store.dec(pid, 'move')[:] = rng.integers(n_moves, size=n_states)
+        store.dec(pid, 'allowed_moves')[:] = True
+        store.dec(pid, 'reward_sh')[:] = rng.normal(size=n_states)
+    seq_len = [n_states] * len(player_ids)
+    return mdl.build_batch(
+        player_ids=     player_ids,
+        states=         store,
+        rows=           store.rows(player_ids=player_ids, first=0, seq_len=seq_len),
+        seq_len=        seq_len,
+        for_training=   True)
+
+
+class TestLearnerThread(unittest.TestCase):
+
+    def test_updates(self):
+        """ learner publishes versioned weights of updated policy, actor loads them """
+
+        rng = np.random.default_rng(123)
+        player_ids = [f'p{ix}' for ix in range(10)] # PPO splits batch into 5 minibatches
+        actor = get_model('dmk_actor', player_ids)
+        mdl = get_model('dmk_learner', player_ids)
+        mdl.module.load_state_dict(actor.module.state_dict())
+
+        learner = LearnerThread(mdl=mdl, version=3)
+        learner.start()
+        self.assertIsNone(learner.pop_weights())
+
+        for v in range(4,6):
+            learner.submit(player_ids=player_ids, batch=get_batch(mdl, player_ids, n_states=10, rng=rng))
+            with self.assertRaises(PyPoksException):
+                learner.submit(player_ids=player_ids, batch={}) # only one update at a time
+            learner.wait()
+            self.assertFalse(learner.busy)
+
+            version, state_dict, _ = learner.pop_weights()
+            self.assertEqual(version, v)
+            self.assertIsNone(learner.pop_weights())
+
+            self.assertFalse(all([torch.equal(state_dict[k], t) for k,t in actor.module.state_dict().items()]))
+            actor.module.load_state_dict(state_dict)
+            self.assertTrue(all([torch.equal(mdl.module.state_dict()[k], t) for k,t in actor.module.state_dict().items()]))
+
+        learner.stop()
+        self.assertFalse(learner.is_alive())
+
+    def test_failed_update(self):
+        """ exception of the update is raised by pop_weights() """
+        mdl = get_model('dmk_learner_fail', ['a'])
+        learner = LearnerThread(mdl=mdl)
+        learner.start()
+        learner.submit(player_ids=['a'], batch={})
+        learner.wait()
+        with self.assertRaises(PyPoksException):
+            learner.pop_weights()
+        learner.stop()
+
+
+class TestLearnerServer(unittest.TestCase):
+
+    def test_same_as_thread(self):
+        """ server updates policy of DMK (client) the same way as LearnerThread """
+
+        player_ids = [f'p{ix}' for ix in range(10)]
+        actor = get_model('dmk_client', player_ids)
+        learner = LearnerThread(mdl=get_model('dmk_thread', player_ids))
+        learner.mdl.module.load_state_dict(actor.module.state_dict())
+        learner.start()
+
+        server = LearnerServer(device=None, dmk_names=['dmk_client'])
+        client = LearnerClient(
+            mdl=                actor,
+            player_ids=         player_ids,
+            motorch_point=      get_point('dmk_client'),
+            que_to_server=      server.ique,
+            que_from_server=    server.oqueD['dmk_client'])
+
+        for seed in range(2):
+            for lrn in [learner, client]:
+                lrn.submit(player_ids=player_ids, batch=get_batch(lrn.mdl, player_ids, n_states=10, rng=np.random.default_rng(seed)))
+                self.assertTrue(lrn.busy)
+            learner.wait()
+            client.wait()
+            version, state_dict, _ = client.pop_weights()
+            self.assertEqual(version, seed + 1)
+            for k,t in learner.pop_weights()[1].items():
+                self.assertTrue(torch.allclose(state_dict[k], t, atol=1e-6))
+            actor.module.load_state_dict(state_dict)
+
+        client.save()
+        self.assertTrue(DMK_MOTorch_PPO.is_saved(name='dmk_client', save_topdir=TMP_MODELS_DIR))
+
+        learner.stop()
+        server.stop()
+        server.join()
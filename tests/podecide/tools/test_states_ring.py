@@ -0,0 +1,151 @@
+from multiprocessing import Process
+from multiprocessing.connection import wait
+from pypaq.mpython.mptools import Que, QMessage
+import time
+import unittest
+
+from envy import PyPoksException
+from pologic.game_config import GameConfig
+from pologic.vptable import VPTable
+from podecide.dmk import RanDMK
+from podecide.game_manager import GameManager
+from podecide.tools.states_ring import StatesRing
+
+GAME_CONFIG = GameConfig.from_name('3players_2bets')
+
+
+def get_messages(n_steps=300):
+    """ returns list of (pid, states) as sent by table players """
+    vt = VPTable(
+        name=           'vt',
+        game_config=    GAME_CONFIG,
+        pl_ids=         [[f't{t}p{i}' for i in range(GAME_CONFIG.table_size)] for t in range(10)],
+        seed=           123,
+        loglevel=       30)
+    messages = vt.step()['state_changes']
+    for _ in range(n_steps):
+        messages += vt.step(*vt.random_decisions())['state_changes']
+    return messages
+
+
+def ring_producer(ring:StatesRing, messages, n_rep:int):
+    for _ in range(n_rep):
+        for pid, states in messages:
+            ring.write(pid, states)
+
+
+def que_producer(que:Que, messages, n_rep:int):
+    for _ in range(n_rep):
+        for pid, states in messages:
+            que.put(QMessage(type='state_changes', data={'id':pid, 'state_changes':states}))
+
+
+class TestStatesRing(unittest.TestCase):
+
+    def test_round_trip(self):
+        messages = get_messages()
+        player_ids = sorted(set([m[0] for m in messages]))
+        ring = StatesRing(player_ids=player_ids, n_moves=len(GAME_CONFIG.table_moves), size=1000)
+        drained = []
+        for pid, states in messages:
+            if ring.n_waiting + len(states) > ring.size:
+                drained += ring.drain_states()
+            ring.write(pid, states)
+        drained += ring.drain_states()
+        ring.close(unlink=True)
+
+        # consecutive messages of the same player are merged
+        merged = []
+        for pid, states in messages:
+            if merged and merged[-1][0] == pid:
+                merged[-1] = (pid, merged[-1][1] + states)
+            else:
+                merged.append((pid, states))
+        self.assertEqual(merged, drained)
+
+    def test_notification(self, n_rep=3):
+        """ consumer blocked on ring reader is woken up by writes, producer of full ring waits for drain """
+        messages = get_messages(n_steps=100)
+        player_ids = sorted(set([m[0] for m in messages]))
+        n_states = sum([len(m[1]) for m in messages]) * n_rep
+        ring = StatesRing(player_ids=player_ids, n_moves=len(GAME_CONFIG.table_moves), size=100)
+        self.assertEqual(wait([ring.reader], timeout=0.1), [])
+
+        producer = Process(target=ring_producer, args=(ring, messages, n_rep))
+        producer.start()
+        n_received = 0
+        while n_received < n_states:
+            self.assertTrue(wait([ring.reader], timeout=5))
+            n_received += sum([len(states) for _,states in ring.drain_states()])
+        producer.join()
+        self.assertEqual(n_states, n_received)
+        self.assertEqual(wait([ring.reader], timeout=0.1), [])
+        ring.close(unlink=True)
+
+    def test_long_str_value(self):
+        ring = StatesRing(player_ids=['p0'], n_moves=len(GAME_CONFIG.table_moves), size=10)
+        ring.write('p0', [('HST', ('t'*32, 1))])
+        self.assertRaises(PyPoksException, ring.write, 'p0', [('HST', ('t'*33, 1))])
+        ring.close(unlink=True)
+
+    def test_speed(self, n_rep=10):
+        """ messages/sec of states sent by a producer process and received by consumer: StatesRing vs Que
+        consumer flushes all received messages in a loop (like QueDMK decisions loop does),
+        consumer CPU time (process_time) is reported also, with one CPU wall time sums producer and consumer """
+        messages = get_messages()
+        player_ids = sorted(set([m[0] for m in messages]))
+        n_messages = len(messages) * n_rep
+        n_states = sum([len(m[1]) for m in messages]) * n_rep
+
+        ring = StatesRing(player_ids=player_ids, n_moves=len(GAME_CONFIG.table_moves), size=10000)
+        s_time, s_cpu = time.time(), time.process_time()
+        producer = Process(target=ring_producer, args=(ring, messages, n_rep))
+        producer.start()
+        n_received = 0
+        while n_received < n_states:
+            time.sleep(0.001)
+            n_received += sum([len(states) for _,states in ring.drain_states()])
+        ring_cpu = (time.process_time() - s_cpu) / n_messages * 1e6
+        ring_speed = n_messages / (time.time() - s_time)
+        producer.join()
+        ring.close(unlink=True)
+        self.assertEqual(n_states, n_received)
+
+        que = Que()
+        s_time, s_cpu = time.time(), time.process_time()
+        producer = Process(target=que_producer, args=(que, messages, n_rep))
+        producer.start()
+        n_received = 0
+        while n_received < n_messages:
+            time.sleep(0.001)
+            while que.get(block=False):
+                n_received += 1
+        que_cpu = (time.process_time() - s_cpu) / n_messages * 1e6
+        que_speed = n_messages / (time.time() - s_time)
+        producer.join()
+
+        print(f'{n_messages} messages ({n_states} states)')
+        print(f'StatesRing: {ring_speed:.0f} msg/s, consumer {ring_cpu:.1f} CPU us/msg')
+        print(f'Que:        {que_speed:.0f} msg/s, consumer {que_cpu:.1f} CPU us/msg')
+
+    def test_game_manager(self, game_size=1000):
+        """ runs GM with DMKs receiving states with StatesRing """
+        points = [{
+            'name':                 f'dmk{n:02}',
+            'n_players':            30,
+            'table_size':           GAME_CONFIG.table_size,
+            'table_moves':          GAME_CONFIG.table_moves,
+            'trainable':            False,
+            'publish_player_stats': False,
+            'publishFWD':           False,
+            'publishUPD':           False,
+            'states_ring_size':     100000,
+        } for n in range(3)]
+        gm = GameManager(
+            game_config=    GAME_CONFIG,
+            dmks_recipe=    [(RanDMK,point) for point in points],
+            loglevel=       30)
+        res = gm.run_game(game_size=game_size, sleep=1, publish=False, progress_report=False)
+        for dr in res['dmk_results'].values():
+            self.assertTrue(len(dr['wonH_IV']) > 0)
+        print(f'speed: {res["loop_stats"]["speed"]:.1f}H/s')
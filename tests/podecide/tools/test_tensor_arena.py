@@ -0,0 +1,31 @@
+import numpy as np
+import torch
+import unittest
+
+from podecide.tools.tensor_arena import TensorArena
+
+
+class TestTensorArena(unittest.TestCase):
+
+    def test_get(self):
+        arena = TensorArena()
+
+        arr, tns = arena.get(name='x', shape=(3,4,2), dtype=torch.float32)
+        self.assertEqual(arr.shape, (3,4,2))
+        self.assertTrue(tns.is_contiguous())
+        arr[:] = 1
+        self.assertEqual(tns.sum().item(), 24)
+        nbytes = arena.nbytes
+
+        # smaller one reuses the buffer
+        arr_s, tns_s = arena.get(name='x', shape=(2,2,2), dtype=torch.float32)
+        self.assertEqual(arena.nbytes, nbytes)
+        self.assertEqual(tns_s.data_ptr(), tns.data_ptr())
+        self.assertTrue(tns_s.is_contiguous())
+
+        # bigger one grows the buffer
+        arena.get(name='x', shape=(5,4,2), dtype=torch.float32)
+        self.assertEqual(arena.nbytes, 48 * 4)
+
+        arr, _ = arena.get(name='y', shape=(2,3), dtype=torch.bool)
+        self.assertEqual(arr.dtype, np.bool_)
@@ -0,0 +1,53 @@
+import time
+import unittest
+
+from podecide.tools.update_sync import UpdPolicy, ShortestUpdFirst, MostBlockedFirst, FairShare
+
+
+def get_policy(policy_type:type(UpdPolicy), **kwargs) -> UpdPolicy:
+    policy = policy_type(**kwargs)
+    for name, n_players in [('a',10), ('b',30), ('c',20)]:
+        policy.add_dmk(name=name, n_players=n_players)
+    for name, upd_time in [('a',2.0), ('b',1.0), ('c',3.0), ('a',2.0)]:
+        policy.observe_update(name=name, upd_time=upd_time)
+    return policy
+
+
+class TestUpdPolicy(unittest.TestCase):
+
+    def test_fifo(self):
+        policy = get_policy(UpdPolicy)
+        t = time.time()
+        self.assertEqual(policy.select({'c':t-3, 'a':t-2, 'b':t-1}), 'c')
+        self.assertEqual(policy.select({'a':t, 'b':t, 'c':t}), 'a')
+
+    def test_shortest_upd_first(self):
+        policy = get_policy(ShortestUpdFirst)
+        t = time.time()
+        self.assertEqual(policy.select({'a':t-3, 'b':t, 'c':t}), 'b')
+        policy.observe_update(name='b', upd_time=10.0)
+        self.assertAlmostEqual(policy.upd_time['b'], 3.7)
+        self.assertEqual(policy.select({'a':t, 'b':t, 'c':t}), 'a')
+
+    def test_most_blocked_first(self):
+        policy = get_policy(MostBlockedFirst)
+        t = time.time()
+        self.assertEqual(policy.select({'a':t-3, 'b':t, 'c':t}), 'b')
+        self.assertEqual(policy.select({'a':t, 'c':t}), 'c')
+
+    def test_fair_share(self):
+        policy = get_policy(FairShare)
+        t = time.time()
+        self.assertEqual(policy.select({'a':t, 'b':t, 'c':t}), 'b') # 4/10, 1/30, 3/20 sec per player
+        policy.observe_update(name='b', upd_time=5.0)
+        self.assertEqual(policy.select({'a':t, 'b':t, 'c':t}), 'c')
+
+    def test_aging(self):
+        """ DMK waiting long enough gets ticket even with the highest cost """
+        t = time.time()
+        policy = get_policy(MostBlockedFirst, aging=1.0)
+        self.assertEqual(policy.select({'a':t-19, 'b':t}), 'b')
+        self.assertEqual(policy.select({'a':t-21, 'b':t}), 'a')
+        policy = get_policy(ShortestUpdFirst, aging=0.1)
+        self.assertEqual(policy.select({'c':t-10, 'b':t}), 'b')
+        self.assertEqual(policy.select({'c':t-30, 'b':t}), 'c')
@@ -0,0 +1,35 @@
+from multiprocessing import Process
+from multiprocessing.connection import wait
+from pypaq.mpython.mptools import QMessage
+import unittest
+
+from podecide.tools.wait_que import WaitQue
+
+
+def producer(que:WaitQue, n:int):
+    for ix in range(n):
+        que.put(QMessage(type='ix', data=ix))
+
+
+class TestWaitQue(unittest.TestCase):
+
+    def test_wait(self):
+        que_a = WaitQue()
+        que_b = WaitQue()
+        self.assertEqual(wait([que_a.reader, que_b.reader], timeout=0.1), [])
+
+        p = Process(target=producer, args=(que_b, 100))
+        p.start()
+        received = []
+        while len(received) < 100:
+            self.assertEqual(wait([que_a.reader, que_b.reader], timeout=5), [que_b.reader])
+            while True:
+                msg = que_b.get(block=False)
+                if msg: received.append(msg.data)
+                else: break
+        p.join()
+        self.assertEqual(received, list(range(100)))
+
+        # all notifications consumed with messages
+        self.assertEqual(wait([que_a.reader, que_b.reader], timeout=0.1), [])
+        self.assertTrue(que_b.empty())
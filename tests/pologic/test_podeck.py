@@ -1,10 +1,17 @@
+from collections import Counter
 import itertools
+import math
+import numpy as np
+import os
 import random
+import tempfile
 import time
 from tqdm import tqdm
+from typing import List, Tuple
 import unittest
 
-from pologic.podeck import PDeck, ASC, monte_carlo_prob_won
+from envy import PyPoksException
+from pologic.podeck import PDeck, ASC, ASC_SIZE, ASC_BINOM_NP, monte_carlo_prob_won, monte_carlo_prob_won_NPL, hand_equity, hand_class, PreflopEquity
 
 
 class TestPDeck(unittest.TestCase):
@@ -35,6 +42,15 @@ class TestPDeck(unittest.TestCase):
             self.assertEqual(rank[0], tc[1])
 
 
+    def test_ASC_index(self):
+        """ cards_index maps sorted 7 cards (colex order) to 0,1,2.. without gaps """
+        for ix,c in enumerate(sorted(itertools.combinations(range(12), 7), key=lambda x: x[::-1])):
+            self.assertEqual(ASC.cards_index(c), ix)
+        self.assertEqual(ASC.cards_index(tuple(range(45,52))), ASC_SIZE-1)
+        cards = np.sort(np.asarray([random.sample(range(52), 7) for _ in range(1000)]), axis=-1)
+        ixs = sum([ASC_BINOM_NP[k+1][cards[:,k]] for k in range(7)])
+        self.assertEqual(list(ixs), [ASC.cards_index(tuple(c)) for c in cards])
+
     def test_100(self):
 
         asc = ASC()
@@ -149,6 +165,26 @@ class TestPDeck(unittest.TestCase):
             print(f'{cards} {rank[0]} {rank[-1]}')
 
 
+    def test_deck_array(self):
+
+        # seeded decks deal same cards
+        dka, dkb = PDeck(seed=7), PDeck(seed=7)
+        for _ in range(3):
+            self.assertEqual([dka.get_card_int() for _ in range(10)], [dkb.get_card_int() for _ in range(10)])
+            dka.reset()
+            dkb.reset()
+
+        dk = PDeck()
+        for _ in range(100):
+            dk.reset()
+            ex = random.sample(range(52), 5)
+            for c in ex:
+                self.assertEqual(dk.get_ex_card(c), PDeck.ctt(c))
+                self.assertIsNone(dk.get_ex_card(PDeck.cts(c)))
+            dealt = list(dk.deal(10)) + [dk.get_card_int() for _ in range(37)]
+            self.assertEqual(sorted(ex + dealt), list(range(52)))
+            self.assertEqual(dk.cards, [])
+
     def test_deck_random(self):
         dk = PDeck()
         for n in range(10000):
@@ -159,6 +195,43 @@ class TestPDeck(unittest.TestCase):
                 print(cards,cr)
             self.assertEqual(cr[0],rank)
 
+    def test_7of_rank_distribution(self, n_samples=2000):
+        """ compares distributions of get_7of_rank and rejection sampler, for every rank compares histograms of:
+        - top figure of the five cards
+        - number of different figures
+        - max number of cards of one color """
+
+        def features(seven) -> Tuple[int,int,int]:
+            rank_value = PDeck.cards_rank_value([PDeck.cti(c) for c in seven])
+            return (
+                rank_value % 1000000 // 13**4,
+                len(set([c[0] for c in seven])),
+                max([sum([1 for c in seven if c[1] == col]) for col in range(4)]))
+
+        def tv_distance(a:List[int], b:List[int]) -> float:
+            ca, cb = Counter(a), Counter(b)
+            return sum([abs(ca[k]/len(a) - cb[k]/len(b)) for k in set(ca) | set(cb)]) / 2
+
+        # rejection samples of rare ranks with vectorized ranking
+        rare = {7:[], 8:[]}
+        rng = np.random.default_rng()
+        while min([len(v) for v in rare.values()]) < n_samples:
+            cards = np.argsort(rng.random((500000,52)), axis=-1)[:,:7]
+            ranks = PDeck.cards_rank_value_NPL(cards) // 1000000
+            for r in rare:
+                rare[r] += [[PDeck.ctt(int(c)) for c in seven] for seven in cards[ranks == r]]
+
+        dk = PDeck()
+        for rank in range(9):
+            new = [features(dk.get_7of_rank(rank)) for _ in range(n_samples)]
+            if rank in rare:
+                ref = [features(seven) for seven in rare[rank][:n_samples]]
+            else:
+                ref = [features(dk.get_7of_rank_rejection(rank)) for _ in range(n_samples)]
+            for fix in range(3):
+                tvd = tv_distance([f[fix] for f in new], [f[fix] for f in ref])
+                print(f'rank {rank} feature {fix} TV distance: {tvd:.3f}')
+                self.assertTrue(tvd < 0.1)
 
     def test_rank_speed(self, num_ask=int(1e6)):
         """ tests speed of ranking """
@@ -183,6 +256,37 @@ class TestPDeck(unittest.TestCase):
         print(f'speed {int(num_ask/(e_time-s_time))}/sec')
 
 
+    def test_rank_value_sampled(self, num_ask=int(1e6)):
+        """ compares table-driven cards_rank_value() with reference cards_rank() for sampled 5-7 cards """
+        for _ in tqdm(range(num_ask)):
+            cards = random.sample(range(52), random.choice([5,6,7,7,7]))
+            self.assertEqual(PDeck.cards_rank_value(cards), PDeck.cards_rank(cards)[1])
+
+    @unittest.skipUnless(os.environ.get('PYPOKS_SLOW'), 'full sweep of 7 cards combinations, set PYPOKS_SLOW to run')
+    def test_rank_value_all(self):
+        """ compares table-driven cards_rank_value() with reference cards_rank() for all 133,784,560 combinations of 7 cards
+        takes a long time (reference speed) """
+        n = 0
+        for cards in tqdm(itertools.combinations(range(52), 7), total=133784560):
+            self.assertEqual(PDeck.cards_rank_value(cards), PDeck.cards_rank(cards)[1])
+            n += 1
+        self.assertEqual(n, 133784560)
+
+    def test_rank_value_speed(self, num_ask=int(1e6)):
+        """ tests speed of table-driven ranking """
+
+        scL = [random.sample(range(52), 7) for _ in range(num_ask)]
+        PDeck.cards_rank_value(scL[0]) # builds tables
+
+        s_time = time.time()
+        for sc in scL:
+            _ = PDeck.cards_rank_value(sc)
+        e_time = time.time()
+
+        print(f'time taken {e_time-s_time:.2f}sec')
+        print(f'speed {int(num_ask/(e_time-s_time))}/sec')
+
+
     def test_ASC_ranks(self, num_ask=int(1e6)):
         """ compares speed of ASC and PDeck """
 
@@ -233,3 +337,126 @@ class TestPDeck(unittest.TestCase):
                 )
                 print(f'{n:{mx}} {time.time() - s_time:7.3f}s {prob}')
 
+    def test_rank_value_NPL(self):
+        for n_cards in [5,6,7]:
+            cards = np.asarray([random.sample(range(52), n_cards) for _ in range(10000)])
+            rank_values = PDeck.cards_rank_value_NPL(cards)
+            for c,rv in zip(cards, rank_values):
+                self.assertEqual(rv, PDeck.cards_rank_value(c))
+
+    def test_monte_carlo_prob_won_NPL(self):
+        """ batch estimates are statistically equal to estimates of monte_carlo_prob_won() """
+
+        n_samples = 20000
+        hands = [
+            [22, 23, 40, 10, 43, 52, 52],
+            [22, 23, 40, 10, 43],
+            [50, 51],
+            [0, 14],
+            [0, 1],
+            [12, 45],
+            [12, 45, 3, 7, 18, 30, 51],
+            [33, 34, 35, 2, 6, 52, 52]]
+        hands_NPL = np.asarray([h + [52]*(7-len(h)) for h in hands])
+
+        probs_NPL = monte_carlo_prob_won_NPL(cards=hands_NPL, n_samples=n_samples)
+        self.assertEqual(probs_NPL.shape, (len(hands),))
+        for h,pb in zip(hands, probs_NPL):
+            p = monte_carlo_prob_won(cards=h, n_samples=n_samples)
+            sigma = max((2 * p * (1-p) / n_samples) ** 0.5, 1e-3)
+            print(f'{[PDeck.cts(c) for c in h]} {p:.4f} {pb:.4f}')
+            self.assertTrue(abs(p-pb) < 5 * sigma)
+
+    def test_hand_equity(self):
+
+        # exact (turn) vs sampled
+        cards = [22, 23, 40, 10, 43, 1]
+        eq_exact = hand_equity(cards=cards)
+        eq_mc = hand_equity(cards=cards, max_enum=0, n_samples=50000)
+        print(eq_exact, eq_mc)
+        self.assertTrue(eq_exact['exact'] and not eq_mc['exact'])
+        self.assertAlmostEqual(eq_exact['win'] + eq_exact['tie'] + eq_exact['lose'], 1.0)
+        self.assertTrue(abs(eq_exact['equity'] - eq_mc['equity']) < 0.01)
+
+        # one opponent equity is a monte_carlo_prob_won
+        for cards in [[50, 51], [0, 14], [22, 23, 40, 10, 43]]:
+            eq = hand_equity(cards=cards, n_samples=50000)
+            self.assertTrue(abs(eq['equity'] - monte_carlo_prob_won(cards=cards, n_samples=50000)) < 0.015)
+
+        # equity drops with more opponents
+        eqL = [hand_equity(cards=[48, 49], n_opponents=n, n_samples=20000)['equity'] for n in range(1,9)]
+        print(eqL)
+        self.assertEqual(eqL, sorted(eqL, reverse=True))
+
+        # KK vs AA range
+        rng_aces = np.zeros((52,52))
+        for a,b in itertools.permutations(range(48,52), 2):
+            rng_aces[a,b] = 1
+        eq = hand_equity(cards=[44, 45], ranges=[rng_aces], n_samples=100000)
+        print(eq)
+        self.assertTrue(0.15 < eq['equity'] < 0.25)
+
+    def test_hand_equity_ranges(self):
+
+        # single hand range, sampled from the range
+        rn = np.zeros((52,52))
+        rn[48,49] = 1
+        eqL = [hand_equity(cards=[0,5], ranges=[rn], n_samples=1000, rng=np.random.default_rng(seed))['equity'] for seed in range(20)]
+
+        # reference: equity vs the known hand
+        rng = np.random.default_rng(0)
+        left = np.setdiff1d(np.arange(52), [0,5,48,49])
+        table = left[np.argsort(rng.random((100000,len(left))), axis=-1)[:,:5]]
+        hero_rv = PDeck.cards_rank_value_NPL(np.concatenate([np.broadcast_to([0,5], (len(table),2)), table], axis=-1))
+        opp_rv = PDeck.cards_rank_value_NPL(np.concatenate([np.broadcast_to([48,49], (len(table),2)), table], axis=-1))
+        eq_ref = float(np.mean((hero_rv > opp_rv) + (hero_rv == opp_rv) / 2))
+        print(eq_ref, np.mean(eqL))
+        self.assertTrue(all([0.0 < eq < 0.5 for eq in eqL]))
+        self.assertTrue(abs(np.mean(eqL) - eq_ref) < 0.01)
+
+        # weight of hand is taken from both orders of cards (exact and sampled)
+        cards = [0, 5, 20, 33, 41, 12]
+        rn_t = rn.T
+        for max_enum in [100000, 0]:
+            eq = hand_equity(cards=cards, ranges=[rn], max_enum=max_enum, rng=np.random.default_rng(1))
+            eq_t = hand_equity(cards=cards, ranges=[rn_t], max_enum=max_enum, rng=np.random.default_rng(1))
+            self.assertEqual(eq['exact'], bool(max_enum))
+            self.assertAlmostEqual(eq['equity'], eq_t['equity'])
+
+        # ranges blocked by known cards
+        with self.assertRaises(PyPoksException):
+            hand_equity(cards=[48,49], ranges=[rn], max_enum=0)
+
+    def test_preflop_equity(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pfe = PreflopEquity(file_FP=f'{tmp_dir}/preflop_equity.npy', n_samples=2000, use_QMP=False)
+
+        # every class is reached and representative cards of class belong to the class
+        self.assertEqual(len({hand_class(c) for c in itertools.combinations(range(52), 2)}), 169)
+
+        aa = pfe.equity([48, 49])
+        kk = pfe.equity([44, 45])
+        s72 = pfe.equity([20, 0])
+        print(aa, kk, s72)
+        self.assertTrue(aa > kk > s72)
+        self.assertTrue(abs(aa - 0.85) < 0.03)
+        self.assertEqual(pfe.equity([48, 49]), pfe.equity([50, 51]))
+
+        # equity drops with more opponents
+        eqL = [pfe.equity([48, 49], n) for n in range(1,9)]
+        self.assertEqual(eqL, sorted(eqL, reverse=True))
+
+        # preflop rows of batch answered by lookup
+        cards = np.asarray([[48, 49, 52, 52, 52, 52, 52], [20, 0, 52, 52, 52, 52, 52]])
+        self.assertEqual(list(monte_carlo_prob_won_NPL(cards=cards, n_samples=10, pfe=pfe)), [aa, s72])
+        self.assertEqual(monte_carlo_prob_won(cards=[48, 49], n_samples=10, pfe=pfe), aa)
+
+    def test_preflop_equity_error(self):
+        """ sampled values are within the error bound (4 stderr) of known equity vs random hand heads-up """
+        n_samples = 20000
+        bound = 4 * 0.5 / math.sqrt(n_samples)
+        for cards, known in [([48, 49], 0.8520), ([44, 45], 0.8240), ([20, 1], 0.3458)]:
+            eq = PreflopEquity._class_equity(hc=hand_class(cards), n_samples=n_samples)[0]
+            print(cards, eq, known)
+            self.assertTrue(abs(eq - known) < bound)
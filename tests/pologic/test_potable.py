@@ -1,9 +1,13 @@
+import numpy as np
 import time
 from tqdm import tqdm
 import unittest
 
-from pologic.potable import PTable
-from pologic.hand_history import HHistory
+from envy import GAME_CONFIGS_FD
+from pologic.game_config import GameConfig
+from pologic.potable import PTable, amc, amc_helpers, amc_NPL
+from pologic.hand_history import HHistory, states2HHtexts
+from pologic.podeck import PDeck
 
 table_size = 3
 
@@ -31,6 +35,33 @@ class TestPTable(unittest.TestCase):
         n_sec = time.time()-stime
         print(f'time taken: {n_sec:.1f}sec ({int(n_hands/n_sec)} h/s)')
 
+    def test_int_cards_speed(self, n_hands=20000):
+        """ compares speed (h/s) of table running with str and int cards (headless self-play) """
+        game_config = GameConfig.from_name('3players_2bets')
+        PDeck.cards_rank_value([0,1,2,3,4]) # builds evaluator tables before timing
+        for int_cards in [False, True]:
+            table = PTable(
+                name=           f'table_int{int_cards}',
+                game_config=    game_config,
+                pl_ids=         [f'pl{ix}' for ix in range(table_size)],
+                int_cards=      int_cards,
+                loglevel=       30)
+            stime = time.time()
+            for _ in range(n_hands):
+                hh = table.run_hand()
+                for pl in table.players:
+                    for e in hh.translated(pls=pl.pls): # cards as DMK encoder needs them
+                        if e[0] == 'PLH' and e[1][0] == 0 or e[0] == 'TCD':
+                            cards = e[1][1:] if e[0] == 'PLH' else e[1]
+                            _ = list(cards) if type(cards[0]) is int else [PDeck.cti(c) for c in cards]
+            n_sec = time.time()-stime
+            print(f'int_cards: {int_cards} -> {int(n_hands/n_sec)} h/s')
+            texts = states2HHtexts(hh.events, game_config=game_config)
+            plh = [t for t in texts if t.startswith('PLH:')]
+            self.assertTrue(all([len(PDeck.cts(c)) == 2 for t in plh for c in t.split()[2:]]))
+            if int_cards:
+                self.assertTrue(all([type(c) is int for e in hh.events if e[0] == 'PLH' for c in e[1][1:]]))
+
     def test_run_with_hh(self):
         table = PTable(
             name=       'table',
@@ -52,3 +83,39 @@ class TestPTable(unittest.TestCase):
         hh4 = table.run_hand(hh_given=hh3)
         print(f'\nHHistory4:\n{hh4}')
 
+
+    def test_amc_NPL(self, n_points=20000):
+        """ randomized differential test: amc_NPL() is bit-exact with amc() for every game config """
+        rng = np.random.default_rng(111)
+        for name in GameConfig.get_names_from_folder(GAME_CONFIGS_FD):
+            gc = GameConfig.from_name(name)
+            bb = gc.table_cash_bb
+
+            # random (also edge) cash values of decision points
+            cash_cs = rng.integers(0, 10*bb, n_points)
+            table_cash_tc = cash_cs + rng.choice([0, bb, rng.integers(0, 50*bb)], n_points)
+            table_cash_rs = rng.choice([bb, 2*bb, rng.integers(bb, 20*bb)], n_points)
+            table_pot = table_cash_tc + rng.integers(0, 100*bb, n_points)
+            table_state = rng.integers(1, 5, n_points)
+            cash = np.where(
+                rng.random(n_points) < 0.3,
+                table_cash_tc - cash_cs + rng.integers(-2, 3, n_points),
+                rng.integers(1, gc.table_cash_start, n_points)).clip(1, None)
+
+            allowed_moves, moves_cash = amc_NPL(cash, cash_cs, table_cash_tc, table_cash_rs, table_pot, table_state, gc.table_moves)
+
+            enabledBRM, enabledBRA, indexesBRX = amc_helpers(gc.table_moves)
+            for ix in range(n_points):
+                am, mc = amc(
+                    cash=           int(cash[ix]),
+                    cash_cs=        int(cash_cs[ix]),
+                    table_cash_tc=  int(table_cash_tc[ix]),
+                    table_cash_rs=  int(table_cash_rs[ix]),
+                    table_pot=      int(table_pot[ix]),
+                    table_state=    int(table_state[ix]),
+                    table_moves=    gc.table_moves,
+                    enabledBRM=     enabledBRM,
+                    enabledBRA=     enabledBRA,
+                    indexesBRX=     indexesBRX)
+                self.assertEqual(am, allowed_moves[ix].tolist())
+                self.assertEqual(mc, moves_cash[ix].tolist())
@@ -0,0 +1,68 @@
+import unittest
+
+from pologic.game_config import GameConfig
+from pologic.hand_history import states2HHtexts
+from pologic.potable import PTable
+from pologic.vptable import VPTable
+
+game_config = GameConfig.from_name('3players_2bets')
+
+
+class TestVPTable(unittest.TestCase):
+
+    def test_base(self):
+        vpt = VPTable(
+            name=           'vpt',
+            game_config=    game_config,
+            pl_ids=         [[f't{tix}pl{ix}' for ix in range(game_config.table_size)] for tix in range(4)],
+            seed=           111)
+        out = vpt.step()
+
+        # first step: every table waits for a decision of its player
+        dec = out['decisions']
+        self.assertEqual(list(dec['tables']), [0,1,2,3])
+        self.assertEqual(dec['pl_ids'], [f't{tix}pl{game_config.table_size-1}' for tix in range(4)])
+        self.assertEqual(dec['allowed_moves'].shape, (4,len(game_config.table_moves)))
+        self.assertEqual(dec['moves_cash'].shape, (4,len(game_config.table_moves)))
+        self.assertTrue(dec['allowed_moves'].any(axis=-1).all())
+        self.assertEqual(out['hh'], [])
+
+        hhL = vpt.run_hands(n_hands=8, return_hh=True)
+        self.assertTrue(len(hhL) >= 8)
+
+        # HH of every hand has a full structure
+        for hh in hhL:
+            ev = [e[0] for e in hh.events]
+            self.assertEqual(ev[:3], ['GCF','HST','TST'])
+            self.assertEqual(ev[-1], 'HFN')
+            self.assertEqual(ev.count('POS'), game_config.table_size)
+            self.assertEqual(ev.count('PLH'), game_config.table_size)
+            self.assertEqual(ev.count('PRS'), game_config.table_size)
+
+        # cash is conserved in every hand
+        for hh in hhL:
+            self.assertAlmostEqual(sum([e[1][1] for e in hh.events if e[0] == 'PRS']), 0)
+
+    def test_replay_with_ptable(self, n_hands=1000):
+        """ every hand run by VPTable replayed by PTable gives the same events """
+        vpt = VPTable(
+            name=           'vpt',
+            game_config=    game_config,
+            pl_ids=         [[f't{tix}pl{ix}' for ix in range(game_config.table_size)] for tix in range(20)],
+            seed=           111)
+        tables = {}
+        for hh in vpt.run_hands(n_hands=n_hands, return_hh=True):
+            name, hand_ID = hh.events[1][1]
+            if name not in tables:
+                tables[name] = PTable(
+                    name=           name,
+                    game_config=    game_config,
+                    pl_ids=         [e[1][0] for e in hh.events if e[0] == 'POS'],
+                    int_cards=      True,
+                    loglevel=       30)
+            table = tables[name]
+            table.hand_ID = hand_ID
+            hh_replay = table.run_hand(hh_given=states2HHtexts(hh.events, game_config=game_config))
+            # MOV probs are not given with HHtexts
+            events, events_replay = [[e if e[0] != 'MOV' else (e[0], e[1][:3] + e[1][4:]) for e in h.events] for h in [hh, hh_replay]]
+            self.assertEqual(events, events_replay)